@@ -0,0 +1,91 @@
+#ifndef MUONRAWHITS_CSCCLUSTERS_H
+#define MUONRAWHITS_CSCCLUSTERS_H
+
+#include <vector>
+#include <map>
+#include <cstring>
+#include <string>
+#include <chrono>
+
+#include <TFile.h>
+#include <TDirectory.h>
+#include <TTree.h>
+#include <TH1F.h>
+#include <TH2F.h>
+
+class CscClusters {
+
+ public:
+
+    CscClusters();
+    CscClusters(std::string ipath, std::string opath);
+    ~CscClusters();
+
+    int initialize();
+    int execute(int ents = -1);
+    int finalize();
+
+    std::string  input_path = "";
+    std::string output_path = "";
+    std::string run         = "";
+
+    void announce();
+    void initialize_branches();
+    void initialize_histograms();
+    void set_qmax_thresholds(std::vector<int> thresholds);
+
+    TFile* file = 0;
+    TTree* tree = 0;
+    int entries;
+
+    std::chrono::time_point<std::chrono::system_clock> time_start, time_end;
+    std::chrono::duration<double> elapsed_seconds;
+
+    std::vector<std::string> chamber_types = {"CSL", "CSS"};
+
+    // qmax thresholds in units of 1000 electrons, like n_qmax100
+    std::vector<int> qmax_thresholds = {0, 25, 50, 75, 100, 150, 200, 300};
+
+    // cuts, in the bin order of the histograms clusters_vs_cut_*
+    std::vector<std::string> cuts = {};
+
+    // inputs
+    int RunNumber;
+    double lbAverageLuminosity;
+    double prescale_HLT;
+
+    int csc_chamber_n;
+    std::vector<std::string>* csc_chamber_type       = 0; //!
+
+    std::vector<int>*              csc_chamber_cluster_n           = 0; //!
+    std::vector<std::vector<int>>* csc_chamber_cluster_r           = 0; //!
+    std::vector<std::vector<int>>* csc_chamber_cluster_qsum        = 0; //!
+    std::vector<std::vector<int>>* csc_chamber_cluster_qmax        = 0; //!
+    std::vector<std::vector<int>>* csc_chamber_cluster_qleft       = 0; //!
+    std::vector<std::vector<int>>* csc_chamber_cluster_qright      = 0; //!
+    std::vector<std::vector<int>>* csc_chamber_cluster_strips      = 0; //!
+    std::vector<std::vector<int>>* csc_chamber_cluster_measuresphi = 0; //!
+    std::vector<int>*              csc_chamber_cluster_n_qmax100   = 0; //!
+    std::vector<int>*              csc_chamber_cluster_n_notecho   = 0; //!
+
+    // outputs
+    TH1F* evts         = 0;
+    TH1F* evts_vs_lumi = 0;
+
+    std::map<std::string, TH1F*> clusters_vs_cut;
+    std::map<std::string, TH1F*> qmax;
+    std::map<std::string, TH1F*> qsum;
+    std::map<std::string, TH1F*> strips;
+    std::map<std::string, TH2F*> qmax_vs_r;
+    std::map<std::string, TH2F*> minlr_vs_qmax;
+    std::map<std::string, TH2F*> strips_vs_r;
+    std::map<std::string, TH2F*> clusters_vs_lumi_vs_cut;
+
+    std::vector<TH1F*> histograms1D;
+    std::vector<TH2F*> histograms2D;
+
+    TFile* output = 0;
+
+};
+
+#endif
@@ -2,6 +2,7 @@
 #define MUONRAWHITS_MUONRAWHISTOGRAMS_H
 
 #include <vector>
+#include <map>
 #include <cstring>
 #include <string>
 #include <chrono>
@@ -11,6 +12,10 @@
 #include <TTree.h>
 #include <TH1F.h>
 #include <TH2F.h>
+#include <TH1D.h>
+#include <TH1I.h>
+#include <TH2I.h>
+#include <TH2D.h>
 
 class MuonRawHistograms {
 
@@ -23,14 +28,57 @@ class MuonRawHistograms {
     int initialize();
     int execute(int ents = -1);
     int finalize();
+    int reuse(std::string ipath, std::string opath);
+    int append(std::string ipath);
 
     std::string  input_path = "";
     std::string output_path = "";
     std::string run         = "";
+    int         run_number  = 0;
 
     void announce();
+    void open_input(std::string ipath);
     void initialize_branches();
+    void set_cache_size(long bytes);
+    void set_progress_print(bool on);
+    void set_runs(std::vector<int> runs);
+    void set_lbs(int first, int last);
+    bool selected(long ent);
+    void initialize_cache();
     void initialize_histograms();
+    void reset_histograms();
+    void fill_metadata();
+    void write_metadata();
+    void set_skim_path(std::string path);
+    void initialize_skim();
+    void fill_skim();
+    std::vector<std::vector<int*> > region_slots(int& mdt_full, int& csc_full, std::map<std::string, int>& hits);
+    void sum_regions();
+    void set_bcid_regions(bool on);
+    void reset_bcid_regions();
+    void fill_bcid_regions();
+    void write_bcid_regions();
+    TH1F* lazy(std::map<std::string, TH1F*>& hists, std::string prefix, std::string key);
+    void set_chamber_tensor(int mode);
+    void book_chamber_tensor();
+    void fill_chamber_tensor(int ichamber, int raw, int adc, float lumi);
+    void write_chamber_tensor();
+    int  chamber_index(std::string type, int eta, std::string side, int phi);
+    std::vector<int> chamber_sectors(std::string type);
+    void set_axis(std::string quantity, int bins, float lo, float hi);
+    void axis(std::string quantity, int& bins, float& lo, float& hi);
+    void set_adc_thresholds(std::vector<int> thresholds);
+    void set_qmax_thresholds(std::vector<int> thresholds);
+    TH2F* book_threshold_scan(std::string name, std::string title, std::vector<int>& thresholds, std::string detector);
+    void scan_hits(std::vector<int>& counts, std::vector<int>& thresholds, int row, std::vector<int>& values, double unit);
+    void fill_threshold_scan(TH2F* scan, std::vector<int>& counts, std::vector<int>& thresholds);
+    void set_placeholders(bool on);
+    void book_placeholders();
+    void keep(TH1F*& hist);
+    void keep(TH2F*& hist);
+    void switch_run();
+    void store_run();
+    void restore_run(std::string next);
 
     int ybin(std::string chamber_type);
     int sign(std::string chamber_side);
@@ -55,9 +103,28 @@ class MuonRawHistograms {
     double prescale_L1;
     double prescale_HLT;
 
-    std::chrono::time_point<std::chrono::system_clock> time_start, time_end;
+    std::chrono::time_point<std::chrono::system_clock> time_start, time_end, time_read;
     std::chrono::duration<double> elapsed_seconds;
 
+    // of the last execute: all of it, and the part in GetEntry, i.e. reading and unzipping
+    double seconds_execute = 0;
+    double seconds_read    = 0;
+
+    // progress of the running execute, for a caller to poll: entries done, raw mdt and csc hits,
+    // bytes read from the file. printed every 2000 entries unless turned off.
+    bool progress_print  = true;
+    long progress_events = 0;
+    long progress_hits   = 0;
+    long progress_bytes  = 0;
+
+    // TTreeCache size in bytes, 0 for the default of the file
+    long cache_size = 0;
+
+    // only the entries of these runs and lumiblocks [first, last] are processed. empty or last < first: all.
+    std::vector<int> select_runs;
+    int select_lb_first = 0;
+    int select_lb_last  = -1;
+
     int eta   = 0;
     int eta_n = 8;
 
@@ -157,20 +224,128 @@ class MuonRawHistograms {
     TH1F* hits_adc_vs_r_EML = 0;
     TH1F* hits_adc_vs_r_EMS = 0;
 
+    // per chamber, booked on the first fill. with placeholders, the empty ones are written too.
     std::map<std::string, TH1F*> hits_raw_vs_r;
     std::map<std::string, TH1F*> hits_adc_vs_r;
 
-    std::map<std::string, TH1F*> hits_raw_vs_lumi;
-    std::map<std::string, TH1F*> hits_adc_vs_lumi;
+    bool placeholders = false;
+
+    // hits per chamber per event vs. lumi, as one dense TH2 per type of hits, raw and adc,
+    // [lumi, chamber] with one x-bin per chamber of the layout below, e.g. EIL1A03.
+    // hits_{raw,adc}_vs_lumi_<type><eta> are projected from them when written.
+    // 0 off, 1 unweighted integer counts, 2 weighted, 3 weighted with sumw2
+    int                chamber_tensor_mode      = 1;
+    int                chamber_tensor_lumi_bins = 32;
+    std::vector<TH2*>  chamber_tensor;
+    std::vector<int>   chamber_bins;  // [type][eta][side][phi] -> x-bin of the chamber, 0 if it does not exist
+    std::map<std::string, std::pair<int, int> > chamber_ranges;  // e.g. EIL1 -> its first and last x-bin
+    std::map<std::string, int> chamber_type_index;
+
+    // the chambers which exist: the eta stations 1 - n of each type, on sides A and C,
+    // in the odd sectors for large (L) types, the even ones for small (S) types, or as listed
+    std::map<std::string, int> chamber_eta_max = {{"BIL", 6}, {"BML", 6}, {"BOL", 6}, {"EIL", 5}, {"EML", 5}, {"EOL", 6},
+                                                  {"BIS", 8}, {"BMS", 6}, {"BOS", 6}, {"EIS", 2}, {"EMS", 5}, {"EOS", 6},
+                                                  {"BEE", 2}, {"BIM", 5}, {"BIR", 6}, {"BME", 1}, {"BMF", 3}, {"BOF", 4}, {"BOG", 4},
+                                                  {"EEL", 2}, {"EES", 2}, {"CSL", 1}, {"CSS", 1}};
+    std::map<std::string, std::vector<int> > chamber_sectors_listed = {{"BEE", {2, 4, 6, 8, 10, 12, 14, 16}},
+                                                                       {"BIM", {11, 15}}, {"BIR", {11, 15}}, {"BME", {13}},
+                                                                       {"BMF", {12, 14}}, {"BOF", {12, 14}}, {"BOG", {12, 14}}};
+
+    // axes of the quantities lumi, acmu, avmu and the hits per event in the regions, e.g. mdt_full or mdt_EIL1:
+    // {bins, lo, hi}, set instead of the defaults
+    std::map<std::string, std::vector<float> > axes;
+
+    // hits above each threshold per region, mdt tube adc counts and csc cluster qmax [ke],
+    // counted in one pass over the hits. no thresholds, no scan.
+    std::vector<int> adc_thresholds  = {};
+    std::vector<int> qmax_thresholds = {};
+    TH2F* hits_vs_adc_threshold_vs_region  = 0;
+    TH2F* hits_vs_qmax_threshold_vs_region = 0;
+    std::map<std::string, int> scan_row;  // e.g. EIL1 -> row of mdt_EIL1. row 0 is the full detector.
+    std::vector<int> scan_hits_adc;       // in this event, [row * (thresholds + 1) + thresholds below the hit]
+    std::vector<int> scan_hits_qmax;
 
     TH2F* hits_raw_vs_region_L = 0;
     TH2F* hits_raw_vs_region_S = 0;
     TH2F* hits_adc_vs_region_L = 0;
     TH2F* hits_adc_vs_region_S = 0;
 
+    // run metadata, one entry per job in the tree "metadata"
+    TTree* metadata = 0;
+    int    meta_run             = 0;
+    int    meta_bunches         = 0;
+    int    meta_lbn_min         = 0;
+    int    meta_lbn_max         = 0;
+    long   meta_events          = 0;
+    double meta_events_weighted = 0;
+    double meta_mu_min          = 0;
+    double meta_mu_max          = 0;
+    double meta_lumi_min        = 0;
+    double meta_lumi_max        = 0;
+    std::map<int, double> meta_lb_lumi;
+    std::vector<int>      meta_lbs;
+    std::vector<double>   meta_lbs_lumi;
+
+    // optional skim: one row per event with the hits per region, in the tree "skim"
+    std::string skim_path = "";
+    TFile* skim_file = 0;
+    TTree* skim      = 0;
+    float  skim_lumi = 0;
+    std::vector<std::string> skim_regions = {"mdt_full",
+                                             "mdt_EIL1", "mdt_EIL2", "mdt_EIS1", "mdt_EIS2",
+                                             "mdt_EML1", "mdt_EML2", "mdt_EMS1", "mdt_EMS2",
+                                             "mdt_BIS7", "mdt_BIS8",
+                                             "csc_full", "csc_CSL1", "csc_CSS1"};
+    std::vector<int> skim_hits_raw;
+    std::vector<int> skim_hits_adc;
+
+    // the per-event counts each skim region adds up, e.g. EIL1A and EIL1C for mdt_EIL1,
+    // resolved once per execute, and their sums in the current event
+    std::vector<std::vector<int*> > region_slots_raw; //!
+    std::vector<std::vector<int*> > region_slots_adc; //!
+    std::vector<int> region_hits_raw;
+    std::vector<int> region_hits_adc;
+
+    // hits per bcid and skim region, unweighted, as dense arrays [bcid * regions + region],
+    // with the events and the sum of lbLuminosityPerBCID per bcid. on unless turned off.
+    bool bcid_regions = true;
+    int  bcid_n       = 3564;
+    std::vector<int>    bcid_evts;
+    std::vector<double> bcid_lumi;
+    std::vector<int>    bcid_hits_raw;
+    std::vector<int>    bcid_hits_adc;
+
     std::vector<TH1F*> histograms1D;
     std::vector<TH2F*> histograms2D;
 
+    // the members above, e.g. evts or hits_raw_vs_r[...], which point into histograms1D and 2D
+    std::vector<TH1F**> slots1D; //!
+    std::vector<TH2F**> slots2D; //!
+
+    // everything per run of the runs a job has seen besides the current one,
+    // whose histograms, metadata and bcid arrays are in the members above
+    struct RunSet {
+        std::vector<TH1F*> histograms1D;
+        std::vector<TH2F*> histograms2D;
+        int    bunches         = 0;
+        int    lbn_min         = 0;
+        int    lbn_max         = 0;
+        long   events          = 0;
+        double events_weighted = 0;
+        double mu_min          = 0;
+        double mu_max          = 0;
+        double lumi_min        = 0;
+        double lumi_max        = 0;
+        std::map<int, double> lb_lumi;
+        std::vector<std::map<std::string, TH1F*> > lazy;
+        std::vector<TH2*>     chamber_tensor;
+        std::vector<int>      bcid_evts;
+        std::vector<double>   bcid_lumi;
+        std::vector<int>      bcid_hits_raw;
+        std::vector<int>      bcid_hits_adc;
+    };
+    std::map<std::string, RunSet> run_sets; //!
+
     TFile*      output;
     TDirectory* outdir;
 
@@ -0,0 +1,282 @@
+#include "MuonRawAnalysis/CscClusters.h"
+
+#include <iostream>
+#include <vector>
+#include <string>
+#include <chrono>
+#include <algorithm>
+
+#include <TFile.h>
+#include <TDirectory.h>
+#include <TTree.h>
+#include <TH1F.h>
+#include <TH2F.h>
+
+CscClusters::CscClusters(){}
+
+CscClusters::CscClusters(std::string ipath, std::string opath){
+    input_path  = ipath;
+    output_path = opath;
+}
+
+CscClusters::~CscClusters(){
+
+    // the histograms are not owned by any directory
+    for (auto hist: histograms1D) delete hist;
+    for (auto hist: histograms2D) delete hist;
+
+    // the tree is owned by its file
+    if (file){
+        file->Close();
+        delete file;
+    }
+    delete output;
+}
+
+int CscClusters::initialize(){
+
+    file = TFile::Open(input_path.c_str());
+    if (!file)
+        std::cout << "\n FATAL FUCK CscClusters::initialize: no file \n" << std::endl;
+
+    tree = (TTree*)(file->Get("physics"));
+    if (!tree)
+        std::cout << "\n FATAL FUCK CscClusters::initialize: no tree \n" << std::endl;
+
+    announce();
+    initialize_branches();
+    initialize_histograms();
+
+    tree->GetEntry(0);
+    run = std::to_string(RunNumber);
+    run = "00"+run;
+
+    return 0;
+}
+
+int CscClusters::execute(int ents){
+
+    int ent  = 0;
+    int ch   = 0;
+    int hit  = 0;
+    int icut = 0;
+
+    std::string chamber_type = "";
+    int chamber_hits_raw     = 0;
+
+    double hit_rad    = 0;
+    double hit_qmax   = 0;
+    double hit_qsum   = 0;
+    double hit_qleft  = 0;
+    double hit_qright = 0;
+    int    hit_strips = 0;
+    int    hit_phi    = 0;
+
+    float lumi = 0.0;
+
+    // clusters per type and cut in this event
+    std::map<std::string, std::vector<double> > clusters;
+    int cut_notecho = std::find(cuts.begin(), cuts.end(), "notecho") - cuts.begin();
+    int cut_eta     = std::find(cuts.begin(), cuts.end(), "eta")     - cuts.begin();
+    int cut_phi     = std::find(cuts.begin(), cuts.end(), "phi")     - cuts.begin();
+    int cut_qmax    = std::find(cuts.begin(), cuts.end(), "qmax_"+std::to_string(qmax_thresholds.at(0))) - cuts.begin();
+    int nthresholds = (int)(qmax_thresholds.size());
+
+    int tree_entries = (int)(tree->GetEntries());
+    if (ents < 0 || ents > tree_entries)
+        entries = tree_entries;
+    else
+        entries = ents;
+
+    time_start = std::chrono::system_clock::now();
+
+    for (ent = 0; ent < entries; ++ent){
+
+        tree->GetEntry(ent);
+
+        if (ent % 2000 == 0) {
+            printf("%8i / %8i \n", ent, entries);
+            printf("\033[F\033[J");
+        }
+
+        lumi = lbAverageLuminosity/1000.0;
+
+        for (auto type: chamber_types)
+            clusters[type].assign(cuts.size(), 0);
+
+        for (ch = 0; ch < csc_chamber_n; ++ch){
+
+            chamber_type     = csc_chamber_type->at(ch);
+            chamber_hits_raw = csc_chamber_cluster_n->at(ch);
+
+            if (!clusters.count(chamber_type))
+                continue;
+
+            std::vector<double>& counts = clusters[chamber_type];
+
+            // echoes are only flagged per chamber
+            counts[0]           += chamber_hits_raw;
+            counts[cut_notecho] += csc_chamber_cluster_n_notecho->at(ch);
+
+            for (hit = 0; hit < chamber_hits_raw; ++hit){
+
+                hit_rad    = (csc_chamber_cluster_r->at(ch)).at(hit);
+                hit_qmax   = (csc_chamber_cluster_qmax->at(ch)).at(hit)   / 1000.0;
+                hit_qsum   = (csc_chamber_cluster_qsum->at(ch)).at(hit)   / 1000.0;
+                hit_qleft  = (csc_chamber_cluster_qleft->at(ch)).at(hit)  / 1000.0;
+                hit_qright = (csc_chamber_cluster_qright->at(ch)).at(hit) / 1000.0;
+                hit_strips = (csc_chamber_cluster_strips->at(ch)).at(hit);
+
+                qmax[chamber_type]         ->Fill(hit_qmax,                          prescale_HLT);
+                qsum[chamber_type]         ->Fill(hit_qsum,                          prescale_HLT);
+                strips[chamber_type]       ->Fill(hit_strips,                        prescale_HLT);
+                qmax_vs_r[chamber_type]    ->Fill(hit_rad, hit_qmax,                 prescale_HLT);
+                minlr_vs_qmax[chamber_type]->Fill(std::min(hit_qleft, hit_qright), hit_qmax, prescale_HLT);
+                strips_vs_r[chamber_type]  ->Fill(hit_rad, hit_strips,               prescale_HLT);
+
+                if (csc_chamber_cluster_measuresphi){
+                    hit_phi = (csc_chamber_cluster_measuresphi->at(ch)).at(hit);
+                    if (hit_phi) counts[cut_phi] += 1;
+                    else         counts[cut_eta] += 1;
+                }
+
+                for (icut = 0; icut < nthresholds; ++icut)
+                    if (hit_qmax > qmax_thresholds[icut])
+                        counts[cut_qmax + icut] += 1;
+            }
+        }
+
+        evts        ->Fill(1,    prescale_HLT);
+        evts_vs_lumi->Fill(lumi, prescale_HLT);
+
+        for (auto type: chamber_types){
+            for (icut = 0; icut < (int)(cuts.size()); ++icut){
+                if (clusters[type][icut] == 0)
+                    continue;
+                clusters_vs_cut[type]        ->Fill(icut,       clusters[type][icut]*prescale_HLT);
+                clusters_vs_lumi_vs_cut[type]->Fill(lumi, icut, clusters[type][icut]*prescale_HLT);
+            }
+        }
+    }
+
+    time_end = std::chrono::system_clock::now();
+    elapsed_seconds = time_end - time_start;
+
+    printf("%8i / %8i in %.2f s = %.2f Hz\n", ent, entries, elapsed_seconds.count(), (float)(entries) / elapsed_seconds.count());
+
+    return 0;
+}
+
+int CscClusters::finalize(){
+
+    output = TFile::Open(output_path.c_str(), "recreate");
+    output->cd();
+
+    for (auto hist: histograms1D) hist->Write();
+    for (auto hist: histograms2D) hist->Write();
+
+    output->Close();
+
+    return 0;
+}
+
+void CscClusters::announce(){
+
+    std::cout << std::endl;
+    std::cout << "   input | " <<  input_path        << std::endl;
+    std::cout << "  output | " << output_path        << std::endl;
+    std::cout << " entries | " << tree->GetEntries() << std::endl;
+    std::cout << std::endl;
+}
+
+void CscClusters::initialize_branches(){
+
+    tree->SetBranchAddress("RunNumber",           &RunNumber);
+    tree->SetBranchAddress("lbAverageLuminosity", &lbAverageLuminosity);
+    tree->SetBranchAddress("prescale_HLT",        &prescale_HLT);
+
+    tree->SetBranchAddress("csc_chamber_n",                 &csc_chamber_n);
+    tree->SetBranchAddress("csc_chamber_type",              &csc_chamber_type);
+    tree->SetBranchAddress("csc_chamber_cluster_n",         &csc_chamber_cluster_n);
+    tree->SetBranchAddress("csc_chamber_cluster_r",         &csc_chamber_cluster_r);
+    tree->SetBranchAddress("csc_chamber_cluster_qsum",      &csc_chamber_cluster_qsum);
+    tree->SetBranchAddress("csc_chamber_cluster_qmax",      &csc_chamber_cluster_qmax);
+    tree->SetBranchAddress("csc_chamber_cluster_qleft",     &csc_chamber_cluster_qleft);
+    tree->SetBranchAddress("csc_chamber_cluster_qright",    &csc_chamber_cluster_qright);
+    tree->SetBranchAddress("csc_chamber_cluster_strips",    &csc_chamber_cluster_strips);
+    tree->SetBranchAddress("csc_chamber_cluster_n_qmax100", &csc_chamber_cluster_n_qmax100);
+    tree->SetBranchAddress("csc_chamber_cluster_n_notecho", &csc_chamber_cluster_n_notecho);
+
+    // not in the older ntuples: then the eta and phi cuts stay empty
+    if (tree->GetBranch("csc_chamber_cluster_measuresphi"))
+        tree->SetBranchAddress("csc_chamber_cluster_measuresphi", &csc_chamber_cluster_measuresphi);
+}
+
+void CscClusters::set_qmax_thresholds(std::vector<int> thresholds){
+    if (thresholds.empty()){
+        std::cout << "\n FATAL FUCK CscClusters::set_qmax_thresholds: no thresholds \n" << std::endl;
+        return;
+    }
+    std::sort(thresholds.begin(), thresholds.end());
+    qmax_thresholds = thresholds;
+}
+
+void CscClusters::initialize_histograms(){
+
+    // no run in the names, so jobs of different runs can be added
+    int xbins = 0; float xlo = 0; float xhi = 0;
+    int ybins = 0; float ylo = 0; float yhi = 0;
+
+    cuts = {"all", "notecho", "eta", "phi"};
+    for (auto threshold: qmax_thresholds)
+        cuts.push_back("qmax_"+std::to_string(threshold));
+
+    evts = new TH1F("evts", "", 1, 0, 2);
+
+    xbins = 200; xlo = 0; xhi = 16;
+    evts_vs_lumi = new TH1F("evts_vs_lumi", "", xbins, xlo, xhi);
+
+    for (auto type: chamber_types){
+
+        clusters_vs_cut[type] = new TH1F(("clusters_vs_cut_"+type).c_str(), ";;clusters", cuts.size(), 0, cuts.size());
+        clusters_vs_lumi_vs_cut[type] = new TH2F(("clusters_vs_lumi_vs_cut_"+type).c_str(),
+                                                 ";inst. lumi. [e^{33} cm^{-2} s^{-1} ];;clusters",
+                                                 xbins, xlo, xhi, cuts.size(), 0, cuts.size());
+        for (unsigned int icut = 0; icut < cuts.size(); ++icut){
+            clusters_vs_cut[type]->GetXaxis()->SetBinLabel(icut+1, cuts[icut].c_str());
+            clusters_vs_lumi_vs_cut[type]->GetYaxis()->SetBinLabel(icut+1, cuts[icut].c_str());
+        }
+
+        qmax[type]   = new TH1F(("qmax_"+type).c_str(),   ";q(max) [ke];clusters", 200, 0, 2000);
+        qsum[type]   = new TH1F(("qsum_"+type).c_str(),   ";q(sum) [ke];clusters", 200, 0, 4000);
+        strips[type] = new TH1F(("strips_"+type).c_str(), ";N(strips);clusters",   120, 0.5, 120.5);
+
+        xbins = 100; xlo = 800; xhi = 2200;
+        ybins = 200; ylo = 0;   yhi = 2000;
+        qmax_vs_r[type]     = new TH2F(("qmax_vs_r_"+type).c_str(),   ";r [mm];q(max) [ke];",    xbins, xlo, xhi, ybins, ylo, yhi);
+        strips_vs_r[type]   = new TH2F(("strips_vs_r_"+type).c_str(), ";r [mm];N(strips);",      xbins, xlo, xhi, 120, 0.5, 120.5);
+        minlr_vs_qmax[type] = new TH2F(("minlr_vs_qmax_"+type).c_str(), ";minimum of q(left), q(right) [ke];q(max) [ke];",
+                                       200, -600, 3000, 200, 0, 3600);
+
+        xbins = 200; xlo = 0; xhi = 16;
+    }
+
+    histograms1D.push_back(evts);
+    histograms1D.push_back(evts_vs_lumi);
+    for (auto type: chamber_types){
+        histograms1D.push_back(clusters_vs_cut[type]);
+        histograms1D.push_back(qmax[type]);
+        histograms1D.push_back(qsum[type]);
+        histograms1D.push_back(strips[type]);
+        histograms2D.push_back(clusters_vs_lumi_vs_cut[type]);
+        histograms2D.push_back(qmax_vs_r[type]);
+        histograms2D.push_back(strips_vs_r[type]);
+        histograms2D.push_back(minlr_vs_qmax[type]);
+    }
+
+    for (auto hist: histograms1D) hist->Sumw2();
+    for (auto hist: histograms2D) hist->Sumw2();
+
+    for (auto hist: histograms1D) hist->SetDirectory(0);
+    for (auto hist: histograms2D) hist->SetDirectory(0);
+}
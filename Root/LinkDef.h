@@ -3,6 +3,7 @@
 
 #include "MuonRawAnalysis/MuonRawHistograms.h"
 #include "MuonRawAnalysis/CountTubes.h"
+#include "MuonRawAnalysis/CscClusters.h"
 
 #ifdef __CINT__
 
@@ -13,6 +14,7 @@
 
 #pragma link C++ class MuonRawHistograms;
 #pragma link C++ class CountTubes;
+#pragma link C++ class CscClusters;
 
 #endif
 
@@ -4,12 +4,18 @@
 #include <vector>
 #include <string>
 #include <chrono>
+#include <algorithm>
 
 #include <TFile.h>
 #include <TDirectory.h>
 #include <TTree.h>
+#include <TBranch.h>
 #include <TH1F.h>
 #include <TH2F.h>
+#include <TH1D.h>
+#include <TH1I.h>
+#include <TH2I.h>
+#include <TH2D.h>
 
 MuonRawHistograms::MuonRawHistograms(std::string ipath, std::string opath){
     input_path  = ipath;
@@ -30,11 +36,55 @@ int MuonRawHistograms::initialize(){
 
     announce();
     initialize_branches();
+    initialize_cache();
     initialize_histograms();
+    if (!skim_path.empty())
+        initialize_skim();
     
     return 0;
 }
 
+int MuonRawHistograms::reuse(std::string ipath, std::string opath){
+
+    // process another file with the branches, dictionaries and histograms
+    // already set up, instead of constructing a new job
+    output_path = opath;
+    open_input(ipath);
+    reset_histograms();
+    if (!skim_path.empty())
+        initialize_skim();
+
+    return 0;
+}
+
+int MuonRawHistograms::append(std::string ipath){
+
+    // process another file into the same histograms, e.g. the next file of a shard,
+    // of the same run or not
+    open_input(ipath);
+    return 0;
+}
+
+void MuonRawHistograms::open_input(std::string ipath){
+
+    file->Close();
+    delete file;
+
+    input_path = ipath;
+
+    file = TFile::Open(input_path.c_str());
+    if (!file)
+        std::cout << "\n FATAL FUCK MuonRawHistograms::open_input: no file \n" << std::endl;
+
+    tree = (TTree*)(file->Get("physics"));
+    if (!tree)
+        std::cout << "\n FATAL FUCK MuonRawHistograms::open_input: no tree \n" << std::endl;
+
+    announce();
+    initialize_branches();
+    initialize_cache();
+}
+
 int MuonRawHistograms::execute(int ents){
 
     int ent = 0;
@@ -69,22 +119,50 @@ int MuonRawHistograms::execute(int ents){
     else
         entries = ents;
 
-    time_start = std::chrono::system_clock::now();
+    time_start   = std::chrono::system_clock::now();
+    seconds_read = 0;
 
+    progress_events = 0;
+    progress_hits   = 0;
+    progress_bytes  = 0;
+
+    phi_sectors.clear();
     phi_sectors.insert(phi_sectors.end(), phi_sectors_L.begin(), phi_sectors_L.end());
     phi_sectors.insert(phi_sectors.end(), phi_sectors_S.begin(), phi_sectors_S.end());
 
+    region_slots_raw = region_slots(hits_raw_mdt_full, hits_raw_csc_full, hits_raw);
+    region_slots_adc = region_slots(hits_adc_mdt_full, hits_adc_csc_full, hits_adc);
+
+    bool selecting = !select_runs.empty() || select_lb_last >= select_lb_first;
+    bool skip      = false;
+
     for (ent = 1; ent < entries; ++ent){
 
-        tree->GetEntry(ent);
+        // entries of other runs or lumiblocks are skipped after reading only RunNumber and lbn
+        time_read = std::chrono::system_clock::now();
+        skip = selecting && !selected(ent);
+        if (!skip)
+            tree->GetEntry(ent);
+        seconds_read += std::chrono::duration<double>(std::chrono::system_clock::now() - time_read).count();
 
         if (ent % 2000 == 0) {
-            printf("%8i / %8i \n", ent, entries);
-            printf("\033[F\033[J");
+            progress_bytes = file->GetBytesRead();
+            if (progress_print){
+                printf("%8i / %8i \n", ent, entries);
+                printf("\033[F\033[J");
+            }
         } 
 
+        if (skip)
+            continue;
+
+        if (RunNumber != run_number)
+            switch_run();
+
         lumi = lbAverageLuminosity/1000.0;
 
+        fill_metadata();
+
         hits_raw_mdt_full = 0; hits_adc_mdt_full = 0;
         hits_adc_csc_full = 0; hits_raw_csc_full = 0;
         
@@ -120,6 +198,13 @@ int MuonRawHistograms::execute(int ents){
             hits_raw[chamber_type + std::to_string(chamber_eta) + chamber_side] += chamber_hits_raw;
             hits_adc[chamber_type + std::to_string(chamber_eta) + chamber_side] += chamber_hits_adc;
 
+            if (!chamber_tensor.empty())
+                fill_chamber_tensor(chamber_index(chamber_type, chamber_eta, chamber_side, chamber_phi), chamber_hits_raw, chamber_hits_adc, lumi);
+
+            if (hits_vs_adc_threshold_vs_region)
+                scan_hits(scan_hits_adc, adc_thresholds, chamber_side=="B" ? 0 : scan_row[chamber_type + std::to_string(chamber_eta)],
+                          mdt_chamber_tube_adc->at(ch), 1);
+
             if ((chamber_type=="EIL" || chamber_type=="EIS" || chamber_type=="EML" || chamber_type=="EMS") && (chamber_eta==1 || chamber_eta==2)){
                 for (hit = 0; hit < chamber_hits_raw; ++hit){
 
@@ -139,7 +224,7 @@ int MuonRawHistograms::execute(int ents){
                     }
 
                     if (chamber_type=="EIL" || chamber_type=="EIS")
-                        hits_raw_vs_r[chamber_type+"_"+chamber_phi_str]->Fill(hit_rad, prescale_HLT);
+                        lazy(hits_raw_vs_r, "hits_raw_vs_r_", chamber_type+"_"+chamber_phi_str)->Fill(hit_rad, prescale_HLT);
 
                     if (chamber_type=="EIL"){
                         hits_raw_vs_r_EIL->Fill(hit_rad, prescale_HLT);
@@ -182,13 +267,20 @@ int MuonRawHistograms::execute(int ents){
             hits_raw[chamber_type + std::to_string(chamber_eta) + chamber_side] += chamber_hits_raw;
             hits_adc[chamber_type + std::to_string(chamber_eta) + chamber_side] += chamber_hits_adc;
 
+            if (!chamber_tensor.empty())
+                fill_chamber_tensor(chamber_index(chamber_type, chamber_eta, chamber_side, chamber_phi), chamber_hits_raw, chamber_hits_adc, lumi);
+
+            if (hits_vs_qmax_threshold_vs_region)
+                scan_hits(scan_hits_qmax, qmax_thresholds, chamber_side=="B" ? 0 : scan_row[chamber_type + std::to_string(chamber_eta)],
+                          csc_chamber_cluster_qmax->at(ch), 1000.0);
+
             for (hit = 0; hit < chamber_hits_raw; ++hit){
 
                 hit_rad  = (csc_chamber_cluster_r->at(ch)).at(hit);
                 hit_adc  = (csc_chamber_cluster_qmax->at(ch)).at(hit);
                 pass_adc = (hit_adc > 100*1000);
 
-                hits_raw_vs_r[chamber_type_mdt+"_"+chamber_phi_str]->Fill(hit_rad, prescale_HLT);
+                lazy(hits_raw_vs_r, "hits_raw_vs_r_", chamber_type_mdt+"_"+chamber_phi_str)->Fill(hit_rad, prescale_HLT);
 
                 if (chamber_type=="CSL"){
                     hits_raw_vs_lumi_vs_r_L->Fill(lumi,          hit_rad, prescale_HLT);
@@ -216,6 +308,14 @@ int MuonRawHistograms::execute(int ents){
 
         evts->Fill(1, prescale_HLT);
 
+        progress_events = ent;
+        progress_hits  += hits_raw_mdt_full + hits_raw_csc_full;
+
+        if (hits_vs_adc_threshold_vs_region)
+            fill_threshold_scan(hits_vs_adc_threshold_vs_region, scan_hits_adc, adc_thresholds);
+        if (hits_vs_qmax_threshold_vs_region)
+            fill_threshold_scan(hits_vs_qmax_threshold_vs_region, scan_hits_qmax, qmax_thresholds);
+
         lumi = lbAverageLuminosity/1000.0;
         hits_raw_vs_lumi_vs_evts_mdt_full->Fill(lumi, hits_raw_mdt_full,                   prescale_HLT);
         hits_raw_vs_lumi_vs_evts_mdt_EIL1->Fill(lumi, hits_raw["EIL1A"]+hits_raw["EIL1C"], prescale_HLT);
@@ -247,14 +347,14 @@ int MuonRawHistograms::execute(int ents){
         hits_adc_vs_lumi_vs_evts_csc_CSL1->Fill(lumi, hits_adc["CSL1A"]+hits_adc["CSL1C"], prescale_HLT);
         hits_adc_vs_lumi_vs_evts_csc_CSS1->Fill(lumi, hits_adc["CSS1A"]+hits_adc["CSS1C"], prescale_HLT);
 
-        for (auto type: chamber_types)
-            for (eta = 1; eta <= eta_n; ++eta){
-                
-                chamber = type + std::to_string(eta);
-                hits_raw_vs_lumi[chamber]->Fill(lumi, (hits_raw[chamber+"A"]+hits_raw[chamber+"C"]) * prescale_HLT);
-                hits_adc_vs_lumi[chamber]->Fill(lumi, (hits_adc[chamber+"A"]+hits_adc[chamber+"C"]) * prescale_HLT);
+        if (skim || bcid_regions)
+            sum_regions();
 
-            }
+        if (skim)
+            fill_skim();
+
+        if (bcid_regions)
+            fill_bcid_regions();
 
         for (auto type: chamber_types)
             for (auto side: chamber_sides)
@@ -282,7 +382,10 @@ int MuonRawHistograms::execute(int ents){
     time_end = std::chrono::system_clock::now();
     elapsed_seconds = time_end - time_start;
 
-    printf("%8i / %8i in %.2f s = %.2f Hz\n", ent, entries, elapsed_seconds.count(), (float)(entries) / elapsed_seconds.count());
+    seconds_execute = elapsed_seconds.count();
+    progress_bytes  = file->GetBytesRead();
+
+    printf("%8i / %8i in %.2f s = %.2f Hz, of which %.2f s reading\n", ent, entries, elapsed_seconds.count(), (float)(entries) / elapsed_seconds.count(), seconds_read);
 
     return 0;
 }
@@ -290,17 +393,678 @@ int MuonRawHistograms::execute(int ents){
 int MuonRawHistograms::finalize(){
 
     output = TFile::Open(output_path.c_str(), "recreate");
-    outdir = output->mkdir(run.c_str());
-    outdir->cd();
 
-    for (auto hist: histograms1D) hist->Write();
-    for (auto hist: histograms2D) hist->Write();
-    
+    // one directory per run seen, and one metadata entry per run
+    std::string current = run;
+    std::vector<std::string> runs = {run};
+    for (auto& iter: run_sets)
+        if (iter.first != run)
+            runs.push_back(iter.first);
+
+    for (auto next: runs){
+
+        if (next != run){
+            store_run();
+            restore_run(next);
+        }
+
+        outdir = output->mkdir(run.c_str());
+        outdir->cd();
+
+        for (auto hist: histograms1D) hist->Write();
+        for (auto hist: histograms2D) hist->Write();
+        write_chamber_tensor();
+        if (placeholders)
+            book_placeholders();
+        for (auto iter: hits_raw_vs_r) iter.second->Write();
+        for (auto iter: hits_adc_vs_r) iter.second->Write();
+        if (bcid_regions)
+            write_bcid_regions();
+
+        output->cd();
+        write_metadata();
+    }
+
+    output->cd();
+    metadata->Write();
     output->Close();
+    metadata = 0;
+
+    // back to the run the job ended with, and drop the others
+    if (run != current){
+        store_run();
+        restore_run(current);
+    }
+    for (auto& iter: run_sets){
+        for (auto hist: iter.second.histograms1D) delete hist;
+        for (auto hist: iter.second.histograms2D) delete hist;
+        for (auto lazies: iter.second.lazy)
+            for (auto hist: lazies) delete hist.second;
+        for (auto hist: iter.second.chamber_tensor) delete hist;
+    }
+    run_sets.clear();
+
+    if (skim){
+        skim_file->cd();
+        skim->Write();
+        skim_file->Close();
+        delete skim_file;
+        skim_file = 0;
+        skim      = 0;
+    }
     
     return 0;
 }
 
+void MuonRawHistograms::keep(TH1F*& hist){
+    histograms1D.push_back(hist);
+    slots1D.push_back(&hist);
+}
+
+void MuonRawHistograms::keep(TH2F*& hist){
+    histograms2D.push_back(hist);
+    slots2D.push_back(&hist);
+}
+
+void MuonRawHistograms::switch_run(){
+
+    // the histograms, metadata and bcid arrays of the run so far are set aside,
+    // and those of the new run are taken up, or booked if the run is new
+    store_run();
+    restore_run("00"+std::to_string(RunNumber));
+}
+
+void MuonRawHistograms::store_run(){
+
+    RunSet& set = run_sets[run];
+
+    set.histograms1D    = histograms1D;
+    set.histograms2D    = histograms2D;
+    set.bunches         = meta_bunches;
+    set.lbn_min         = meta_lbn_min;
+    set.lbn_max         = meta_lbn_max;
+    set.events          = meta_events;
+    set.events_weighted = meta_events_weighted;
+    set.mu_min          = meta_mu_min;
+    set.mu_max          = meta_mu_max;
+    set.lumi_min        = meta_lumi_min;
+    set.lumi_max        = meta_lumi_max;
+
+    set.lb_lumi.swap(meta_lb_lumi);
+    set.chamber_tensor = chamber_tensor;
+    set.lazy.resize(2);
+    set.lazy[0].swap(hits_raw_vs_r);
+    set.lazy[1].swap(hits_adc_vs_r);
+    set.bcid_evts.swap(bcid_evts);
+    set.bcid_lumi.swap(bcid_lumi);
+    set.bcid_hits_raw.swap(bcid_hits_raw);
+    set.bcid_hits_adc.swap(bcid_hits_adc);
+}
+
+void MuonRawHistograms::restore_run(std::string next){
+
+    std::string name = "";
+
+    if (run_sets.count(next)){
+
+        RunSet& set = run_sets[next];
+
+        histograms1D         = set.histograms1D;
+        histograms2D         = set.histograms2D;
+        meta_bunches         = set.bunches;
+        meta_lbn_min         = set.lbn_min;
+        meta_lbn_max         = set.lbn_max;
+        meta_events          = set.events;
+        meta_events_weighted = set.events_weighted;
+        meta_mu_min          = set.mu_min;
+        meta_mu_max          = set.mu_max;
+        meta_lumi_min        = set.lumi_min;
+        meta_lumi_max        = set.lumi_max;
+
+        meta_lb_lumi.swap(set.lb_lumi);
+        chamber_tensor = set.chamber_tensor;
+        hits_raw_vs_r.swap(set.lazy[0]);
+        hits_adc_vs_r.swap(set.lazy[1]);
+        bcid_evts.swap(set.bcid_evts);
+        bcid_lumi.swap(set.bcid_lumi);
+        bcid_hits_raw.swap(set.bcid_hits_raw);
+        bcid_hits_adc.swap(set.bcid_hits_adc);
+
+        run_sets.erase(next);
+    }
+    else {
+
+        // empty copies of the histograms of the current run, named *_next
+        for (auto& hist: histograms1D){
+            name = hist->GetName();
+            hist = (TH1F*)(hist->Clone((name.substr(0, name.size() - run.size()) + next).c_str()));
+            hist->Reset();
+            hist->SetDirectory(0);
+        }
+        for (auto& hist: histograms2D){
+            name = hist->GetName();
+            hist = (TH2F*)(hist->Clone((name.substr(0, name.size() - run.size()) + next).c_str()));
+            hist->Reset();
+            hist->SetDirectory(0);
+        }
+
+        meta_events          = 0;
+        meta_events_weighted = 0;
+        meta_lb_lumi.clear();
+        hits_raw_vs_r.clear();
+        hits_adc_vs_r.clear();
+        reset_bcid_regions();
+        for (auto& hist: chamber_tensor){
+            name = hist->GetName();
+            hist = (TH2*)(hist->Clone((name.substr(0, name.size() - run.size()) + next).c_str()));
+            hist->Reset();
+            hist->SetDirectory(0);
+        }
+    }
+
+    // point the named histograms at the new set
+    for (unsigned int ihist = 0; ihist < slots1D.size(); ++ihist) *slots1D[ihist] = histograms1D[ihist];
+    for (unsigned int ihist = 0; ihist < slots2D.size(); ++ihist) *slots2D[ihist] = histograms2D[ihist];
+
+    run        = next;
+    run_number = std::stoi(next);
+}
+
+void MuonRawHistograms::fill_metadata(){
+
+    if (meta_events == 0){
+        meta_bunches  = colliding_bunches;
+        meta_lbn_min  = lbn;
+        meta_lbn_max  = lbn;
+        meta_mu_min   = avgIntPerXing;
+        meta_mu_max   = avgIntPerXing;
+        meta_lumi_min = lbAverageLuminosity/1000.0;
+        meta_lumi_max = lbAverageLuminosity/1000.0;
+    }
+    if (colliding_bunches != meta_bunches)
+        std::cout << " WARNING MuonRawHistograms::fill_metadata: colliding bunches change from "
+                  << meta_bunches << " to " << colliding_bunches << " in lbn " << lbn << std::endl;
+
+    meta_lbn_min  = std::min(meta_lbn_min,  lbn);
+    meta_lbn_max  = std::max(meta_lbn_max,  lbn);
+    meta_mu_min   = std::min(meta_mu_min,   avgIntPerXing);
+    meta_mu_max   = std::max(meta_mu_max,   avgIntPerXing);
+    meta_lumi_min = std::min(meta_lumi_min, lbAverageLuminosity/1000.0);
+    meta_lumi_max = std::max(meta_lumi_max, lbAverageLuminosity/1000.0);
+
+    meta_events          += 1;
+    meta_events_weighted += prescale_HLT;
+    meta_lb_lumi[lbn]     = lbAverageLuminosity;
+}
+
+void MuonRawHistograms::write_metadata(){
+
+    // one entry per run per job: hadd chains them, and scripts/run_metadata.py merges them per run
+    meta_run = run_number;
+    meta_lbs.clear();
+    meta_lbs_lumi.clear();
+    for (auto iter: meta_lb_lumi){
+        meta_lbs.push_back(iter.first);
+        meta_lbs_lumi.push_back(iter.second);
+    }
+
+    if (!metadata){
+        metadata = new TTree("metadata", "run metadata");
+        metadata->Branch("RunNumber",       &meta_run);
+        metadata->Branch("bunches",         &meta_bunches);
+        metadata->Branch("lbn_min",         &meta_lbn_min);
+        metadata->Branch("lbn_max",         &meta_lbn_max);
+        metadata->Branch("events",          &meta_events);
+        metadata->Branch("events_weighted", &meta_events_weighted);
+        metadata->Branch("mu_min",          &meta_mu_min);
+        metadata->Branch("mu_max",          &meta_mu_max);
+        metadata->Branch("lumi_min",        &meta_lumi_min);
+        metadata->Branch("lumi_max",        &meta_lumi_max);
+        metadata->Branch("lbs",             &meta_lbs);
+        metadata->Branch("lbs_lumi",        &meta_lbs_lumi);
+    }
+
+    // a job without events has no bunches or lumiblocks to merge
+    if (meta_events == 0)
+        return;
+    metadata->Fill();
+}
+
+void MuonRawHistograms::reset_histograms(){
+
+    std::string previous = run;
+    std::string name     = "";
+
+    tree->GetEntry(1);
+    run = std::to_string(RunNumber);
+    run = "00"+run;
+    run_number = RunNumber;
+
+    // histograms are named *_run
+    for (auto hist: histograms1D){
+        hist->Reset();
+        name = hist->GetName();
+        hist->SetName((name.substr(0, name.size() - previous.size()) + run).c_str());
+    }
+    for (auto hist: histograms2D){
+        hist->Reset();
+        name = hist->GetName();
+        hist->SetName((name.substr(0, name.size() - previous.size()) + run).c_str());
+    }
+
+    for (auto hist: chamber_tensor){
+        hist->Reset();
+        name = hist->GetName();
+        hist->SetName((name.substr(0, name.size() - previous.size()) + run).c_str());
+    }
+
+    // booked again on their first fill in the next file
+    for (auto lazies: {&hits_raw_vs_r, &hits_adc_vs_r}){
+        for (auto iter: *lazies)
+            delete iter.second;
+        lazies->clear();
+    }
+
+    meta_events          = 0;
+    meta_events_weighted = 0;
+    meta_lb_lumi.clear();
+    meta_lbs.clear();
+    meta_lbs_lumi.clear();
+
+    reset_bcid_regions();
+}
+
+TH1F* MuonRawHistograms::lazy(std::map<std::string, TH1F*>& hists, std::string prefix, std::string key){
+
+    // per-chamber histograms are booked on their first fill,
+    // so chambers without hits in a stream cost no memory
+    if (hists.count(key))
+        return hists[key];
+
+    std::string name = prefix + key + "_" + run;
+    TH1F* hist = 0;
+    if (key.find("EIL") == 0)
+        hist = new TH1F(name.c_str(), "", 500, 0, 5200);
+    else
+        hist = new TH1F(name.c_str(), "", 500, 0, 5440);
+
+    hist->Sumw2();
+    hist->SetDirectory(0);
+    hist->SetMarkerStyle(20);
+    hist->SetMarkerSize(1);
+
+    hists[key] = hist;
+    return hist;
+}
+
+void MuonRawHistograms::set_chamber_tensor(int mode){
+    chamber_tensor_mode = mode;
+}
+
+void MuonRawHistograms::book_chamber_tensor(){
+
+    // hits per event in every chamber vs. lumi, as one dense histogram per type of hits
+    // [lumi, chamber], instead of one histogram per chamber
+    if (chamber_tensor_mode == 0)
+        return;
+
+    // one x-bin per chamber of the layout, in the order of chamber_types, eta, side and sector,
+    // so the chambers of a type and eta station are neighbours
+    std::vector<std::string> labels;
+    chamber_bins.assign(chamber_types.size() * (eta_n+1) * chamber_sides.size() * 17, 0);
+    chamber_ranges.clear();
+    for (unsigned int itype = 0; itype < chamber_types.size(); ++itype){
+        std::string type = chamber_types[itype];
+        chamber_type_index[type] = itype;
+        for (int eta = 1; eta <= std::min(chamber_eta_max[type], eta_n); ++eta){
+            int first = (int)(labels.size()) + 1;
+            for (unsigned int iside = 0; iside < chamber_sides.size(); ++iside){
+                if (chamber_sides[iside] == "B")
+                    continue;
+                for (auto phi: chamber_sectors(type)){
+                    labels.push_back(type + std::to_string(eta) + chamber_sides[iside] + phi_string(phi));
+                    chamber_bins[((itype*(eta_n+1) + eta)*chamber_sides.size() + iside)*17 + phi] = (int)(labels.size());
+                }
+            }
+            chamber_ranges[type + std::to_string(eta)] = std::make_pair(first, (int)(labels.size()));
+        }
+    }
+
+    // the range of the lumi axis follows the other lumi axes, its bins stay coarse
+    int lumi_bins = 0; float lumi_lo = 0; float lumi_hi = 16;
+    axis("lumi", lumi_bins, lumi_lo, lumi_hi);
+
+    int nchambers = (int)(labels.size());
+    std::string title = ";chamber;inst. lumi. [e^{33} cm^{-2} s^{-1}];hits";
+
+    chamber_tensor.clear();
+    for (std::string hits: {"raw", "adc"}){
+
+        std::string name = "hits_"+hits+"_vs_chamber_vs_lumi_"+run;
+        TH2* hist = 0;
+        if (chamber_tensor_mode == 1)
+            hist = new TH2I(name.c_str(), title.c_str(), nchambers, 0.5, nchambers+0.5, chamber_tensor_lumi_bins, lumi_lo, lumi_hi);
+        else
+            hist = new TH2D(name.c_str(), title.c_str(), nchambers, 0.5, nchambers+0.5, chamber_tensor_lumi_bins, lumi_lo, lumi_hi);
+        if (chamber_tensor_mode == 3)
+            hist->Sumw2();
+        hist->SetDirectory(0);
+
+        for (int ichamber = 0; ichamber < nchambers; ++ichamber)
+            hist->GetXaxis()->SetBinLabel(ichamber+1, labels[ichamber].c_str());
+
+        chamber_tensor.push_back(hist);
+    }
+}
+
+std::vector<int> MuonRawHistograms::chamber_sectors(std::string type){
+
+    if (chamber_sectors_listed.count(type))
+        return chamber_sectors_listed[type];
+
+    std::vector<int> sectors;
+    for (int phi = (type[2] == 'S') ? 2 : 1; phi <= 16; phi += 2)
+        sectors.push_back(phi);
+    return sectors;
+}
+
+int MuonRawHistograms::chamber_index(std::string type, int eta, std::string side, int phi){
+
+    // the x-bin of a chamber in the tensors, or 0, the underflow, if it is not in the layout
+    auto itype = chamber_type_index.find(type);
+    int  iside = std::find(chamber_sides.begin(), chamber_sides.end(), side) - chamber_sides.begin();
+    if (itype == chamber_type_index.end() || eta < 1 || eta > eta_n || iside >= (int)(chamber_sides.size()) || phi < 1 || phi > 16)
+        return 0;
+    return chamber_bins[((itype->second*(eta_n+1) + eta)*chamber_sides.size() + iside)*17 + phi];
+}
+
+void MuonRawHistograms::fill_chamber_tensor(int ichamber, int raw, int adc, float lumi){
+
+    // unweighted counts in integer mode, hits times prescale otherwise
+    double weight = (chamber_tensor_mode == 1) ? 1.0 : prescale_HLT;
+
+    if (raw > 0)
+        chamber_tensor[0]->Fill(ichamber, lumi, raw * weight);
+    if (adc > 0)
+        chamber_tensor[1]->Fill(ichamber, lumi, adc * weight);
+}
+
+void MuonRawHistograms::write_chamber_tensor(){
+
+    // the tensors, and projected from them the hits of every chamber type and eta station vs. lumi,
+    // e.g. hits_raw_vs_lumi_EIL1, over both sides and all sectors. with placeholders, the empty ones too.
+    std::vector<std::string> hits = {"raw", "adc"};
+    std::string chamber = "";
+    std::string name    = "";
+    TH1D* projection    = 0;
+
+    for (unsigned int ihits = 0; ihits < chamber_tensor.size(); ++ihits){
+
+        chamber_tensor[ihits]->Write();
+
+        for (auto type: chamber_types)
+            for (int eta = 1; eta <= eta_n; ++eta){
+
+                chamber = type + std::to_string(eta);
+                name    = "hits_"+hits[ihits]+"_vs_lumi_"+chamber+"_"+run;
+                if (!chamber_ranges.count(chamber) && !placeholders)
+                    continue;
+
+                if (chamber_ranges.count(chamber))
+                    projection = chamber_tensor[ihits]->ProjectionY(name.c_str(), chamber_ranges[chamber].first, chamber_ranges[chamber].second, "e");
+                else {
+                    projection = chamber_tensor[ihits]->ProjectionY(name.c_str(), 1, 1, "e");
+                    projection->Reset();
+                }
+
+                if (placeholders || projection->Integral(0, projection->GetNbinsX()+1) > 0){
+                    projection->SetMarkerStyle(20);
+                    projection->SetMarkerSize(1);
+                    projection->Write();
+                }
+                delete projection;
+            }
+    }
+}
+
+void MuonRawHistograms::set_axis(std::string quantity, int bins, float lo, float hi){
+    axes[quantity] = {(float)(bins), lo, hi};
+}
+
+void MuonRawHistograms::axis(std::string quantity, int& bins, float& lo, float& hi){
+
+    // the axis of a quantity from set_axis, e.g. picked by scripts/binning.py, or else the default given.
+    // bins of 0 keep the default number of bins.
+    if (!axes.count(quantity))
+        return;
+    if (axes[quantity][0] > 0)
+        bins = (int)(axes[quantity][0]);
+    lo = axes[quantity][1];
+    hi = axes[quantity][2];
+}
+
+void MuonRawHistograms::set_adc_thresholds(std::vector<int> thresholds){
+    std::sort(thresholds.begin(), thresholds.end());
+    adc_thresholds = thresholds;
+}
+
+void MuonRawHistograms::set_qmax_thresholds(std::vector<int> thresholds){
+    std::sort(thresholds.begin(), thresholds.end());
+    qmax_thresholds = thresholds;
+}
+
+TH2F* MuonRawHistograms::book_threshold_scan(std::string name, std::string title, std::vector<int>& thresholds, std::string detector){
+
+    // one row per skim region of the detector, the full detector first
+    std::vector<std::string> regions;
+    for (auto region: skim_regions)
+        if (region.substr(0, 4) == detector+"_")
+            regions.push_back(region);
+
+    int nthresholds = (int)(thresholds.size());
+    int nregions    = (int)(regions.size());
+
+    TH2F* scan = new TH2F((name+"_"+run).c_str(), title.c_str(), nthresholds, -0.5, nthresholds-0.5, nregions, 0, nregions);
+    for (int ithr = 0; ithr < nthresholds; ++ithr)
+        scan->GetXaxis()->SetBinLabel(ithr+1, std::to_string(thresholds[ithr]).c_str());
+    for (int row = 0; row < nregions; ++row){
+        scan->GetYaxis()->SetBinLabel(row+1, regions[row].c_str());
+        if (row > 0)
+            scan_row[regions[row].substr(4)] = row;
+    }
+
+    return scan;
+}
+
+void MuonRawHistograms::scan_hits(std::vector<int>& counts, std::vector<int>& thresholds, int row, std::vector<int>& values, double unit){
+
+    // one binary search per hit: the number of thresholds below it, i.e. those it passes.
+    // the counts above each threshold are summed up once per event, in fill_threshold_scan.
+    int nbins = (int)(thresholds.size()) + 1;
+    int below = 0;
+
+    if ((int)(counts.size()) < (row+1) * nbins)
+        counts.resize((row+1) * nbins, 0);
+
+    for (auto value: values){
+        below = std::lower_bound(thresholds.begin(), thresholds.end(), value / unit) - thresholds.begin();
+        counts[below] += 1;
+        if (row > 0)
+            counts[row*nbins + below] += 1;
+    }
+}
+
+void MuonRawHistograms::fill_threshold_scan(TH2F* scan, std::vector<int>& counts, std::vector<int>& thresholds){
+
+    int nthresholds = (int)(thresholds.size());
+    int nbins       = nthresholds + 1;
+    int nrows       = (int)(counts.size()) / nbins;
+    int above       = 0;
+
+    for (int row = 0; row < nrows; ++row){
+        above = 0;
+        for (int ithr = nthresholds-1; ithr >= 0; --ithr){
+            above += counts[row*nbins + ithr+1];
+            if (above > 0)
+                scan->Fill(ithr, row, above * prescale_HLT);
+        }
+    }
+
+    counts.assign(counts.size(), 0);
+}
+
+void MuonRawHistograms::set_placeholders(bool on){
+    placeholders = on;
+}
+
+void MuonRawHistograms::book_placeholders(){
+
+    // the per-chamber histograms which were never filled, empty.
+    // those vs. lumi are written by write_chamber_tensor.
+    for (auto phi: phi_sectors_L){
+        lazy(hits_raw_vs_r, "hits_raw_vs_r_", "EIL_"+phi);
+        lazy(hits_adc_vs_r, "hits_adc_vs_r_", "EIL_"+phi);
+    }
+    for (auto phi: phi_sectors_S){
+        lazy(hits_raw_vs_r, "hits_raw_vs_r_", "EIS_"+phi);
+        lazy(hits_adc_vs_r, "hits_adc_vs_r_", "EIS_"+phi);
+    }
+}
+
+void MuonRawHistograms::set_skim_path(std::string path){
+    skim_path = path;
+}
+
+void MuonRawHistograms::initialize_skim(){
+
+    // keep the histograms out of the skim file
+    TDirectory* here = gDirectory;
+
+    skim_file = TFile::Open(skim_path.c_str(), "recreate");
+    if (!skim_file)
+        std::cout << "\n FATAL FUCK MuonRawHistograms::initialize_skim: no file \n" << std::endl;
+
+    skim = new TTree("skim", "hits per region per event");
+    skim->Branch("RunNumber",           &RunNumber);
+    skim->Branch("lbn",                 &lbn);
+    skim->Branch("bcid",                &bcid);
+    skim->Branch("lumi",                &skim_lumi);
+    skim->Branch("lbLuminosityPerBCID", &lbLuminosityPerBCID);
+    skim->Branch("actIntPerXing",       &actIntPerXing);
+    skim->Branch("avgIntPerXing",       &avgIntPerXing);
+    skim->Branch("prescale_HLT",        &prescale_HLT);
+
+    // sized once, as the branches hold the addresses of their elements
+    skim_hits_raw.assign(skim_regions.size(), 0);
+    skim_hits_adc.assign(skim_regions.size(), 0);
+    for (unsigned int region = 0; region < skim_regions.size(); ++region){
+        skim->Branch(("hits_raw_"+skim_regions[region]).c_str(), &skim_hits_raw[region]);
+        skim->Branch(("hits_adc_"+skim_regions[region]).c_str(), &skim_hits_adc[region]);
+    }
+
+    here->cd();
+}
+
+void MuonRawHistograms::fill_skim(){
+
+    std::copy(region_hits_raw.begin(), region_hits_raw.end(), skim_hits_raw.begin());
+    std::copy(region_hits_adc.begin(), region_hits_adc.end(), skim_hits_adc.begin());
+
+    skim_lumi = lbAverageLuminosity/1000.0;
+    skim->Fill();
+}
+
+std::vector<std::vector<int*> > MuonRawHistograms::region_slots(int& mdt_full, int& csc_full, std::map<std::string, int>& hits){
+
+    // for each skim region, the counts it adds up: the full detectors, or e.g. mdt_EIL1 -> EIL1A + EIL1C.
+    // the entries of the map are made here, and are only ever reset, so the pointers stay valid.
+    std::vector<std::vector<int*> > slots;
+    for (auto region: skim_regions){
+        if      (region == "mdt_full") slots.push_back({&mdt_full});
+        else if (region == "csc_full") slots.push_back({&csc_full});
+        else                           slots.push_back({&hits[region.substr(4)+"A"], &hits[region.substr(4)+"C"]});
+    }
+    return slots;
+}
+
+void MuonRawHistograms::sum_regions(){
+
+    int nregions = (int)(skim_regions.size());
+    region_hits_raw.assign(nregions, 0);
+    region_hits_adc.assign(nregions, 0);
+
+    for (int region = 0; region < nregions; ++region){
+        for (auto slot: region_slots_raw[region]) region_hits_raw[region] += *slot;
+        for (auto slot: region_slots_adc[region]) region_hits_adc[region] += *slot;
+    }
+}
+
+void MuonRawHistograms::set_bcid_regions(bool on){
+    bcid_regions = on;
+}
+
+void MuonRawHistograms::reset_bcid_regions(){
+
+    bcid_evts.assign(bcid_n, 0);
+    bcid_lumi.assign(bcid_n, 0);
+    bcid_hits_raw.assign(bcid_n * skim_regions.size(), 0);
+    bcid_hits_adc.assign(bcid_n * skim_regions.size(), 0);
+}
+
+void MuonRawHistograms::fill_bcid_regions(){
+
+    // unweighted: the counts are integers, unlike evts_vs_bcid and hits_vs_bcid_*, which are weighted with prescale_HLT
+    if (bcid < 0 || bcid >= bcid_n)
+        return;
+
+    if ((int)(bcid_evts.size()) != bcid_n)
+        reset_bcid_regions();
+
+    int nregions = (int)(skim_regions.size());
+    int offset   = bcid * nregions;
+
+    bcid_evts[bcid] += 1;
+    bcid_lumi[bcid] += lbLuminosityPerBCID;
+
+    for (int region = 0; region < nregions; ++region){
+        bcid_hits_raw[offset + region] += region_hits_raw[region];
+        bcid_hits_adc[offset + region] += region_hits_adc[region];
+    }
+}
+
+void MuonRawHistograms::write_bcid_regions(){
+
+    // booked only now, in the current directory, so the event loop fills plain arrays
+    int nregions = (int)(skim_regions.size());
+    if ((int)(bcid_evts.size()) != bcid_n)
+        reset_bcid_regions();
+
+    TH1I* evts_unweighted = new TH1I(("evts_vs_bcid_unweighted_"+run).c_str(), "", bcid_n, -0.5, bcid_n-0.5);
+    TH1D* lumi_unweighted = new TH1D(("lumi_vs_bcid_unweighted_"+run).c_str(), "", bcid_n, -0.5, bcid_n-0.5);
+    TH2I* hits_raw_bcid   = new TH2I(("hits_raw_vs_bcid_vs_region_unweighted_"+run).c_str(), "", bcid_n, -0.5, bcid_n-0.5, nregions, 0, nregions);
+    TH2I* hits_adc_bcid   = new TH2I(("hits_adc_vs_bcid_vs_region_unweighted_"+run).c_str(), "", bcid_n, -0.5, bcid_n-0.5, nregions, 0, nregions);
+
+    for (int region = 0; region < nregions; ++region){
+        hits_raw_bcid->GetYaxis()->SetBinLabel(region+1, skim_regions[region].c_str());
+        hits_adc_bcid->GetYaxis()->SetBinLabel(region+1, skim_regions[region].c_str());
+    }
+
+    for (int bc = 0; bc < bcid_n; ++bc){
+        evts_unweighted->SetBinContent(bc+1, bcid_evts[bc]);
+        lumi_unweighted->SetBinContent(bc+1, bcid_lumi[bc]);
+        for (int region = 0; region < nregions; ++region){
+            hits_raw_bcid->SetBinContent(bc+1, region+1, bcid_hits_raw[bc*nregions + region]);
+            hits_adc_bcid->SetBinContent(bc+1, region+1, bcid_hits_adc[bc*nregions + region]);
+        }
+    }
+
+    for (auto hist: std::vector<TH1*>{evts_unweighted, lumi_unweighted, hits_raw_bcid, hits_adc_bcid}){
+        hist->ResetStats();
+        hist->Write();
+        delete hist;
+    }
+}
+
 void MuonRawHistograms::announce(){
     
     std::cout << std::endl;
@@ -353,11 +1117,52 @@ void MuonRawHistograms::initialize_branches(){
     tree->SetBranchAddress("csc_chamber_cluster_n_notecho", &csc_chamber_cluster_n_notecho);
 }
 
+void MuonRawHistograms::set_progress_print(bool on){
+    progress_print = on;
+}
+
+void MuonRawHistograms::set_runs(std::vector<int> runs){
+    select_runs = runs;
+}
+
+void MuonRawHistograms::set_lbs(int first, int last){
+    select_lb_first = first;
+    select_lb_last  = last;
+}
+
+bool MuonRawHistograms::selected(long ent){
+
+    // reads RunNumber and lbn of the entry, into the addresses of initialize_branches
+    tree->GetBranch("RunNumber")->GetEntry(ent);
+    tree->GetBranch("lbn")->GetEntry(ent);
+
+    if (!select_runs.empty() && std::find(select_runs.begin(), select_runs.end(), RunNumber) == select_runs.end())
+        return false;
+    if (select_lb_last >= select_lb_first && (lbn < select_lb_first || lbn > select_lb_last))
+        return false;
+    return true;
+}
+
+void MuonRawHistograms::set_cache_size(long bytes){
+    cache_size = bytes;
+}
+
+void MuonRawHistograms::initialize_cache(){
+
+    // a TTreeCache which learns the branches read in the first entries,
+    // then reads their baskets in a few large requests
+    if (cache_size <= 0)
+        return;
+    tree->SetCacheSize(cache_size);
+    tree->SetCacheLearnEntries(100);
+}
+
 void MuonRawHistograms::initialize_histograms(){
 
     tree->GetEntry(1);
     run = std::to_string(RunNumber);
     run = "00"+run;
+    run_number = RunNumber;
 
     int xbins = 0; float xlo = 0; float xhi = 0;
     int ybins = 0; float ylo = 0; float yhi = 0;
@@ -365,55 +1170,83 @@ void MuonRawHistograms::initialize_histograms(){
     evts = new TH1F(("evts_"+run).c_str(), "", 1, 0, 2);
     
     xbins = 200; xlo = 0; xhi = 16;
-    ybins = 200; ylo = 0;
+    axis("lumi", xbins, xlo, xhi);
     evts_vs_lumi                      = new TH1F(("evts_vs_lumi_"+run).c_str(),                      "", xbins, xlo, xhi);
-    hits_raw_vs_lumi_vs_evts_mdt_full = new TH2F(("hits_raw_vs_lumi_vs_evts_mdt_full_"+run).c_str(), "", xbins, xlo, xhi, ybins, ylo, 5000);
-    hits_raw_vs_lumi_vs_evts_mdt_EIL1 = new TH2F(("hits_raw_vs_lumi_vs_evts_mdt_EIL1_"+run).c_str(), "", xbins, xlo, xhi, ybins, ylo,  500);
-    hits_raw_vs_lumi_vs_evts_mdt_EIL2 = new TH2F(("hits_raw_vs_lumi_vs_evts_mdt_EIL2_"+run).c_str(), "", xbins, xlo, xhi, ybins, ylo,  300);
-    hits_raw_vs_lumi_vs_evts_mdt_EIS1 = new TH2F(("hits_raw_vs_lumi_vs_evts_mdt_EIS1_"+run).c_str(), "", xbins, xlo, xhi, ybins, ylo,  400);
-    hits_raw_vs_lumi_vs_evts_mdt_EIS2 = new TH2F(("hits_raw_vs_lumi_vs_evts_mdt_EIS2_"+run).c_str(), "", xbins, xlo, xhi, ybins, ylo,  300);
-    hits_raw_vs_lumi_vs_evts_mdt_EML1 = new TH2F(("hits_raw_vs_lumi_vs_evts_mdt_EML1_"+run).c_str(), "", xbins, xlo, xhi, ybins, ylo,  300);
-    hits_raw_vs_lumi_vs_evts_mdt_EML2 = new TH2F(("hits_raw_vs_lumi_vs_evts_mdt_EML2_"+run).c_str(), "", xbins, xlo, xhi, ybins, ylo,  300);
-    hits_raw_vs_lumi_vs_evts_mdt_EMS1 = new TH2F(("hits_raw_vs_lumi_vs_evts_mdt_EMS1_"+run).c_str(), "", xbins, xlo, xhi, ybins, ylo,  300);
-    hits_raw_vs_lumi_vs_evts_mdt_EMS2 = new TH2F(("hits_raw_vs_lumi_vs_evts_mdt_EMS2_"+run).c_str(), "", xbins, xlo, xhi, ybins, ylo,  300);
-    hits_raw_vs_lumi_vs_evts_mdt_BIS7 = new TH2F(("hits_raw_vs_lumi_vs_evts_mdt_BIS7_"+run).c_str(), "", xbins, xlo, xhi, ybins, ylo,  200);
-    hits_raw_vs_lumi_vs_evts_mdt_BIS8 = new TH2F(("hits_raw_vs_lumi_vs_evts_mdt_BIS8_"+run).c_str(), "", xbins, xlo, xhi, ybins, ylo,  100);
-    hits_raw_vs_lumi_vs_evts_csc_full = new TH2F(("hits_raw_vs_lumi_vs_evts_csc_full_"+run).c_str(), "", xbins, xlo, xhi, ybins, ylo,  200);
-    hits_raw_vs_lumi_vs_evts_csc_CSL1 = new TH2F(("hits_raw_vs_lumi_vs_evts_csc_CSL1_"+run).c_str(), "", xbins, xlo, xhi, ybins, ylo,  200);
-    hits_raw_vs_lumi_vs_evts_csc_CSS1 = new TH2F(("hits_raw_vs_lumi_vs_evts_csc_CSS1_"+run).c_str(), "", xbins, xlo, xhi, ybins, ylo,  200);
-
-    hits_adc_vs_lumi_vs_evts_mdt_full = new TH2F(("hits_adc_vs_lumi_vs_evts_mdt_full_"+run).c_str(), "", xbins, xlo, xhi, ybins, ylo, 5000);
-    hits_adc_vs_lumi_vs_evts_mdt_EIL1 = new TH2F(("hits_adc_vs_lumi_vs_evts_mdt_EIL1_"+run).c_str(), "", xbins, xlo, xhi, ybins, ylo,  500);
-    hits_adc_vs_lumi_vs_evts_mdt_EIL2 = new TH2F(("hits_adc_vs_lumi_vs_evts_mdt_EIL2_"+run).c_str(), "", xbins, xlo, xhi, ybins, ylo,  300);
-    hits_adc_vs_lumi_vs_evts_mdt_EIS1 = new TH2F(("hits_adc_vs_lumi_vs_evts_mdt_EIS1_"+run).c_str(), "", xbins, xlo, xhi, ybins, ylo,  400);
-    hits_adc_vs_lumi_vs_evts_mdt_EIS2 = new TH2F(("hits_adc_vs_lumi_vs_evts_mdt_EIS2_"+run).c_str(), "", xbins, xlo, xhi, ybins, ylo,  300);
-    hits_adc_vs_lumi_vs_evts_mdt_EML1 = new TH2F(("hits_adc_vs_lumi_vs_evts_mdt_EML1_"+run).c_str(), "", xbins, xlo, xhi, ybins, ylo,  300);
-    hits_adc_vs_lumi_vs_evts_mdt_EML2 = new TH2F(("hits_adc_vs_lumi_vs_evts_mdt_EML2_"+run).c_str(), "", xbins, xlo, xhi, ybins, ylo,  300);
-    hits_adc_vs_lumi_vs_evts_mdt_EMS1 = new TH2F(("hits_adc_vs_lumi_vs_evts_mdt_EMS1_"+run).c_str(), "", xbins, xlo, xhi, ybins, ylo,  300);
-    hits_adc_vs_lumi_vs_evts_mdt_EMS2 = new TH2F(("hits_adc_vs_lumi_vs_evts_mdt_EMS2_"+run).c_str(), "", xbins, xlo, xhi, ybins, ylo,  300);
-    hits_adc_vs_lumi_vs_evts_mdt_BIS7 = new TH2F(("hits_adc_vs_lumi_vs_evts_mdt_BIS7_"+run).c_str(), "", xbins, xlo, xhi, ybins, ylo,  200);
-    hits_adc_vs_lumi_vs_evts_mdt_BIS8 = new TH2F(("hits_adc_vs_lumi_vs_evts_mdt_BIS8_"+run).c_str(), "", xbins, xlo, xhi, ybins, ylo,  100);
-    hits_adc_vs_lumi_vs_evts_csc_full = new TH2F(("hits_adc_vs_lumi_vs_evts_csc_full_"+run).c_str(), "", xbins, xlo, xhi, ybins, ylo,  200);
-    hits_adc_vs_lumi_vs_evts_csc_CSL1 = new TH2F(("hits_adc_vs_lumi_vs_evts_csc_CSL1_"+run).c_str(), "", xbins, xlo, xhi, ybins, ylo,  200);
-    hits_adc_vs_lumi_vs_evts_csc_CSS1 = new TH2F(("hits_adc_vs_lumi_vs_evts_csc_CSS1_"+run).c_str(), "", xbins, xlo, xhi, ybins, ylo,  200);
+
+    ybins = 200; ylo = 0; yhi = 5000;
+    axis("mdt_full", ybins, ylo, yhi);
+    hits_raw_vs_lumi_vs_evts_mdt_full = new TH2F(("hits_raw_vs_lumi_vs_evts_mdt_full_"+run).c_str(), "", xbins, xlo, xhi, ybins, ylo, yhi);
+    hits_adc_vs_lumi_vs_evts_mdt_full = new TH2F(("hits_adc_vs_lumi_vs_evts_mdt_full_"+run).c_str(), "", xbins, xlo, xhi, ybins, ylo, yhi);
+
+    ybins = 200; ylo = 0; yhi = 200;
+    axis("csc_full", ybins, ylo, yhi);
+    hits_raw_vs_lumi_vs_evts_csc_full = new TH2F(("hits_raw_vs_lumi_vs_evts_csc_full_"+run).c_str(), "", xbins, xlo, xhi, ybins, ylo, yhi);
+    hits_adc_vs_lumi_vs_evts_csc_full = new TH2F(("hits_adc_vs_lumi_vs_evts_csc_full_"+run).c_str(), "", xbins, xlo, xhi, ybins, ylo, yhi);
+
+    // the hits per event in each region, raw and adc on the same axis
+    ybins = 200; ylo = 0; yhi = 500; axis("mdt_EIL1", ybins, ylo, yhi);
+    hits_raw_vs_lumi_vs_evts_mdt_EIL1 = new TH2F(("hits_raw_vs_lumi_vs_evts_mdt_EIL1_"+run).c_str(), "", xbins, xlo, xhi, ybins, ylo, yhi);
+    hits_adc_vs_lumi_vs_evts_mdt_EIL1 = new TH2F(("hits_adc_vs_lumi_vs_evts_mdt_EIL1_"+run).c_str(), "", xbins, xlo, xhi, ybins, ylo, yhi);
+
+    ybins = 200; ylo = 0; yhi = 300; axis("mdt_EIL2", ybins, ylo, yhi);
+    hits_raw_vs_lumi_vs_evts_mdt_EIL2 = new TH2F(("hits_raw_vs_lumi_vs_evts_mdt_EIL2_"+run).c_str(), "", xbins, xlo, xhi, ybins, ylo, yhi);
+    hits_adc_vs_lumi_vs_evts_mdt_EIL2 = new TH2F(("hits_adc_vs_lumi_vs_evts_mdt_EIL2_"+run).c_str(), "", xbins, xlo, xhi, ybins, ylo, yhi);
+
+    ybins = 200; ylo = 0; yhi = 400; axis("mdt_EIS1", ybins, ylo, yhi);
+    hits_raw_vs_lumi_vs_evts_mdt_EIS1 = new TH2F(("hits_raw_vs_lumi_vs_evts_mdt_EIS1_"+run).c_str(), "", xbins, xlo, xhi, ybins, ylo, yhi);
+    hits_adc_vs_lumi_vs_evts_mdt_EIS1 = new TH2F(("hits_adc_vs_lumi_vs_evts_mdt_EIS1_"+run).c_str(), "", xbins, xlo, xhi, ybins, ylo, yhi);
+
+    ybins = 200; ylo = 0; yhi = 300; axis("mdt_EIS2", ybins, ylo, yhi);
+    hits_raw_vs_lumi_vs_evts_mdt_EIS2 = new TH2F(("hits_raw_vs_lumi_vs_evts_mdt_EIS2_"+run).c_str(), "", xbins, xlo, xhi, ybins, ylo, yhi);
+    hits_adc_vs_lumi_vs_evts_mdt_EIS2 = new TH2F(("hits_adc_vs_lumi_vs_evts_mdt_EIS2_"+run).c_str(), "", xbins, xlo, xhi, ybins, ylo, yhi);
+
+    ybins = 200; ylo = 0; yhi = 300; axis("mdt_EML1", ybins, ylo, yhi);
+    hits_raw_vs_lumi_vs_evts_mdt_EML1 = new TH2F(("hits_raw_vs_lumi_vs_evts_mdt_EML1_"+run).c_str(), "", xbins, xlo, xhi, ybins, ylo, yhi);
+    hits_adc_vs_lumi_vs_evts_mdt_EML1 = new TH2F(("hits_adc_vs_lumi_vs_evts_mdt_EML1_"+run).c_str(), "", xbins, xlo, xhi, ybins, ylo, yhi);
+
+    ybins = 200; ylo = 0; yhi = 300; axis("mdt_EML2", ybins, ylo, yhi);
+    hits_raw_vs_lumi_vs_evts_mdt_EML2 = new TH2F(("hits_raw_vs_lumi_vs_evts_mdt_EML2_"+run).c_str(), "", xbins, xlo, xhi, ybins, ylo, yhi);
+    hits_adc_vs_lumi_vs_evts_mdt_EML2 = new TH2F(("hits_adc_vs_lumi_vs_evts_mdt_EML2_"+run).c_str(), "", xbins, xlo, xhi, ybins, ylo, yhi);
+
+    ybins = 200; ylo = 0; yhi = 300; axis("mdt_EMS1", ybins, ylo, yhi);
+    hits_raw_vs_lumi_vs_evts_mdt_EMS1 = new TH2F(("hits_raw_vs_lumi_vs_evts_mdt_EMS1_"+run).c_str(), "", xbins, xlo, xhi, ybins, ylo, yhi);
+    hits_adc_vs_lumi_vs_evts_mdt_EMS1 = new TH2F(("hits_adc_vs_lumi_vs_evts_mdt_EMS1_"+run).c_str(), "", xbins, xlo, xhi, ybins, ylo, yhi);
+
+    ybins = 200; ylo = 0; yhi = 300; axis("mdt_EMS2", ybins, ylo, yhi);
+    hits_raw_vs_lumi_vs_evts_mdt_EMS2 = new TH2F(("hits_raw_vs_lumi_vs_evts_mdt_EMS2_"+run).c_str(), "", xbins, xlo, xhi, ybins, ylo, yhi);
+    hits_adc_vs_lumi_vs_evts_mdt_EMS2 = new TH2F(("hits_adc_vs_lumi_vs_evts_mdt_EMS2_"+run).c_str(), "", xbins, xlo, xhi, ybins, ylo, yhi);
+
+    ybins = 200; ylo = 0; yhi = 200; axis("mdt_BIS7", ybins, ylo, yhi);
+    hits_raw_vs_lumi_vs_evts_mdt_BIS7 = new TH2F(("hits_raw_vs_lumi_vs_evts_mdt_BIS7_"+run).c_str(), "", xbins, xlo, xhi, ybins, ylo, yhi);
+    hits_adc_vs_lumi_vs_evts_mdt_BIS7 = new TH2F(("hits_adc_vs_lumi_vs_evts_mdt_BIS7_"+run).c_str(), "", xbins, xlo, xhi, ybins, ylo, yhi);
+
+    ybins = 200; ylo = 0; yhi = 100; axis("mdt_BIS8", ybins, ylo, yhi);
+    hits_raw_vs_lumi_vs_evts_mdt_BIS8 = new TH2F(("hits_raw_vs_lumi_vs_evts_mdt_BIS8_"+run).c_str(), "", xbins, xlo, xhi, ybins, ylo, yhi);
+    hits_adc_vs_lumi_vs_evts_mdt_BIS8 = new TH2F(("hits_adc_vs_lumi_vs_evts_mdt_BIS8_"+run).c_str(), "", xbins, xlo, xhi, ybins, ylo, yhi);
+
+    ybins = 200; ylo = 0; yhi = 200; axis("csc_CSL1", ybins, ylo, yhi);
+    hits_raw_vs_lumi_vs_evts_csc_CSL1 = new TH2F(("hits_raw_vs_lumi_vs_evts_csc_CSL1_"+run).c_str(), "", xbins, xlo, xhi, ybins, ylo, yhi);
+    hits_adc_vs_lumi_vs_evts_csc_CSL1 = new TH2F(("hits_adc_vs_lumi_vs_evts_csc_CSL1_"+run).c_str(), "", xbins, xlo, xhi, ybins, ylo, yhi);
+
+    ybins = 200; ylo = 0; yhi = 200; axis("csc_CSS1", ybins, ylo, yhi);
+    hits_raw_vs_lumi_vs_evts_csc_CSS1 = new TH2F(("hits_raw_vs_lumi_vs_evts_csc_CSS1_"+run).c_str(), "", xbins, xlo, xhi, ybins, ylo, yhi);
+    hits_adc_vs_lumi_vs_evts_csc_CSS1 = new TH2F(("hits_adc_vs_lumi_vs_evts_csc_CSS1_"+run).c_str(), "", xbins, xlo, xhi, ybins, ylo, yhi);
 
     ybins = 500; ylo = 0; yhi = 5200; hits_raw_vs_lumi_vs_r_L = new TH2F(("hits_raw_vs_lumi_vs_r_L_"+run).c_str(), "", xbins, xlo, xhi, ybins, ylo, yhi);
     ybins = 500; ylo = 0; yhi = 5440; hits_raw_vs_lumi_vs_r_S = new TH2F(("hits_raw_vs_lumi_vs_r_S_"+run).c_str(), "", xbins, xlo, xhi, ybins, ylo, yhi);
 
-    for (auto type: chamber_types) 
-        for (eta = 1; eta <= eta_n; ++eta){
-            chamber = type + std::to_string(eta);
-            hits_raw_vs_lumi[chamber] = new TH1F(("hits_raw_vs_lumi_"+chamber+"_"+run).c_str(), "", xbins, xlo, xhi);
-            hits_adc_vs_lumi[chamber] = new TH1F(("hits_adc_vs_lumi_"+chamber+"_"+run).c_str(), "", xbins, xlo, xhi);
-        }
+    // hits_raw_vs_lumi and hits_adc_vs_lumi per chamber are projected from the chamber tensors, see write_chamber_tensor()
 
     // histograms vs. actual mu
     xbins = 200; xlo = 0; xhi = 100;
+    axis("acmu", xbins, xlo, xhi);
     evts_vs_acmu                                              = new TH1F(("evts_vs_acmu_"+run).c_str(),            "", xbins, xlo, xhi);
     ybins = 500; ylo = 0; yhi = 5200; hits_raw_vs_acmu_vs_r_L = new TH2F(("hits_raw_vs_acmu_vs_r_L_"+run).c_str(), "", xbins, xlo, xhi, ybins, ylo, yhi);
     ybins = 500; ylo = 0; yhi = 5440; hits_raw_vs_acmu_vs_r_S = new TH2F(("hits_raw_vs_acmu_vs_r_S_"+run).c_str(), "", xbins, xlo, xhi, ybins, ylo, yhi);
 
     // histograms vs. average mu
+    xbins = 200; xlo = 0; xhi = 100;
+    axis("avmu", xbins, xlo, xhi);
     evts_vs_avmu                                              = new TH1F(("evts_vs_avmu_"+run).c_str(),            "", xbins, xlo, xhi);
     ybins = 500; ylo = 0; yhi = 5200; hits_raw_vs_avmu_vs_r_L = new TH2F(("hits_raw_vs_avmu_vs_r_L_"+run).c_str(), "", xbins, xlo, xhi, ybins, ylo, yhi);
     ybins = 500; ylo = 0; yhi = 5440; hits_raw_vs_avmu_vs_r_S = new TH2F(("hits_raw_vs_avmu_vs_r_S_"+run).c_str(), "", xbins, xlo, xhi, ybins, ylo, yhi);
@@ -436,17 +1269,18 @@ void MuonRawHistograms::initialize_histograms(){
         }            
     }
 
+    if (!adc_thresholds.empty())
+        hits_vs_adc_threshold_vs_region  = book_threshold_scan("hits_vs_adc_threshold_vs_region",  ";adc threshold;;hits",       adc_thresholds,  "mdt");
+    if (!qmax_thresholds.empty())
+        hits_vs_qmax_threshold_vs_region = book_threshold_scan("hits_vs_qmax_threshold_vs_region", ";q(max) threshold [ke];;hits", qmax_thresholds, "csc");
+
     xbins = 500; xlo = 0; xhi = 5200;
     hits_raw_vs_r_EIL = new TH1F(("hits_raw_vs_r_EIL_"+run).c_str(), "", xbins, xlo, xhi);
     hits_adc_vs_r_EIL = new TH1F(("hits_adc_vs_r_EIL_"+run).c_str(), "", xbins, xlo, xhi);
-    for (auto phi: phi_sectors_L) hits_raw_vs_r["EIL_"+phi] = new TH1F(("hits_raw_vs_r_EIL_"+phi+"_"+run).c_str(), "", xbins, xlo, xhi);
-    for (auto phi: phi_sectors_L) hits_adc_vs_r["EIL_"+phi] = new TH1F(("hits_adc_vs_r_EIL_"+phi+"_"+run).c_str(), "", xbins, xlo, xhi);
     
     xbins = 500; xlo = 0; xhi = 5440;
     hits_raw_vs_r_EIS = new TH1F(("hits_raw_vs_r_EIS_"+run).c_str(), "", xbins, xlo, xhi);
     hits_adc_vs_r_EIS = new TH1F(("hits_adc_vs_r_EIS_"+run).c_str(), "", xbins, xlo, xhi);
-    for (auto phi: phi_sectors_S) hits_raw_vs_r["EIS_"+phi] = new TH1F(("hits_raw_vs_r_EIS_"+phi+"_"+run).c_str(), "", xbins, xlo, xhi);
-    for (auto phi: phi_sectors_S) hits_adc_vs_r["EIS_"+phi] = new TH1F(("hits_adc_vs_r_EIS_"+phi+"_"+run).c_str(), "", xbins, xlo, xhi);
 
     xbins = 450; xlo = 1500; xhi = 6000;
     hits_raw_vs_r_EML = new TH1F(("hits_raw_vs_r_EML_"+run).c_str(), "", xbins, xlo, xhi);
@@ -462,81 +1296,84 @@ void MuonRawHistograms::initialize_histograms(){
     hits_vs_bcid_mdt_full = new TH1F(("hits_vs_bcid_mdt_full_"+run).c_str(), "", xbins, xlo, xhi);
     hits_vs_bcid_csc_full = new TH1F(("hits_vs_bcid_csc_full_"+run).c_str(), "", xbins, xlo, xhi);
 
-    histograms1D.push_back(evts);
-    histograms1D.push_back(evts_vs_lumi);
-    histograms1D.push_back(evts_vs_acmu);
-    histograms1D.push_back(evts_vs_avmu);
-    histograms1D.push_back(evts_vs_bcid);
-    histograms1D.push_back(lumi_vs_bcid);
-
-    histograms2D.push_back(hits_raw_vs_lumi_vs_evts_mdt_full);
-    histograms2D.push_back(hits_raw_vs_lumi_vs_evts_mdt_EIL1);
-    histograms2D.push_back(hits_raw_vs_lumi_vs_evts_mdt_EIL2);
-    histograms2D.push_back(hits_raw_vs_lumi_vs_evts_mdt_EIS1);
-    histograms2D.push_back(hits_raw_vs_lumi_vs_evts_mdt_EIS2);
-    histograms2D.push_back(hits_raw_vs_lumi_vs_evts_mdt_EML1);
-    histograms2D.push_back(hits_raw_vs_lumi_vs_evts_mdt_EML2);
-    histograms2D.push_back(hits_raw_vs_lumi_vs_evts_mdt_EMS1);
-    histograms2D.push_back(hits_raw_vs_lumi_vs_evts_mdt_EMS2);
-    histograms2D.push_back(hits_raw_vs_lumi_vs_evts_mdt_BIS7);
-    histograms2D.push_back(hits_raw_vs_lumi_vs_evts_mdt_BIS8);
-    histograms2D.push_back(hits_raw_vs_lumi_vs_evts_csc_full);
-    histograms2D.push_back(hits_raw_vs_lumi_vs_evts_csc_CSL1);
-    histograms2D.push_back(hits_raw_vs_lumi_vs_evts_csc_CSS1);
-
-    histograms2D.push_back(hits_adc_vs_lumi_vs_evts_mdt_full);
-    histograms2D.push_back(hits_adc_vs_lumi_vs_evts_mdt_EIL1);
-    histograms2D.push_back(hits_adc_vs_lumi_vs_evts_mdt_EIL2);
-    histograms2D.push_back(hits_adc_vs_lumi_vs_evts_mdt_EIS1);
-    histograms2D.push_back(hits_adc_vs_lumi_vs_evts_mdt_EIS2);
-    histograms2D.push_back(hits_adc_vs_lumi_vs_evts_mdt_EML1);
-    histograms2D.push_back(hits_adc_vs_lumi_vs_evts_mdt_EML2);
-    histograms2D.push_back(hits_adc_vs_lumi_vs_evts_mdt_EMS1);
-    histograms2D.push_back(hits_adc_vs_lumi_vs_evts_mdt_EMS2);
-    histograms2D.push_back(hits_adc_vs_lumi_vs_evts_mdt_BIS7);
-    histograms2D.push_back(hits_adc_vs_lumi_vs_evts_mdt_BIS8);
-    histograms2D.push_back(hits_adc_vs_lumi_vs_evts_csc_full);
-    histograms2D.push_back(hits_adc_vs_lumi_vs_evts_csc_CSL1);
-    histograms2D.push_back(hits_adc_vs_lumi_vs_evts_csc_CSS1);
-
-    histograms2D.push_back(hits_raw_vs_region_L);
-    histograms2D.push_back(hits_raw_vs_region_S);
-    histograms2D.push_back(hits_adc_vs_region_L);
-    histograms2D.push_back(hits_adc_vs_region_S);
-
-    histograms2D.push_back(hits_raw_vs_lumi_vs_r_L);
-    histograms2D.push_back(hits_raw_vs_lumi_vs_r_S);
-    histograms2D.push_back(hits_raw_vs_acmu_vs_r_L);
-    histograms2D.push_back(hits_raw_vs_acmu_vs_r_S);
-    histograms2D.push_back(hits_raw_vs_avmu_vs_r_L);
-    histograms2D.push_back(hits_raw_vs_avmu_vs_r_S);
-
-    histograms1D.push_back(hits_raw_vs_r_EIL);
-    histograms1D.push_back(hits_raw_vs_r_EIS);
-    histograms1D.push_back(hits_raw_vs_r_EML);
-    histograms1D.push_back(hits_raw_vs_r_EMS);
-    histograms1D.push_back(hits_adc_vs_r_EIL);
-    histograms1D.push_back(hits_adc_vs_r_EIS);
-    histograms1D.push_back(hits_adc_vs_r_EML);
-    histograms1D.push_back(hits_adc_vs_r_EMS);
-
-    for (auto iter: hits_raw_vs_r) histograms1D.push_back(iter.second);
-    for (auto iter: hits_adc_vs_r) histograms1D.push_back(iter.second);
-
-    for (auto iter: hits_raw_vs_lumi) histograms1D.push_back(iter.second);
-    for (auto iter: hits_adc_vs_lumi) histograms1D.push_back(iter.second);
-
-    histograms1D.push_back(hits_vs_bcid_mdt_full);
-    histograms1D.push_back(hits_vs_bcid_csc_full);
+    keep(evts);
+    keep(evts_vs_lumi);
+    keep(evts_vs_acmu);
+    keep(evts_vs_avmu);
+    keep(evts_vs_bcid);
+    keep(lumi_vs_bcid);
+
+    keep(hits_raw_vs_lumi_vs_evts_mdt_full);
+    keep(hits_raw_vs_lumi_vs_evts_mdt_EIL1);
+    keep(hits_raw_vs_lumi_vs_evts_mdt_EIL2);
+    keep(hits_raw_vs_lumi_vs_evts_mdt_EIS1);
+    keep(hits_raw_vs_lumi_vs_evts_mdt_EIS2);
+    keep(hits_raw_vs_lumi_vs_evts_mdt_EML1);
+    keep(hits_raw_vs_lumi_vs_evts_mdt_EML2);
+    keep(hits_raw_vs_lumi_vs_evts_mdt_EMS1);
+    keep(hits_raw_vs_lumi_vs_evts_mdt_EMS2);
+    keep(hits_raw_vs_lumi_vs_evts_mdt_BIS7);
+    keep(hits_raw_vs_lumi_vs_evts_mdt_BIS8);
+    keep(hits_raw_vs_lumi_vs_evts_csc_full);
+    keep(hits_raw_vs_lumi_vs_evts_csc_CSL1);
+    keep(hits_raw_vs_lumi_vs_evts_csc_CSS1);
+
+    keep(hits_adc_vs_lumi_vs_evts_mdt_full);
+    keep(hits_adc_vs_lumi_vs_evts_mdt_EIL1);
+    keep(hits_adc_vs_lumi_vs_evts_mdt_EIL2);
+    keep(hits_adc_vs_lumi_vs_evts_mdt_EIS1);
+    keep(hits_adc_vs_lumi_vs_evts_mdt_EIS2);
+    keep(hits_adc_vs_lumi_vs_evts_mdt_EML1);
+    keep(hits_adc_vs_lumi_vs_evts_mdt_EML2);
+    keep(hits_adc_vs_lumi_vs_evts_mdt_EMS1);
+    keep(hits_adc_vs_lumi_vs_evts_mdt_EMS2);
+    keep(hits_adc_vs_lumi_vs_evts_mdt_BIS7);
+    keep(hits_adc_vs_lumi_vs_evts_mdt_BIS8);
+    keep(hits_adc_vs_lumi_vs_evts_csc_full);
+    keep(hits_adc_vs_lumi_vs_evts_csc_CSL1);
+    keep(hits_adc_vs_lumi_vs_evts_csc_CSS1);
+
+    if (hits_vs_adc_threshold_vs_region)  keep(hits_vs_adc_threshold_vs_region);
+    if (hits_vs_qmax_threshold_vs_region) keep(hits_vs_qmax_threshold_vs_region);
+
+    keep(hits_raw_vs_region_L);
+    keep(hits_raw_vs_region_S);
+    keep(hits_adc_vs_region_L);
+    keep(hits_adc_vs_region_S);
+
+    keep(hits_raw_vs_lumi_vs_r_L);
+    keep(hits_raw_vs_lumi_vs_r_S);
+    keep(hits_raw_vs_acmu_vs_r_L);
+    keep(hits_raw_vs_acmu_vs_r_S);
+    keep(hits_raw_vs_avmu_vs_r_L);
+    keep(hits_raw_vs_avmu_vs_r_S);
+
+    keep(hits_raw_vs_r_EIL);
+    keep(hits_raw_vs_r_EIS);
+    keep(hits_raw_vs_r_EML);
+    keep(hits_raw_vs_r_EMS);
+    keep(hits_adc_vs_r_EIL);
+    keep(hits_adc_vs_r_EIS);
+    keep(hits_adc_vs_r_EML);
+    keep(hits_adc_vs_r_EMS);
+
+    keep(hits_vs_bcid_mdt_full);
+    keep(hits_vs_bcid_csc_full);
 
     for (auto hist: histograms1D) hist->Sumw2();
     for (auto hist: histograms2D) hist->Sumw2();
 
+    // owned by the job rather than the input file, which reuse() closes
+    for (auto hist: histograms1D) hist->SetDirectory(0);
+    for (auto hist: histograms2D) hist->SetDirectory(0);
+
     for (auto hist: histograms1D){
         hist->SetMarkerStyle(20);
         hist->SetMarkerSize(1);
     }
 
+    reset_bcid_regions();
+    book_chamber_tensor();
 }
 
 int MuonRawHistograms::ybin(std::string chamber_type){
@@ -0,0 +1,261 @@
+"""
+analysis_server.py: a long-lived process which keeps ROOT, the compiled
+library and the input files loaded, and runs the plotting scripts on request.
+
+Start it once, from the directory with histograms.root and area.root:
+
+> python analysis_server.py
+
+While it listens, plots.py, csc_average.py, hits_vs_L.py, extrapolate_vs_lumi.py
+and linear_fits.py only send their arguments and working directory over a unix
+socket, and print what the server sends back. Without a server, or with
+MUONRAW_NO_SERVER set, they run as before.
+
+Requests are handled one at a time, each from the style of rootlogon.py, so
+the style set by one script does not carry over to the next. Input files are
+reopened when they change on disk. While a request runs, file descriptors 1
+and 2 go to the client, so it gets the output of ROOT, C++ and pool workers too.
+"""
+
+import argparse
+import ctypes
+import getpass
+import json
+import os
+import socket
+import sys
+import tempfile
+import threading
+import time
+import traceback
+
+scripts = ["plots",
+           "csc_average",
+           "hits_vs_L",
+           "extrapolate_vs_lumi",
+           "linear_fits",
+           ]
+
+preload = ["histograms.root",
+           "area.root",
+           ]
+
+# abspath: (mtime, TFile)
+open_files = {}
+
+def options():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--socket", help="Path of the unix socket", default=socket_path())
+    return parser.parse_args()
+
+def main():
+    ops = options()
+    serve(ops.socket)
+
+def socket_path():
+    return os.environ.get("MUONRAW_SOCKET", os.path.join(tempfile.gettempdir(), "muonraw_%s.sock" % (getpass.getuser())))
+
+#
+# client
+#
+
+def run_remote(script):
+    """ If a server is listening, run script there with the current
+        arguments and exit with its status. Otherwise return. """
+
+    if os.environ.get("MUONRAW_NO_SERVER"):
+        return
+    path = socket_path()
+    if not os.path.exists(path):
+        return
+
+    client = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        client.connect(path)
+    except socket.error:
+        return
+
+    name    = os.path.splitext(os.path.basename(script))[0]
+    request = {"script": name, "argv": sys.argv[1:], "cwd": os.getcwd()}
+    client.sendall(json.dumps(request) + "\n")
+
+    status = 1
+    for line in client.makefile():
+        reply = json.loads(line)
+        if "output" in reply:
+            sys.stdout.write(reply["output"])
+            sys.stdout.flush()
+        if "status" in reply:
+            status = reply["status"]
+    client.close()
+    sys.exit(status)
+
+#
+# server
+#
+
+class SocketWriter(object):
+    """ Sends every write to the client, as one json line. """
+
+    def __init__(self, connection):
+        self.connection = connection
+
+    def write(self, text):
+        self.connection.sendall(json.dumps({"output": text}) + "\n")
+
+    def flush(self):
+        pass
+
+class Redirect(object):
+    """ File descriptors 1 and 2 into a pipe while in the with block, and everything
+        written to them, by python, C++ or child processes, to the writer. """
+
+    def __init__(self, writer):
+        self.writer = writer
+        self.lost   = None
+
+    def __enter__(self):
+        flush()
+        self.saved = [os.dup(1), os.dup(2)]
+        read, write = os.pipe()
+        os.dup2(write, 1)
+        os.dup2(write, 2)
+        os.close(write)
+        self.reader = threading.Thread(target=self.forward, args=(read,))
+        self.reader.daemon = True
+        self.reader.start()
+        return self
+
+    def __exit__(self, *exception):
+        flush()
+        os.dup2(self.saved[0], 1)
+        os.dup2(self.saved[1], 2)
+        for fd in self.saved:
+            os.close(fd)
+        # done once every writer, e.g. a pool worker still exiting, has closed the pipe
+        self.reader.join(10)
+        return False
+
+    def forward(self, fd):
+        # keeps reading after the client is lost, so the writers never block on a full pipe
+        while True:
+            text = os.read(fd, 65536)
+            if not text:
+                break
+            if self.lost:
+                continue
+            try:
+                self.writer.write(text.decode("utf-8", "replace"))
+            except socket.error as error:
+                self.lost = error
+        os.close(fd)
+
+def flush():
+    """ Flush the buffers of python and of C stdio, which std::cout writes through. """
+    sys.stdout.flush()
+    sys.stderr.flush()
+    ctypes.CDLL(None).fflush(None)
+
+def serve(path):
+
+    start = time.time()
+
+    import ROOT
+    ROOT.gROOT.SetBatch(True)
+    ROOT.gROOT.Macro("$ROOTCOREDIR/scripts/load_packages.C")
+    # objects read from the kept-open files are fresh copies on every Get,
+    # so one request cannot see another's Rebin or Scale
+    ROOT.TH1.AddDirectory(False)
+    import rootlogon
+
+    for name in preload:
+        if os.path.isfile(name):
+            open_root(name)
+    for name in scripts:
+        __import__(name)
+
+    if os.path.exists(path):
+        os.remove(path)
+    server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    server.bind(path)
+    server.listen(8)
+    print " listening on %s, warm after %.1f s" % (path, time.time() - start)
+
+    try:
+        while True:
+            connection, _ = server.accept()
+            try:
+                handle(connection)
+            except socket.error as error:
+                print " lost client: %s" % (error)
+            finally:
+                connection.close()
+    except KeyboardInterrupt:
+        print
+    finally:
+        server.close()
+        os.remove(path)
+
+def handle(connection):
+
+    request = json.loads(connection.makefile().readline())
+    writer  = SocketWriter(connection)
+    start   = time.time()
+
+    if request["script"] not in scripts:
+        writer.write("Error in %s: cannot run %s\n" % (__file__, request["script"]))
+        connection.sendall(json.dumps({"status": 1}) + "\n")
+        return
+
+    import rootlogon
+    module = sys.modules[request["script"]]
+    here   = os.getcwd()
+    argv   = sys.argv
+    status = 0
+
+    with Redirect(writer) as redirect:
+        try:
+            rootlogon.style()
+            os.chdir(request["cwd"])
+            sys.argv = [module.__file__] + request["argv"]
+            module.main()
+        except SystemExit as exit:
+            if isinstance(exit.code, int):
+                status = exit.code
+            elif exit.code is not None:
+                sys.stdout.write("%s\n" % (exit.code))
+                status = 1
+        except Exception:
+            sys.stdout.write(traceback.format_exc())
+            status = 1
+        finally:
+            sys.argv = argv
+            os.chdir(here)
+
+    if redirect.lost:
+        raise redirect.lost
+    connection.sendall(json.dumps({"status": status}) + "\n")
+    print " %s %s: status %i in %.1f s" % (request["script"], " ".join(request["argv"]), status, time.time() - start)
+
+def open_root(path):
+    """ TFile.Open(path), kept open across calls and reopened if the file changed. """
+
+    import ROOT
+
+    path  = os.path.abspath(path)
+    mtime = os.path.getmtime(path) if os.path.isfile(path) else None
+
+    if path in open_files:
+        then, tfile = open_files[path]
+        if then == mtime:
+            return tfile
+        tfile.Close()
+        del open_files[path]
+
+    tfile = ROOT.TFile.Open(path)
+    if tfile:
+        open_files[path] = (mtime, tfile)
+    return tfile
+
+if __name__ == "__main__":
+    main()
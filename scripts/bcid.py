@@ -0,0 +1,213 @@
+"""
+bcid.py: hits per BCID as arrays, and their position in the bunch trains.
+
+evts_vs_bcid, lumi_vs_bcid and hits_vs_bcid_* of every run are read
+as arrays over the 3564 BCIDs of an orbit. The filled bunches are
+the BCIDs with a per-bunch lumi above a fraction of the largest,
+and every filled bunch gets its position in its train, counted from
+the leading bunch, its position from the trailing bunch, and the number
+of empty bunches before its train.
+
+The hits per event and per lumi are then added up over all runs by
+position in the train, from either end, and by the gap before the train,
+which shows how background builds up along a train.
+
+Run outside athena.
+
+> python bcid.py --input=histograms.root --output=bcid.root
+"""
+
+import argparse
+import sys
+
+import numpy
+
+orbit = 3564
+
+detectors = ["mdt_full", "csc_full"]
+
+def options():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--input",  help="histograms.root, or its .npz export", default="histograms.root")
+    parser.add_argument("--output", help="Output root file",                    default="bcid.root")
+    parser.add_argument("--runs",   help="comma-separated runs, default: all runs in the input")
+    parser.add_argument("--filled", help="Minimum lumi per bunch to count as filled, as a fraction of the largest", default=0.1, type=float)
+    return parser.parse_args()
+
+def main():
+
+    ops = options()
+
+    runs = ops.runs.split(",") if ops.runs else None
+    arrays = load(ops.input, runs)
+    if not arrays:
+        fatal("No runs with hits vs bcid in %s" % (ops.input))
+
+    sums = dict((by, vs_train(arrays, ops.filled, by)) for by in ["position", "to_end", "gap"])
+    write(sums, ops.output)
+
+    print
+    print " %8s %10s %10s %14s %14s" % ("position", "bunches", "events", "mdt hits / L", "csc hits / L")
+    along = sums["position"]
+    for position in xrange(1, min(len(along["evts"]), 13)):
+        print " %8i %10i %10i %14.2f %14.4f" % (position,
+                                               along["bunches"][position],
+                                               along["evts"][position],
+                                               along["hits_per_lumi_mdt_full"][position],
+                                               along["hits_per_lumi_csc_full"][position],
+                                               )
+    print
+
+def load(path, runs=None):
+    """ Per run, arrays over the BCIDs of the orbit: evts, lumi and hits_<detector>. """
+
+    if path.endswith(".npz"):
+        import hist_npz
+        archive = hist_npz.load(path)
+        get = lambda run, name: archive_contents(archive, "%s/%s_%s" % (run, name, run))
+        if runs is None:
+            runs = sorted(set(key.split("/")[0] for key in archive.keys() if "/" in key))
+    else:
+        import ROOT
+        import hist_arrays
+        ROOT.TH1.AddDirectory(False)
+        tfile = ROOT.TFile.Open(path)
+        if not tfile:
+            fatal("Cannot open %s" % (path))
+        get = lambda run, name: root_contents(tfile, "%s/%s_%s" % (run, name, run))
+        if runs is None:
+            runs = sorted(key.GetName() for key in tfile.GetListOfKeys() if key.GetClassName() == "TDirectoryFile")
+
+    arrays = {}
+    for run in runs:
+        evts = get(run, "evts_vs_bcid")
+        if evts is None:
+            continue
+        arrays[run] = {"evts": evts,
+                       "lumi": get(run, "lumi_vs_bcid"),
+                       }
+        for det in detectors:
+            arrays[run]["hits_"+det] = get(run, "hits_vs_bcid_"+det)
+    return arrays
+
+def archive_contents(archive, name):
+    if name not in archive:
+        return None
+    # bin 1 is BCID 0
+    return numpy.asarray(archive[name]["contents"][1:orbit+1], dtype=numpy.float64)
+
+def root_contents(tfile, name):
+    import hist_arrays
+    hist = tfile.Get(name)
+    if not hist:
+        return None
+    return hist_arrays.contents(hist)[1:orbit+1].astype(numpy.float64)
+
+def per_event(values, evts):
+    """ values / evts per BCID, zero where there are no events. """
+    return numpy.where(evts > 0, values / numpy.where(evts > 0, evts, 1), 0.0)
+
+def filled_bunches(lumi, evts, fraction=0.1):
+    """ Mask of the BCIDs whose average per-bunch lumi is above fraction of the largest. """
+    average = per_event(lumi, evts)
+    if not average.any():
+        return evts > 0
+    return average > fraction * average.max()
+
+def trains(filled):
+    """ Per BCID: position in its train from the leading bunch (1, 2, ...),
+        position from the trailing bunch (1, 2, ...),
+        and the number of empty bunches before the train.
+        All are 0 for empty bunches. Trains may wrap around the orbit. """
+
+    filled   = numpy.asarray(filled, dtype=bool)
+    position = numpy.zeros(len(filled), dtype=numpy.int64)
+    to_end   = numpy.zeros(len(filled), dtype=numpy.int64)
+    gap      = numpy.zeros(len(filled), dtype=numpy.int64)
+    if not filled.any() or filled.all():
+        position[filled] = numpy.arange(1, filled.sum()+1)
+        to_end[filled]   = numpy.arange(filled.sum(), 0, -1)
+        return position, to_end, gap
+
+    # rotate the orbit to start on an empty bunch, so no train wraps around
+    shift  = numpy.flatnonzero(~filled)[0]
+    rolled = numpy.roll(filled, -shift)
+    index  = numpy.arange(len(rolled))
+
+    leading  = rolled & ~numpy.roll(rolled,  1)
+    trailing = rolled & ~numpy.roll(rolled, -1)
+
+    start = numpy.maximum.accumulate(numpy.where(leading, index, 0))
+    end   = numpy.minimum.accumulate(numpy.where(trailing, index, len(rolled))[::-1])[::-1]
+
+    starts = numpy.flatnonzero(leading)
+    ends   = numpy.flatnonzero(trailing)
+    gaps   = starts - numpy.roll(ends, 1) - 1
+    gaps[0] += len(rolled)
+    train  = numpy.cumsum(leading) - 1
+
+    position[:] = numpy.where(rolled, index - start + 1, 0)
+    to_end[:]   = numpy.where(rolled, end - index + 1, 0)
+    gap[:]      = numpy.where(rolled, gaps[numpy.clip(train, 0, None)], 0)
+
+    return numpy.roll(position, shift), numpy.roll(to_end, shift), numpy.roll(gap, shift)
+
+def vs_train(arrays, fraction=0.1, by="position"):
+    """ Sums over all runs, indexed by the position in the train from the leading bunch,
+        by="position", from the trailing bunch, by="to_end", or by the empty bunches
+        before the train, by="gap", for leading bunches only:
+        bunches, evts, lumi, hits_<detector>, hits_per_event_<detector>
+        and hits_per_lumi_<detector>. Index 0 collects the bunches left out. """
+
+    indices = {}
+    for run in arrays:
+        filled = filled_bunches(arrays[run]["lumi"], arrays[run]["evts"], fraction)
+        position, to_end, gap = trains(filled)
+        if by == "position": indices[run] = position
+        elif by == "to_end": indices[run] = to_end
+        elif by == "gap":    indices[run] = numpy.where(position == 1, gap, 0)
+        else:                fatal("Cannot sum bunches by %s" % (by))
+    length = max(index.max() for index in indices.values()) + 1
+
+    sums = {"bunches": numpy.zeros(length), "evts": numpy.zeros(length), "lumi": numpy.zeros(length)}
+    for det in detectors:
+        sums["hits_"+det] = numpy.zeros(length)
+
+    for run in arrays:
+        sums["bunches"] += numpy.bincount(indices[run], minlength=length)
+        for name in ["evts", "lumi"] + ["hits_"+det for det in detectors]:
+            sums[name] += numpy.bincount(indices[run], weights=arrays[run][name], minlength=length)
+
+    for det in detectors:
+        sums["hits_per_event_"+det] = per_event(sums["hits_"+det], sums["evts"])
+        sums["hits_per_lumi_"+det]  = per_event(sums["hits_"+det], sums["lumi"])
+    return sums
+
+def write(sums, path):
+    """ One TH1F per sum and per way of indexing the bunches. """
+
+    import ROOT
+    import hist_arrays
+    ROOT.TH1.AddDirectory(False)
+
+    xtitles = {"position": "position in train",
+               "to_end":   "position in train from the trailing bunch",
+               "gap":      "empty bunches before the train",
+               }
+
+    output = ROOT.TFile.Open(path, "recreate")
+    for by in sorted(sums):
+        length = len(sums[by]["evts"])
+        for name in sorted(sums[by]):
+            hist = ROOT.TH1F("%s_vs_%s" % (name, by), ";%s;%s;" % (xtitles[by], name), length, -0.5, length-0.5)
+            hist_arrays.contents(hist)[1:length+1] = sums[by][name]
+            hist.ResetStats()
+            hist.Write()
+    output.Close()
+    print " wrote %s" % (path)
+
+def fatal(message):
+    sys.exit("Error in %s: %s" % (__file__, message))
+
+if __name__ == "__main__":
+    main()
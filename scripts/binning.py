@@ -0,0 +1,244 @@
+"""
+binning.py: pick the axes of MuonRawHistograms from the data instead of by hand.
+
+A pre-scan reads a few quantities from a sample of the inputs, e.g. the
+lumi and the hits per event in the full MDT and CSC and in each region
+like mdt_EIL1, into quantile sketches:
+counts in logarithmic buckets, which give every quantile to a relative
+accuracy in fixed memory, and which add up over files. The upper edge of
+each axis is then a round number above a high quantile, so the bins go
+where the data is and little overflows.
+
+The axes are saved as json, and hists.py stores them in histograms.root,
+so a later batch can be run with the same axes and merged with it:
+
+> python binning.py --input=ntuple_*.root --output=binning.json
+> python hists.py --input=ntuple_*.root --binning=binning.json
+> python hists.py --input=more_*.root   --binning=histograms.root
+"""
+
+import argparse
+import glob
+import json
+import math
+import os
+import sys
+
+import numpy
+
+# quantity: TTree::Draw expression of one value per event, default (bins, lo, hi), whole numbers
+quantities = {"lumi":     ("lbAverageLuminosity/1000.0",  (200, 0, 16),   False),
+              "acmu":     ("actIntPerXing",               (200, 0, 100),  False),
+              "avmu":     ("avgIntPerXing",               (200, 0, 100),  False),
+              "mdt_full": ("Sum$(mdt_chamber_tube_n)",    (200, 0, 5000), True),
+              "csc_full": ("Sum$(csc_chamber_cluster_n)", (200, 0, 200),  True),
+              }
+
+# region: default hi of the hits per event, like MuonRawHistograms::initialize_histograms
+regions = [("mdt_EIL1", 500),
+           ("mdt_EIL2", 300),
+           ("mdt_EIS1", 400),
+           ("mdt_EIS2", 300),
+           ("mdt_EML1", 300),
+           ("mdt_EML2", 300),
+           ("mdt_EMS1", 300),
+           ("mdt_EMS2", 300),
+           ("mdt_BIS7", 200),
+           ("mdt_BIS8", 100),
+           ("csc_CSL1", 200),
+           ("csc_CSS1", 200),
+           ]
+
+def region(name):
+    """ TTree::Draw expression of the hits per event in a region, e.g. mdt_EIL1: the EIL1 chambers of sides A and C. """
+    detector, chamber = name.split("_")
+    if detector == "mdt":
+        return 'Sum$(mdt_chamber_tube_n*(mdt_chamber_type=="%s" && mdt_chamber_eta_station==%s && mdt_chamber_side!="B"))' % (chamber[:3], chamber[3:])
+    return 'Sum$(csc_chamber_cluster_n*(csc_chamber_type=="%s" && csc_chamber_side!="B"))' % (chamber[:3])
+
+for name, hi in regions:
+    quantities[name] = (region(name), (200, 0, hi), True)
+
+def options():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--input",    help="comma-separated, glob-able input root files")
+    parser.add_argument("--output",   help="output json file", default="binning.json")
+    parser.add_argument("--files",    help="number of files to scan, spread over the inputs", default=10, type=int)
+    parser.add_argument("--entries",  help="entries to scan per file", default=20000, type=int)
+    parser.add_argument("--quantile", help="quantile to keep below the upper edges", default=0.9999, type=float)
+    parser.add_argument("--margin",   help="upper edges at this times the quantile, rounded up", default=1.25, type=float)
+    return parser.parse_args()
+
+def main():
+
+    ops = options()
+    if not ops.input:
+        fatal("Please give a comma-separated list of --input files (glob-capable)")
+
+    inputs = []
+    for inp in ops.input.split(","):
+        inputs.extend(sorted(glob.glob(inp)) if "*" in inp else [inp])
+    if not inputs:
+        fatal("No files match %s" % (ops.input))
+
+    sketches = scan(sample(inputs, ops.files), ops.entries)
+    axes = choose(sketches, ops.quantile, ops.margin)
+    save(axes, ops.output)
+    summary(axes, sketches)
+
+class Sketch(object):
+    """ Quantiles of a stream of values >= 0, to a relative accuracy, from counts
+        in logarithmic buckets: bucket i > 0 holds the values in (floor*gamma^(i-1), floor*gamma^i],
+        and bucket 0 the values up to floor. Sketches of the same accuracy add up. """
+
+    def __init__(self, accuracy=0.01, floor=1e-3):
+        self.accuracy = accuracy
+        self.floor    = floor
+        self.gamma    = (1.0 + accuracy) / (1.0 - accuracy)
+        self.counts   = numpy.zeros(1, dtype=numpy.int64)
+
+    def add(self, values):
+        values = numpy.asarray(values, dtype=numpy.float64)
+        index  = numpy.zeros(len(values), dtype=numpy.int64)
+        above  = values > self.floor
+        index[above] = numpy.ceil(numpy.log(values[above] / self.floor) / math.log(self.gamma))
+        self.extend(numpy.bincount(index))
+
+    def merge(self, other):
+        if other.gamma != self.gamma or other.floor != self.floor:
+            fatal("Cannot merge sketches of different accuracies")
+        self.extend(other.counts)
+
+    def extend(self, counts):
+        if len(counts) > len(self.counts):
+            self.counts = numpy.concatenate([self.counts, numpy.zeros(len(counts) - len(self.counts), dtype=numpy.int64)])
+        self.counts[:len(counts)] += counts
+
+    def total(self):
+        return int(self.counts.sum())
+
+    def quantile(self, q):
+        if not self.total():
+            return 0.0
+        rank   = q * (self.total() - 1)
+        bucket = int(numpy.searchsorted(numpy.cumsum(self.counts), rank, side="right"))
+        if bucket == 0:
+            return 0.0
+        return self.floor * 2.0 * self.gamma**bucket / (self.gamma + 1.0)
+
+def sample(inputs, files):
+    """ Up to files of the inputs, spread evenly over them. """
+    if files <= 0 or files >= len(inputs):
+        return list(inputs)
+    step = len(inputs) / float(files)
+    return [inputs[int(ifile * step)] for ifile in xrange(files)]
+
+def scan(inputs, entries=20000):
+    """ One sketch per quantity over the first entries of every input. """
+
+    import ROOT
+    import tree_arrays
+
+    names    = sorted(quantities)
+    sketches = dict((name, Sketch()) for name in names)
+    for path in inputs:
+        tfile = ROOT.TFile.Open(path)
+        if not tfile:
+            fatal("Cannot open %s" % (path))
+        tree = tfile.Get("physics")
+        if not tree:
+            fatal("No tree physics in %s" % (path))
+        values = tree_arrays.columns(tree, [quantities[name][0] for name in names], first=1, entries=entries)
+        for name in names:
+            sketches[name].add(values[quantities[name][0]])
+        tfile.Close()
+    return sketches
+
+def nice(value):
+    """ The smallest of 1, 2, 2.5, 5 times a power of ten which is >= value. """
+    scale = 10**math.floor(math.log10(value))
+    for mantissa in [1, 2, 2.5, 5, 10]:
+        if mantissa * scale >= value:
+            return mantissa * scale
+
+def choose(sketches, quantile=0.9999, margin=1.25):
+    """ {quantity: [bins, lo, hi]}, with the default bins and lo, and hi a round number above
+        the quantile. For whole numbers, at most one bin per number and whole bin widths. """
+
+    axes = {}
+    for name in sorted(quantities):
+        bins, lo, hi = quantities[name][1]
+        top = sketches[name].quantile(quantile) * margin if name in sketches else 0
+        if top > lo:
+            hi = nice(top)
+            if quantities[name][2]:
+                bins = int(min(bins, hi))
+                hi   = bins * int(math.ceil(hi / float(bins)))
+        axes[name] = [bins, lo, hi]
+    return axes
+
+def apply(job, axes):
+    """ Give the axes to a MuonRawHistograms before it books its histograms. """
+    for name in sorted(axes):
+        bins, lo, hi = axes[name]
+        job.set_axis(name, int(bins), float(lo), float(hi))
+
+def save(axes, path):
+    with open(path, "w") as output:
+        json.dump(axes, output, indent=1, sort_keys=True)
+    print " wrote %s" % (path)
+
+def store(axes, path):
+    """ Keep the axes in a root file, as the json string of the TNamed binning. """
+    import ROOT
+    tfile = ROOT.TFile.Open(path, "update")
+    ROOT.TNamed("binning", json.dumps(axes, sort_keys=True)).Write("binning", ROOT.TObject.kOverwrite)
+    tfile.Close()
+
+def load(path):
+    """ The axes of a json file, or of a root file written with them. """
+    if path.endswith(".root"):
+        axes = stored(path)
+        if not axes:
+            fatal("No binning in %s" % (path))
+        return axes
+    with open(path) as input:
+        return json.load(input)
+
+def stored(path):
+    """ The axes kept in a root file by store(), or {} if it has none. """
+    import ROOT
+    if not os.path.isfile(path):
+        return {}
+    tfile = ROOT.TFile.Open(path)
+    named = tfile.Get("binning") if tfile else None
+    axes  = json.loads(named.GetTitle()) if named else {}
+    if tfile:
+        tfile.Close()
+    return axes
+
+def axis(axes, name):
+    """ (bins, lo, hi) of a quantity, like MuonRawHistograms::axis: from the axes, else the default. """
+    if name not in axes:
+        return tuple(quantities[name][1])
+    bins, lo, hi = axes[name]
+    return (int(bins) or quantities[name][1][0], float(lo), float(hi))
+
+def summary(axes, sketches=None):
+
+    print
+    print " %10s %8s %10s %10s %12s" % ("quantity", "bins", "lo", "hi", "default hi")
+    for name in sorted(axes):
+        print " %10s %8i %10g %10g %12g" % (name, axes[name][0], axes[name][1], axes[name][2], quantities[name][1][2])
+    if sketches:
+        print
+        print " %10s %10s %10s %10s" % ("quantity", "median", "99%", "99.99%")
+        for name in sorted(sketches):
+            print " %10s %10.2f %10.2f %10.2f" % (name, sketches[name].quantile(0.5), sketches[name].quantile(0.99), sketches[name].quantile(0.9999))
+    print
+
+def fatal(message):
+    sys.exit("Error in %s: %s" % (__file__, message))
+
+if __name__ == "__main__":
+    main()
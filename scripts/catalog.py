@@ -0,0 +1,200 @@
+"""
+catalog.py: a catalog of the input ntuples, so jobs can be planned without opening them.
+
+Every file of --input is opened once, and its entries, runs, lumiblock range
+per run, bytes per branch and adler32 checksum are written to a json catalog.
+Running again refreshes it: only new files, or files whose size or time changed,
+are opened, and files which are gone are dropped.
+
+The catalog then selects the files with entries of given runs and lumiblocks
+(whole files: hists.py skips the other entries in them), splits them into shards
+of about equal entries, and estimates the time to process them.
+
+Run outside athena.
+
+> python catalog.py --input="/n/atlasfs/atlascode/backedup/tuna/MuonRawHits/*/*.root" --catalog=catalog.json
+> python catalog.py --catalog=catalog.json --runs=278880,279169 --lbs=100:400 --shards=4 --shard=0
+> python hists.py --catalog=catalog.json --runs=278880 --cpu=8
+"""
+
+import argparse
+import glob
+import json
+import os
+import sys
+import zlib
+
+def options():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--input",   help="comma-separated, glob-able input root files to add to the catalog")
+    parser.add_argument("--catalog", help="json catalog", default="catalog.json")
+    parser.add_argument("--runs",    help="comma-separated runs whose files to select, default: all")
+    parser.add_argument("--lbs",     help="lumiblock range whose files to select, as first:last")
+    parser.add_argument("--shards",  help="number of shards of about equal entries", default=1, type=int)
+    parser.add_argument("--shard",   help="shard to list, default: all", type=int)
+    parser.add_argument("--rate",    help="events per second per cpu, for the time estimate", default=400, type=float)
+    parser.add_argument("--cpu",     help="number of cpu, for the time estimate", default=1, type=int)
+    return parser.parse_args()
+
+def main():
+
+    ops = options()
+
+    if ops.input:
+        paths = []
+        for inp in ops.input.split(","):
+            paths.extend(sorted(glob.glob(inp)) if "*" in inp else [inp])
+        records = refresh(load(ops.catalog) if os.path.exists(ops.catalog) else {}, paths)
+        save(records, ops.catalog)
+    else:
+        if not os.path.exists(ops.catalog):
+            fatal("No catalog %s, and no --input to build it" % (ops.catalog))
+        records = load(ops.catalog)
+
+    chosen = select(records, runs(ops.runs), lbs(ops.lbs))
+    shards = shard(chosen, ops.shards)
+    summary(chosen, shards, ops.rate, ops.cpu)
+
+    if ops.shard is not None:
+        if not 0 <= ops.shard < len(shards):
+            fatal("No shard %s of %s" % (ops.shard, len(shards)))
+        for path in shards[ops.shard]:
+            print path
+
+def scan(path):
+    """ The record of one file: size, time, entries, runs with their lumiblocks
+        and entries, bytes per branch and checksum. """
+
+    import numpy
+    import ROOT
+    import tree_arrays
+
+    record = {"size": os.path.getsize(path), "mtime": os.path.getmtime(path), "checksum": checksum(path)}
+
+    tfile = ROOT.TFile.Open(path)
+    if not tfile:
+        fatal("Cannot open %s" % (path))
+    tree = tfile.Get("physics")
+    if not tree:
+        fatal("No tree physics in %s" % (path))
+
+    record["entries"] = int(tree.GetEntries())
+
+    record["branches"] = {}
+    for branch in tree.GetListOfBranches():
+        record["branches"][branch.GetName()] = {"zipped": int(branch.GetZipBytes("*")), "total": int(branch.GetTotBytes("*"))}
+
+    values = tree_arrays.columns(tree, ["RunNumber", "lbn"])
+    record["runs"] = {}
+    for run in numpy.unique(values["RunNumber"]).astype(int):
+        lbn = values["lbn"][values["RunNumber"] == run]
+        record["runs"][str(run)] = {"lbn_min": int(lbn.min()), "lbn_max": int(lbn.max()), "entries": len(lbn)}
+
+    tfile.Close()
+    return record
+
+def checksum(path, chunk=8*1024*1024):
+    """ adler32 of the file, like xrdadler32, as 8 hex digits. """
+    value = 1
+    with open(path, "rb") as input:
+        while True:
+            block = input.read(chunk)
+            if not block:
+                break
+            value = zlib.adler32(block, value)
+    return "%08x" % (value & 0xffffffff)
+
+def refresh(records, paths):
+    """ The records, with paths scanned if they are new or their size or time changed,
+        and without the files which no longer exist. """
+
+    fresh   = dict((path, record) for path, record in records.items() if os.path.exists(path))
+    gone    = len(records) - len(fresh)
+    scanned = 0
+    for ipath, path in enumerate(paths):
+        path = os.path.abspath(path)
+        old  = fresh.get(path)
+        if old and old["size"] == os.path.getsize(path) and old["mtime"] == os.path.getmtime(path):
+            continue
+        print " %5i / %5i scan %s" % (ipath+1, len(paths), path)
+        fresh[path] = scan(path)
+        scanned += 1
+
+    print " %i files, %i scanned, %i gone" % (len(fresh), scanned, gone)
+    return fresh
+
+def runs(option):
+    # e.g. 00278880 or 278880, as in the catalog
+    return [str(int(run)) for run in option.split(",")] if option else None
+
+def lbs(option):
+    if not option:
+        return None
+    first, last = option.split(":")
+    return (int(first) if first else 0, int(last) if last else sys.maxint)
+
+def select(records, runs=None, lbs=None):
+    """ Paths of the files with any entries of runs, with lumiblocks overlapping lbs. """
+
+    chosen = []
+    for path in sorted(records):
+        for run, info in records[path]["runs"].items():
+            if runs and run not in runs:
+                continue
+            if lbs and (info["lbn_max"] < lbs[0] or info["lbn_min"] > lbs[1]):
+                continue
+            chosen.append(path)
+            break
+    return dict((path, records[path]) for path in chosen)
+
+def shard(records, shards=1):
+    """ The paths split into shards of about equal entries: the largest file first into the smallest shard. """
+
+    shards = max(shards, 1)
+    parts  = [[] for ishard in xrange(shards)]
+    sizes  = [0] * shards
+    for path in sorted(records, key=lambda path: -records[path]["entries"]):
+        ishard = sizes.index(min(sizes))
+        parts[ishard].append(path)
+        sizes[ishard] += records[path]["entries"]
+    return [sorted(part) for part in parts]
+
+def estimate(records, rate, cpu=1):
+    """ Seconds to process records at rate events per second per cpu. """
+    return sum(record["entries"] for record in records.values()) / float(rate * max(cpu, 1))
+
+def summary(records, shards=None, rate=400, cpu=1):
+
+    entries  = sum(record["entries"] for record in records.values())
+    size     = sum(record["size"]    for record in records.values())
+    allruns  = sorted(set(run for record in records.values() for run in record["runs"]))
+
+    print
+    print " %i files, %i runs, %i entries, %.1f GB" % (len(records), len(allruns), entries, size / 1e9)
+    for run in allruns:
+        infos = [record["runs"][run] for record in records.values() if run in record["runs"]]
+        print " %10s %6i files %10i entries  lb %5i - %5i" % (run, len(infos),
+                                                             sum(info["entries"] for info in infos),
+                                                             min(info["lbn_min"] for info in infos),
+                                                             max(info["lbn_max"] for info in infos),
+                                                             )
+    if shards and len(shards) > 1:
+        for ishard, part in enumerate(shards):
+            print " shard %3i: %4i files %10i entries" % (ishard, len(part), sum(records[path]["entries"] for path in part))
+    print " about %.1f h on %i cpu at %g Hz per cpu" % (estimate(records, rate, cpu) / 3600.0, cpu, rate)
+    print
+
+def load(path):
+    with open(path) as input:
+        return json.load(input)
+
+def save(records, path):
+    with open(path, "w") as output:
+        json.dump(records, output, indent=1, sort_keys=True)
+    print " wrote %s" % (path)
+
+def fatal(message):
+    sys.exit("Error in %s: %s" % (__file__, message))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,138 @@
+"""
+csc_clusters.py: CSC cluster quality and cluster rates per cut,
+from the compiled CscClusters, in one pass over every ntuple.
+
+Every file is processed by a pool worker. The workers send back the
+bin contents and squared errors as arrays, which are added in memory
+into one set of histograms, written to --output.
+
+Run outside athena.
+
+> python csc_clusters.py --input=ntuple_*.root --cpu=4 --qmax=0,50,100,200
+"""
+
+import argparse
+import glob
+import multiprocessing as mp
+import os
+import sys
+
+import ROOT
+ROOT.gROOT.SetBatch(True)
+ROOT.gROOT.Macro("$ROOTCOREDIR/scripts/load_packages.C")
+ROOT.TH1.AddDirectory(False)
+
+import hist_arrays
+
+def options():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--input",  help="comma-separated, glob-able input root files")
+    parser.add_argument("--output", help="output root file", default="csc_clusters.root")
+    parser.add_argument("--cpu",    help="number of cpu")
+    parser.add_argument("--events", help="max number of events per file")
+    parser.add_argument("--qmax",   help="comma-separated qmax thresholds [ke]", default="0,25,50,75,100,150,200,300")
+    return parser.parse_args()
+
+def main():
+
+    ops = options()
+    if not ops.input:
+        fatal("Please give a comma-separated list of --input files (glob-capable)")
+
+    inputs = []
+    for inp in ops.input.split(","):
+        inputs.extend(sorted(glob.glob(inp)) if "*" in inp else [inp])
+    if not inputs:
+        fatal("No files match %s" % (ops.input))
+
+    configs = []
+    for inp in inputs:
+        config = {}
+        config["input"]  = os.path.abspath(inp)
+        config["events"] = int(ops.events) if ops.events else -1
+        config["qmax"]   = [int(threshold) for threshold in ops.qmax.split(",")]
+        configs.append(config)
+
+    # map
+    cpu   = int(ops.cpu) if ops.cpu else 1
+    npool = min(len(configs), cpu, mp.cpu_count())
+    if npool > 1:
+        pool  = mp.Pool(npool)
+        parts = pool.map(ntuple_to_arrays, configs, chunksize=1)
+    else:
+        parts = [ntuple_to_arrays(config) for config in configs]
+
+    # reduce
+    hists = merge(parts, configs[0]["qmax"])
+    output = ROOT.TFile.Open(ops.output, "recreate")
+    for name in sorted(hists):
+        hists[name].Write()
+    output.Close()
+
+    summary(hists)
+
+def engine(thresholds, input="", output=""):
+    job = ROOT.CscClusters(input, output)
+    vector = ROOT.std.vector("int")()
+    for threshold in thresholds:
+        vector.push_back(threshold)
+    job.set_qmax_thresholds(vector)
+    return job
+
+def ntuple_to_arrays(config):
+    """ Bin contents, squared errors and entries of every histogram of one file. """
+
+    job = engine(config["qmax"], config["input"])
+    job.initialize()
+    job.execute(config["events"])
+
+    arrays = {}
+    for hist in list(job.histograms1D) + list(job.histograms2D):
+        arrays[hist.GetName()] = (hist_arrays.contents(hist).copy(),
+                                  hist_arrays.errors2(hist).copy(),
+                                  hist.GetEntries())
+    # the histograms and the input file go with the job
+    del job
+    return arrays
+
+def merge(parts, thresholds):
+    """ Add the arrays of every file into histograms booked like the workers' own. """
+
+    job = engine(thresholds)
+    job.initialize_histograms()
+
+    hists = {}
+    for booked in list(job.histograms1D) + list(job.histograms2D):
+        # copies, as the job deletes its own histograms
+        name = booked.GetName()
+        hist = booked.Clone(name)
+        hist.SetDirectory(0)
+        for part in parts:
+            hist_arrays.contents(hist)[...] += part[name][0]
+            hist_arrays.errors2(hist)[...]  += part[name][1]
+        hist.ResetStats()
+        hist.SetEntries(sum(part[name][2] for part in parts))
+        hists[name] = hist
+    return hists
+
+def summary(hists):
+
+    events = hists["evts"].GetBinContent(1)
+    if not events:
+        fatal("No events")
+
+    print
+    print " %10s %10s %10s" % ("cut", "CSL / evt", "CSS / evt")
+    cuts = hists["clusters_vs_cut_CSL"].GetXaxis()
+    for ibin in xrange(1, cuts.GetNbins()+1):
+        print " %10s %10.2f %10.2f" % (cuts.GetBinLabel(ibin),
+                                       hists["clusters_vs_cut_CSL"].GetBinContent(ibin) / events,
+                                       hists["clusters_vs_cut_CSS"].GetBinContent(ibin) / events,
+                                       )
+    print
+
+def fatal(message):
+    sys.exit("Error in %s: %s" % (__file__, message))
+
+if __name__ == "__main__":
+    main()
@@ -1,8 +1,14 @@
 import argparse
 import glob
+import multiprocessing
 import os
+
+import numpy
 import ROOT
+import hist_arrays
+import tree_arrays
 ROOT.gROOT.SetBatch(True)
+ROOT.TH1.AddDirectory(False)
 
 ROOT.gStyle.SetPadTickX(1)
 ROOT.gStyle.SetPadTickY(1)
@@ -12,6 +18,34 @@ ROOT.gStyle.SetPadBottomMargin(0.15)
 ROOT.gStyle.SetPadLeftMargin(0.18)
 ROOT.gStyle.SetPadRightMargin(0.20)
 
+# every column of a group of four is drawn together, so the per-event
+# lumi and prescale share a group with a cluster branch, one row per cluster
+columns = ["csc_chamber_cluster_qleft",
+           "csc_chamber_cluster_qright",
+           "csc_chamber_cluster_qmax",
+           "csc_chamber_cluster_strips",
+           "csc_chamber_cluster_r",
+           "lbAverageLuminosity",
+           "prescale_HLT",
+           ]
+
+xtitle_r = "r [mm]"
+xtitle_l = "inst. lumi. [e^{33} cm^{-2} s^{-1} ]"
+ytitle   = "N(strips)"
+ybins_lo = 30
+ybins_hi = 120
+
+# name, title, (xbins, xlo, xhi, ybins, ylo, yhi)
+hists = [("minlr_vs_max_lo",  ";minimum of q(left), q(right);q(max);", (200,  -40,  120, 200, 0,  400)),
+         ("minlr_vs_max_hi",  ";minimum of q(left), q(right);q(max);", (200, -600, 3000, 200, 0, 3600)),
+         ("left_vs_right_lo", ";q(left);q(right);",                    (200, -120,  280, 200, -120,  280)),
+         ("left_vs_right_hi", ";q(left);q(right);",                    (200, -600, 3400, 200, -600, 3400)),
+         ("r_vs_strips_lo",   ";%s;%s;" % (xtitle_r, ytitle), (100, 800, 2200, ybins_lo, 0.5, ybins_lo+0.5)),
+         ("r_vs_strips_hi",   ";%s;%s;" % (xtitle_r, ytitle), (100, 800, 2200, ybins_hi, 0.5, ybins_hi+0.5)),
+         ("l_vs_strips_lo",   ";%s;%s;" % (xtitle_l, ytitle), (100, 3.0,  5.5, ybins_lo, 0.5, ybins_lo+0.5)),
+         ("l_vs_strips_hi",   ";%s;%s;" % (xtitle_l, ytitle), (100, 3.0,  5.5, ybins_hi, 0.5, ybins_hi+0.5)),
+         ]
+
 def options():
     parser = argparse.ArgumentParser()
     parser.add_argument("--input",  help="glob-able input files")
@@ -22,48 +56,28 @@ def main():
     ops = options()
     if not ops.input: fatal("Please give --input files")
 
-    ch = ROOT.TChain("physics")
-    for inp in glob.glob(os.path.abspath(ops.input)):
-        ch.Add(inp)
-        
-    colz()
+    inputs = sorted(glob.glob(os.path.abspath(ops.input)))
+    if not inputs: fatal("No files match %s" % (ops.input))
 
-    left_vs_right_lo = ROOT.TH2F("left_vs_right_lo", ";q(left);q(right);"                  , 200,  -120,  280, 200,  -120,  280)
-    left_vs_right_hi = ROOT.TH2F("left_vs_right_hi", ";q(left);q(right);"                  , 200,  -600, 3400, 200,  -600, 3400)
-    minlr_vs_max_lo  = ROOT.TH2F("minlr_vs_max_lo", ";minimum of q(left), q(right);q(max);", 200,   -40,  120, 200, 0,  400)
-    minlr_vs_max_hi  = ROOT.TH2F("minlr_vs_max_hi", ";minimum of q(left), q(right);q(max);", 200,  -600, 3000, 200, 0, 3600)
-
-    xtitle_r = "r [mm]"
-    xtitle_l = "inst. lumi. [e^{33} cm^{-2} s^{-1} ]"
-    ytitle   = "N(strips)"
-    ybins_lo = 30
-    ybins_hi = 120
-
-    r_vs_strips_lo = ROOT.TH2F("r_vs_strips_lo", ";%s;%s;" % (xtitle_r, ytitle), 100,  800, 2200, ybins_lo, 0.5, ybins_lo+0.5)
-    r_vs_strips_hi = ROOT.TH2F("r_vs_strips_hi", ";%s;%s;" % (xtitle_r, ytitle), 100,  800, 2200, ybins_hi, 0.5, ybins_hi+0.5)
-    l_vs_strips_lo = ROOT.TH2F("l_vs_strips_lo", ";%s;%s;" % (xtitle_l, ytitle), 100,  3.0,  5.5, ybins_lo, 0.5, ybins_lo+0.5)
-    l_vs_strips_hi = ROOT.TH2F("l_vs_strips_hi", ";%s;%s;" % (xtitle_l, ytitle), 100,  3.0,  5.5, ybins_hi, 0.5, ybins_hi+0.5)
-    
-    h2s = [minlr_vs_max_lo, 
-           minlr_vs_max_hi,
-           left_vs_right_lo, 
-           left_vs_right_hi,
-           r_vs_strips_lo,
-           r_vs_strips_hi,
-           l_vs_strips_lo,
-           l_vs_strips_hi,
-           ]
-
-    ch.Draw("csc_chamber_cluster_qright/1000:csc_chamber_cluster_qleft/1000 >> left_vs_right_lo", "prescale_HLT", "goff")
-    ch.Draw("csc_chamber_cluster_qright/1000:csc_chamber_cluster_qleft/1000 >> left_vs_right_hi", "prescale_HLT", "goff")
-
-    ch.Draw("csc_chamber_cluster_qmax/1000:min(csc_chamber_cluster_qleft, csc_chamber_cluster_qright)/1000 >> minlr_vs_max_lo", "prescale_HLT", "goff")
-    ch.Draw("csc_chamber_cluster_qmax/1000:min(csc_chamber_cluster_qleft, csc_chamber_cluster_qright)/1000 >> minlr_vs_max_hi", "prescale_HLT", "goff")
+    colz()
 
-    ch.Draw("csc_chamber_cluster_strips:csc_chamber_cluster_r      >> r_vs_strips_lo", "prescale_HLT", "goff")
-    ch.Draw("csc_chamber_cluster_strips:csc_chamber_cluster_r      >> r_vs_strips_hi", "prescale_HLT", "goff")
-    ch.Draw("csc_chamber_cluster_strips:lbAverageLuminosity/1000.0 >> l_vs_strips_lo", "prescale_HLT", "goff")
-    ch.Draw("csc_chamber_cluster_strips:lbAverageLuminosity/1000.0 >> l_vs_strips_hi", "prescale_HLT", "goff")
+    # one pass over every file fills all histograms, files in parallel
+    if len(inputs) > 1:
+        npool = min(len(inputs), multiprocessing.cpu_count())
+        pool  = multiprocessing.Pool(npool)
+        parts = pool.map(ntuple_to_arrays, inputs)
+    else:
+        parts = [ntuple_to_arrays(inputs[0])]
+
+    h2s = []
+    for name, title, binning in hists:
+        h2 = ROOT.TH2F(name, title, *binning)
+        h2.Sumw2()
+        ROOT.SetOwnership(h2, False)
+        hist_arrays.contents(h2)[...] = sum(part[name][0] for part in parts)
+        hist_arrays.errors2(h2)[...]  = sum(part[name][1] for part in parts)
+        h2.ResetStats()
+        h2s.append(h2)
 
     for h2 in h2s:
 
@@ -90,6 +104,39 @@ def main():
         ROOT.gPad.SetLogz(1 if "_hi" in h2.GetName() else 0)
         canvas.SaveAs("output/"+canvas.GetName()+".pdf")
         
+def ntuple_to_arrays(input):
+    """ Sums of weights and of squared weights of every histogram over one file. """
+
+    tree = ROOT.TChain("physics")
+    tree.Add(input)
+    clusters = tree_arrays.columns(tree, columns)
+
+    qleft   = clusters["csc_chamber_cluster_qleft"]  / 1000
+    qright  = clusters["csc_chamber_cluster_qright"] / 1000
+    qmax    = clusters["csc_chamber_cluster_qmax"]   / 1000
+    strips  = clusters["csc_chamber_cluster_strips"]
+    r       = clusters["csc_chamber_cluster_r"]
+    lumi    = clusters["lbAverageLuminosity"] / 1000.0
+    weights = clusters["prescale_HLT"]
+    minlr   = numpy.minimum(qleft, qright)
+
+    values = {"left_vs_right": (qleft,  qright),
+              "minlr_vs_max":  (minlr,  qmax),
+              "r_vs_strips":   (r,      strips),
+              "l_vs_strips":   (lumi,   strips),
+              }
+
+    sums = {}
+    for name, _, binning in hists:
+        x, y   = values[name.rsplit("_", 1)[0]]
+        sumw   = numpy.zeros((binning[3]+2, binning[0]+2))
+        sumw2  = numpy.zeros((binning[3]+2, binning[0]+2))
+        xedges = hist_arrays.fixed_edges(*binning[0:3])
+        yedges = hist_arrays.fixed_edges(*binning[3:6])
+        hist_arrays.fill_arrays(sumw, sumw2, xedges, x, yedges, y, weights)
+        sums[name] = (sumw, sumw2)
+    return sums
+
 def fatal(message):
     import sys
     sys.exit("Error in %s: %s" % (__file__, message))
@@ -1,12 +1,15 @@
-import copy
 import math
 import multiprocessing
 import os
 import sys
 import time
 
+import numpy
 import ROOT
 import rootlogon
+import hist_arrays
+import throughput
+import tree_arrays
 ROOT.gROOT.SetBatch(True)
 ROOT.gErrorIgnoreLevel = ROOT.kWarning
 
@@ -17,6 +20,44 @@ if not os.path.isdir(outdir):
 files = filter(lambda line: line and not line.startswith("#"), 
                [line.strip() for line in open("csc_segments.txt")])
 
+is_small = 'csc_segment_type=="CSS"'
+is_sideA = 'csc_segment_side=="A"'
+columns  = ["csc_segment_r",
+            "csc_segment_phi",
+            "csc_segment_nphiclusters",
+            "csc_segment_netaclusters",
+            is_small,
+            is_sideA,
+            ]
+
+# per map: title and (xbins, xlo, xhi, ybins, ylo, yhi)
+title_all = "; segment #it{#phi} ; segment #it{r} [cm] ; Segments"
+title_phi = "; segment #it{#phi} ; segment #it{r} [cm] ; < #phi-clusters on segment >"
+title_eta = "; segment #it{#phi} ; segment #it{r} [cm] ; < #eta-clusters on segment >"
+
+def map_specs():
+    specs = []
+    for type in ["CSL", "CSS"]:
+        for layout, binning in [("overlaid",   ( 60, -0.48, 0.48, 19, 60, 250)),
+                                ("separate_A", (120, -3.6,  3.6,  19, 60, 250)),
+                                ("separate_C", (120, -3.6,  3.6,  19, 60, 250)),
+                                ]:
+            specs.append(("segments_%s_%s" % (type, layout), title_all, binning))
+            specs.append(("phiclust_%s_%s" % (type, layout), title_phi, binning))
+            specs.append(("etaclust_%s_%s" % (type, layout), title_eta, binning))
+    return specs
+
+maps     = map_specs()
+binnings = dict((name, binning) for name, _, binning in maps)
+
+# sums of weights and of squared weights of every map, one slot per pool worker,
+# in shared memory which the pool workers inherit, and the slot of this worker
+shared = None
+slot   = 0
+
+# entries of the files this worker is done with, for the throughput of the pool
+done = {"events": 0, "bytes": 0, "files_opened": 0, "entries": 0}
+
 def main():
 
     # farm histogramming
@@ -24,17 +65,25 @@ def main():
     for ijob, fi in enumerate(files):
         config = {}
         config["input"] = fi
-        config["ijob"]  = "%02i" % (ijob)
+        config["ijob"]  = ijob
         configs.append(config)
 
+    npool  = min(len(configs), multiprocessing.cpu_count())
+    memory = multiprocessing.RawArray("d", npool * 2 * cells())
+
     if len(configs) > 1:
-        npool = min(len(configs), multiprocessing.cpu_count())
-        pool = multiprocessing.Pool(npool)
-        results = pool.map(ntuple_to_hist, configs)
+        queue   = multiprocessing.Queue()
+        workers = multiprocessing.Value("i", 0)
+        pool = multiprocessing.Pool(npool, initializer=attach, initargs=(memory, queue, workers))
+        monitor = throughput.Monitor(queue, files=len(configs)).start()
+        pool.map(ntuple_to_arrays, configs)
+        monitor.stop()
+        monitor.write(os.path.join(outdir, "throughput.json"))
     else:
-        results = [ntuple_to_hist(config)]
+        attach(memory)
+        ntuple_to_arrays(configs[0])
 
-    hist = add_histograms(results)
+    hist = reduce_arrays(memory)
 
     # divide
     for name in hist:
@@ -88,113 +137,120 @@ def main():
 
         canv.SaveAs(os.path.join(outdir, canv.GetName()+".pdf"))
 
-def ntuple_to_hist(config):
-
-    ijob = config["ijob"]
+def cells():
+    return sum((binning[0]+2) * (binning[3]+2) for _, _, binning in maps)
+
+def attach(memory, queue=None, workers=None):
+    """ Pool initializer: the shared memory, and the next free slot of it for this worker. """
+    global shared, slot
+    shared = memory
+    throughput.attach(queue)
+    if workers is not None:
+        with workers.get_lock():
+            slot = workers.value
+            workers.value += 1
+
+def slots(memory):
+    """ The shared memory as an array [worker, sumw or sumw2, cell]. """
+    return numpy.frombuffer(memory, dtype=numpy.float64).reshape(-1, 2, cells())
+
+def accumulators(block):
+    """ Views of the sums of weights and squared weights of every map in a block [2, cell],
+        laid out [ybin, xbin] like hist_arrays.contents. """
+    views  = {}
+    offset = 0
+    for name, _, binning in maps:
+        shape = (binning[3]+2, binning[0]+2)
+        size  = shape[0] * shape[1]
+        views[name] = (block[0, offset:offset+size].reshape(shape),
+                       block[1, offset:offset+size].reshape(shape))
+        offset += size
+    return views
+
+def ntuple_to_arrays(config):
 
     tree = ROOT.TChain("physics")
     tree.Add(config["input"])
 
-    hist = {}
+    entries = tree.GetEntries()
+    done["files_opened"] += 1
+    done["entries"]      += entries
 
-    title_all = "; segment #it{#phi} ; segment #it{r} [cm] ; Segments"
-    title_phi = "; segment #it{#phi} ; segment #it{r} [cm] ; < #phi-clusters on segment >"
-    title_eta = "; segment #it{#phi} ; segment #it{r} [cm] ; < #eta-clusters on segment >"
-
-    hist["segments_CSL_overlaid"] = ROOT.TH2F("segments_CSL_overlaid_%s" % (ijob), title_all, 60, -0.48, 0.48, 19, 60, 250)
-    hist["segments_CSS_overlaid"] = ROOT.TH2F("segments_CSS_overlaid_%s" % (ijob), title_all, 60, -0.48, 0.48, 19, 60, 250)
-    
-    hist["phiclust_CSL_overlaid"] = ROOT.TH2F("phiclust_CSL_overlaid_%s" % (ijob), title_phi, 60, -0.48, 0.48, 19, 60, 250)
-    hist["phiclust_CSS_overlaid"] = ROOT.TH2F("phiclust_CSS_overlaid_%s" % (ijob), title_phi, 60, -0.48, 0.48, 19, 60, 250)
-    
-    hist["etaclust_CSL_overlaid"] = ROOT.TH2F("etaclust_CSL_overlaid_%s" % (ijob), title_eta, 60, -0.48, 0.48, 19, 60, 250)
-    hist["etaclust_CSS_overlaid"] = ROOT.TH2F("etaclust_CSS_overlaid_%s" % (ijob), title_eta, 60, -0.48, 0.48, 19, 60, 250)
-        
-    for side in ["A", "C"]:
-        hist["segments_CSL_separate_%s" % side] = ROOT.TH2F("segments_CSL_separate_%s_%s" % (side, ijob), title_all, 120, -3.6, 3.6,  19, 60, 250)
-        hist["segments_CSS_separate_%s" % side] = ROOT.TH2F("segments_CSS_separate_%s_%s" % (side, ijob), title_all, 120, -3.6, 3.6,  19, 60, 250)
-
-        hist["phiclust_CSL_separate_%s" % side] = ROOT.TH2F("phiclust_CSL_separate_%s_%s" % (side, ijob), title_phi, 120, -3.6, 3.6,  19, 60, 250)
-        hist["phiclust_CSS_separate_%s" % side] = ROOT.TH2F("phiclust_CSS_separate_%s_%s" % (side, ijob), title_phi, 120, -3.6, 3.6,  19, 60, 250)
-
-        hist["etaclust_CSL_separate_%s" % side] = ROOT.TH2F("etaclust_CSL_separate_%s_%s" % (side, ijob), title_eta, 120, -3.6, 3.6,  19, 60, 250)
-        hist["etaclust_CSS_separate_%s" % side] = ROOT.TH2F("etaclust_CSS_separate_%s_%s" % (side, ijob), title_eta, 120, -3.6, 3.6,  19, 60, 250)
-
-    for hi in hist.values():
-        hi.Sumw2()
-        ROOT.SetOwnership(hi, False)
-
-    events     = 1000 # tree.GetEntries()
-    start_time = time.time()
-
-    for event in xrange(events):
+    def callback(events, total):
+        # one line per worker, or the counters to the parent
+        if throughput.queue is None:
+            progress(start_time, events, total)
+        else:
+            counters = dict(done)
+            counters["events"] += events
+            counters["bytes"]  += tree.GetCurrentFile().GetBytesRead()
+            throughput.send(busy=True, **counters)
 
-        _ = tree.GetEntry(event)
-        if event > 0 and event % 500 == 0:
-            progress(start_time, event, events)
-        
-        for iseg in xrange(tree.csc_segment_n):
+    start_time = time.time()
+    segments   = tree_arrays.columns(tree, columns, callback=callback)
+    done["events"] += entries
+    done["bytes"]  += tree.GetCurrentFile().GetBytesRead()
+
+    r     = segments["csc_segment_r"] / 10.0
+    phi   = segments["csc_segment_phi"]
+    nphi  = segments["csc_segment_nphiclusters"]
+    neta  = segments["csc_segment_netaclusters"]
+    small = segments[is_small] > 0
+    sideA = segments[is_sideA] > 0
+
+    phi_rotated = rotate(phi, small)
+    sums        = accumulators(slots(shared)[slot])
+
+    def fill(name, x, y, weights=None):
+        xedges = hist_arrays.fixed_edges(*binnings[name][0:3])
+        yedges = hist_arrays.fixed_edges(*binnings[name][3:6])
+        hist_arrays.fill_arrays(sums[name][0], sums[name][1], xedges, x, yedges, y, weights)
+
+    for type in ["CSL", "CSS"]:
+
+        this = (small == (type == "CSS"))
+        fill("segments_%s_overlaid" % (type), phi_rotated[this], r[this])
+        fill("phiclust_%s_overlaid" % (type), phi_rotated[this], r[this], nphi[this])
+        fill("etaclust_%s_overlaid" % (type), phi_rotated[this], r[this], neta[this])
+
+        for side in ["A", "C"]:
+            here = this & (sideA == (side == "A"))
+            fill("segments_%s_separate_%s" % (type, side), phi[here], r[here])
+            fill("phiclust_%s_separate_%s" % (type, side), phi[here], r[here], nphi[here])
+            fill("etaclust_%s_separate_%s" % (type, side), phi[here], r[here], neta[here])
+
+    if throughput.queue is None:
+        print
+    else:
+        throughput.send(busy=False, **done)
+    return len(r)
 
-            r    = tree.csc_segment_r[iseg] / 10.0
-            phi  = tree.csc_segment_phi[iseg]
-            type = tree.csc_segment_type[iseg]
-            side = tree.csc_segment_side[iseg]
-            sect = tree.csc_segment_phi_sector[iseg]
-            nphi = tree.csc_segment_nphiclusters[iseg]
-            neta = tree.csc_segment_netaclusters[iseg]
+def reduce_arrays(memory):
+    """ Sum the slots of every worker into one TH2F per map. """
 
-            phi_rotated = rotate(phi, sect, type)
+    sums = accumulators(slots(memory).sum(axis=0))
 
-            hist["segments_%s_overlaid" % (type)].Fill(phi_rotated, r)
-            hist["phiclust_%s_overlaid" % (type)].Fill(phi_rotated, r, nphi)
-            hist["etaclust_%s_overlaid" % (type)].Fill(phi_rotated, r, neta)
+    hist = {}
+    for name, title, binning in maps:
+        hist[name] = ROOT.TH2F(name, title, *binning)
+        hist[name].Sumw2()
+        ROOT.SetOwnership(hist[name], False)
+        hist_arrays.contents(hist[name])[...] = sums[name][0]
+        hist_arrays.errors2(hist[name])[...]  = sums[name][1]
+        hist[name].ResetStats()
+    return hist
 
-            hist["segments_%s_separate_%s" % (type, side)].Fill(phi, r)
-            hist["phiclust_%s_separate_%s" % (type, side)].Fill(phi, r, nphi)
-            hist["etaclust_%s_separate_%s" % (type, side)].Fill(phi, r, neta)
+def rotate(phi, small):
+    """ Rotate every phi into the sector centered on 0.
+        Large sectors are centered on multiples of 45 degrees, small ones in between.
+        A phi on the edge of two sectors goes to the lower one. """
 
-    print
-    return hist
+    width  = 45 * math.pi / 180
+    offset = numpy.where(small, 0.5, 0.0)
 
-def add_histograms(results):
-
-    output = {}
-    for result in results:
-        for key in result:
-            if key in output:
-                output[key].Add(result[key])
-            else:
-                output[key] = copy.copy(result[key])
-                output[key].SetName(key)
-    return output
-                
-def rotate(phi, sector, type):
-    
-    deg_to_rad = math.pi / 180
-    rad_to_deg = 180 / math.pi
-
-    if type == "CSL":
-        if phi > ( 3.5 * 45 * deg_to_rad): return phi - (4.0 * 45 * deg_to_rad)
-        if phi > ( 2.5 * 45 * deg_to_rad): return phi - (3.0 * 45 * deg_to_rad)
-        if phi > ( 1.5 * 45 * deg_to_rad): return phi - (2.0 * 45 * deg_to_rad)
-        if phi > ( 0.5 * 45 * deg_to_rad): return phi - (1.0 * 45 * deg_to_rad)
-        if phi > (-0.5 * 45 * deg_to_rad): return phi - (0.0 * 45 * deg_to_rad)
-        if phi > (-1.5 * 45 * deg_to_rad): return phi + (1.0 * 45 * deg_to_rad)
-        if phi > (-2.5 * 45 * deg_to_rad): return phi + (2.0 * 45 * deg_to_rad)
-        if phi > (-3.5 * 45 * deg_to_rad): return phi + (3.0 * 45 * deg_to_rad)
-        if phi > (-4.5 * 45 * deg_to_rad): return phi + (4.0 * 45 * deg_to_rad)
-
-    if type == "CSS":
-        if phi > ( 3.0 * 45 * deg_to_rad): return phi - (3.5 * 45 * deg_to_rad)
-        if phi > ( 2.0 * 45 * deg_to_rad): return phi - (2.5 * 45 * deg_to_rad)
-        if phi > ( 1.0 * 45 * deg_to_rad): return phi - (1.5 * 45 * deg_to_rad)
-        if phi > ( 0.0 * 45 * deg_to_rad): return phi - (0.5 * 45 * deg_to_rad)
-        if phi > (-1.0 * 45 * deg_to_rad): return phi + (0.5 * 45 * deg_to_rad)
-        if phi > (-2.0 * 45 * deg_to_rad): return phi + (1.5 * 45 * deg_to_rad)
-        if phi > (-3.0 * 45 * deg_to_rad): return phi + (2.5 * 45 * deg_to_rad)
-        if phi > (-4.0 * 45 * deg_to_rad): return phi + (3.5 * 45 * deg_to_rad)
-        
-    fatal("What the fuck is this? %s %s %s" % (phi, sector, type))
+    sector = numpy.ceil(phi/width - 0.5 - offset)
+    sector = numpy.clip(sector, -4, numpy.where(small, 3, 4))
+    return phi - (sector + offset) * width
 
 def center(sector):
     deg_to_rad = math.pi / 180
@@ -1,14 +1,13 @@
 import argparse
+
+import analysis_server
+if __name__ == "__main__":
+    analysis_server.run_remote(__file__)
+
 import ROOT
 ROOT.gROOT.SetBatch(True)
 
-ROOT.gStyle.SetPadTickX(1)
-ROOT.gStyle.SetPadTickY(1)
-
-ROOT.gStyle.SetPadTopMargin(0.06)
-ROOT.gStyle.SetPadBottomMargin(0.15)
-ROOT.gStyle.SetPadLeftMargin(0.18)
-ROOT.gStyle.SetPadRightMargin(0.06)
+import fit_store
 
 bunches_run3  = 2808
 bunches_hllhc = 3564
@@ -18,10 +17,12 @@ def options():
     parser.add_argument("--bunches",  help="Number of bunches. Must be 2808 or 3564.")
     parser.add_argument("--lines",    help="Draw guiding lines", action="store_true")
     parser.add_argument("--hits",     help="Type of hits to use: raw or adc")
+    parser.add_argument("--db",       help="Database of projected slopes from slope_vs_bunches.py", default=fit_store.default_db)
     return parser.parse_args()
 
 def main():
 
+    margins()
     ops = options()
     if not ops.bunches in ["2808", "3564"]: 
         fatal("Please give --bunches as 2808 (Run 3) or 3564 (HL-LHC)")
@@ -50,7 +51,7 @@ def main():
                  "EMS1",
                  ]:
         fit[name] = ROOT.TF1("fit_"+name, "[0]*(x) + [1]", xlo, xhi)
-        slope, offset = slope_offset(name, int(ops.bunches), ops.hits)
+        slope, offset = slope_offset(name, int(ops.bunches), ops.hits, ops.db)
         fit[name].SetParameter(0, slope*10)
         fit[name].SetParameter(1, offset)
         fit[name].SetLineColor(color(name))
@@ -110,41 +111,25 @@ def main():
  
     canvas.SaveAs("output/"+canvas.GetName()+".pdf")
         
+def margins():
+    ROOT.gStyle.SetPadTickX(1)
+    ROOT.gStyle.SetPadTickY(1)
+
+    ROOT.gStyle.SetPadTopMargin(0.06)
+    ROOT.gStyle.SetPadBottomMargin(0.15)
+    ROOT.gStyle.SetPadLeftMargin(0.18)
+    ROOT.gStyle.SetPadRightMargin(0.06)
+
 def fatal(message):
     import sys
     sys.exit("Error in %s: %s" % (__file__, message))
 
-def slope_offset(region, bunches, hits):
+def slope_offset(region, bunches, hits, db=fit_store.default_db):
     # NB: slope in units of e33.
-    if bunches == 2808 and hits=="raw":
-        if region == "CSL1": return (79.872, 0)
-        if region == "CSS1": return (80.470, 0)
-        if region == "EIL1": return (18.872, 0)
-        if region == "EIS1": return (17.793, 0)
-        if region == "EML1": return ( 4.577, 0)
-        if region == "EMS1": return ( 5.977, 0)
-    if bunches == 3564 and hits=="raw":
-        if region == "CSL1": return (72.360, 0)
-        if region == "CSS1": return (73.418, 0)
-        if region == "EIL1": return (16.992, 0)
-        if region == "EIS1": return (16.243, 0)
-        if region == "EML1": return ( 4.104, 0)
-        if region == "EMS1": return ( 5.307, 0)
-    if bunches == 2808 and hits=="adc":
-        if region == "CSL1": return (69.699, 0)
-        if region == "CSS1": return (70.856, 0)
-        if region == "EIL1": return (16.044, 0)
-        if region == "EIS1": return (15.180, 0)
-        if region == "EML1": return ( 3.861, 0)
-        if region == "EMS1": return ( 5.006, 0)
-    if bunches == 3564 and hits=="adc":
-        if region == "CSL1": return (62.852, 0)
-        if region == "CSS1": return (63.995, 0)
-        if region == "EIL1": return (14.388, 0)
-        if region == "EIS1": return (13.822, 0)
-        if region == "EML1": return ( 3.445, 0)
-        if region == "EMS1": return ( 4.413, 0)
-    fatal("No slope, offset for %s, %s bunches, %s hits" % (region, bunches, hits))
+    projection = fit_store.projection(region, bunches, hits, db)
+    if projection:
+        return projection
+    fatal("No slope, offset for %s, %s bunches, %s hits in %s. Please run slope_vs_bunches.py first" % (region, bunches, hits, db))
 
 def style(hist, ndiv=505):
     ops = options()
@@ -0,0 +1,152 @@
+"""
+fit_store.py: a small sqlite database of fit results.
+
+linear_fits.py writes the rate vs. lumi fits of each run, region and hit type.
+slope_vs_bunches.py reads them, fits the slope vs. colliding bunches,
+and writes the projected slopes for a given number of bunches,
+which extrapolate_vs_lumi.py and plots.py read back.
+
+Older hand-copied tables can be loaded once with:
+
+> python fit_store.py --text=slope_vs_bunches_raw.txt --hits=raw
+"""
+
+import argparse
+import os
+import sqlite3
+import sys
+
+default_db = "fits.db"
+
+fit_columns        = ["run", "region", "hits", "bunches", "name",
+                      "slope", "slope_err", "offset", "offset_err", "chi2", "ndf"]
+projection_columns = ["region", "hits", "bunches",
+                      "slope", "slope_err", "offset"]
+
+schema = """
+create table if not exists fits (
+    run        text    not null,
+    region     text    not null,
+    hits       text    not null,
+    bunches    integer not null,
+    name       text,
+    slope      real,
+    slope_err  real,
+    offset     real,
+    offset_err real,
+    chi2       real,
+    ndf        integer,
+    primary key (run, region, hits, bunches)
+);
+create table if not exists projections (
+    region    text    not null,
+    hits      text    not null,
+    bunches   integer not null,
+    slope     real,
+    slope_err real,
+    offset    real,
+    primary key (region, hits, bunches)
+);
+"""
+
+def options():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--db",   help="Database of fit results", default=default_db)
+    parser.add_argument("--text", help="Whitespace table of name, run, bunches, slope, offset to load")
+    parser.add_argument("--hits", help="Type of hits in the --text table: raw or adc")
+    return parser.parse_args()
+
+def main():
+
+    ops = options()
+    if not ops.text:
+        fatal("Please give a --text table to load")
+    if not ops.hits in ["raw", "adc"]:
+        fatal("Please give --hits as raw or adc")
+
+    rows = read_text(ops.text, ops.hits)
+    write_fits(rows, ops.db)
+    print " loaded %i fits from %s into %s" % (len(rows), ops.text, ops.db)
+
+def connect(db=default_db):
+    conn = sqlite3.connect(db)
+    conn.row_factory = sqlite3.Row
+    conn.executescript(schema)
+    return conn
+
+def write_fits(rows, db=default_db):
+    """ Insert or replace fits, each a dict with the fit_columns. """
+    insert(db, "fits", fit_columns, rows)
+
+def write_projections(rows, db=default_db):
+    """ Insert or replace projected slopes, each a dict with the projection_columns. """
+    insert(db, "projections", projection_columns, rows)
+
+def insert(db, table, columns, rows):
+    conn = connect(db)
+    with conn:
+        conn.executemany("insert or replace into %s (%s) values (%s)" % (table, ", ".join(columns), ", ".join(["?"]*len(columns))),
+                         [[row.get(column) for column in columns] for row in rows])
+    conn.close()
+
+def fits(hits=None, region=None, db=default_db):
+    """ Fits as dicts, optionally for one type of hits and one region, e.g. EIL1 or mdt_EIL1. """
+    query = "select * from fits where 1"
+    args  = []
+    if hits:
+        query += " and hits = ?"
+        args.append(hits)
+    if region:
+        condition, region_args = matching(region)
+        query += " and " + condition
+        args  += region_args
+    return select(db, query + " order by region, bunches, run", args)
+
+def projection(region, bunches, hits, db=default_db):
+    """ (slope, offset) projected for a number of bunches, or None.
+        region can be given with or without the detector, e.g. EIL1 or mdt_EIL1. """
+    condition, region_args = matching(region)
+    rows = select(db, "select * from projections where %s and bunches = ? and hits = ?" % (condition),
+                  region_args + [bunches, hits])
+    if not rows:
+        return None
+    return (rows[0]["slope"], rows[0]["offset"])
+
+def matching(region):
+    """ SQL condition and arguments for a region given with or without its detector:
+        the stored names are either, e.g. CSS1 by slope_vs_bunches.py and mdt_EIL1 by linear_fits.py.
+        mdt_full and csc_full only match themselves. """
+    short = region.split("_", 1)[-1]
+    if short == "full":
+        return "region = ?", [region]
+    return "(region = ? or region like ? escape '\\')", [short, "%\\_"+short]
+
+def select(db, query, args):
+    if not os.path.isfile(db):
+        fatal("No fit results in %s. Please run linear_fits.py first" % (db))
+    conn = connect(db)
+    rows = [dict(row) for row in conn.execute(query, args)]
+    conn.close()
+    return rows
+
+def read_text(path, hits):
+    """ Fits from the old whitespace tables, e.g.
+        hits_raw_vs_lumi_vs_evts_mdt_EIL1_00278880_pfx 00278880 447 64.76238 2.24537 """
+    rows = []
+    for line in open(path).readlines():
+        line = line.strip()
+        if not line:             continue
+        if line.startswith("#"): continue
+
+        name, run, bunches, slope, offset = line.split()
+        region = name.split("_vs_evts_")[-1].replace("_"+run, "").replace("_pfx", "")
+
+        rows.append({"run": run, "region": region, "hits": hits, "bunches": int(bunches), "name": name,
+                     "slope": float(slope), "offset": float(offset)})
+    return rows
+
+def fatal(message):
+    sys.exit("Error in %s: %s" % (__file__, message))
+
+if __name__ == "__main__":
+    main()
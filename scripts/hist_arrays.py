@@ -0,0 +1,141 @@
+"""
+hist_arrays.py: zero-copy numpy views of ROOT histograms,
+and whole-array normalization of hits into rates.
+
+The views share memory with the histogram, including the
+under- and overflow bins, so writing into a view writes into
+the histogram. 2D views are indexed [ybin, xbin], like TH2::GetBin.
+
+> rate = copy.copy(hits)
+> divide(rate, entries * livetime * contents(area))
+"""
+
+import hashlib
+import numpy
+
+dtypes = [("TArrayD", numpy.float64),
+          ("TArrayF", numpy.float32),
+          ("TArrayI", numpy.int32),
+          ("TArrayS", numpy.int16),
+          ("TArrayC", numpy.int8),
+          ]
+
+def contents(hist):
+    """ Bin contents of a TH1/TH2 as a writable view. """
+    if hist.InheritsFrom("TProfile"):
+        fatal("Bin contents of %s are not stored as an array" % (hist.GetName()))
+    for array, dtype in dtypes:
+        if hist.InheritsFrom(array):
+            return view(hist.GetArray(), dtype, shape(hist))
+    fatal("Unknown storage type for %s" % (hist.GetName()))
+
+def errors2(hist):
+    """ Squared bin errors of a TH1/TH2 as a writable view.
+        The sum of weights squared is created if it does not exist yet. """
+    if hist.GetSumw2N() == 0:
+        hist.Sumw2()
+    return view(hist.GetSumw2().GetArray(), numpy.float64, shape(hist))
+
+def view(buf, dtype, shape):
+    ncells = 1
+    for dim in shape:
+        ncells *= dim
+    return numpy.frombuffer(buf, dtype=dtype, count=ncells).reshape(shape)
+
+def shape(hist):
+    if hist.GetDimension() == 1: return (hist.GetNbinsX()+2,)
+    if hist.GetDimension() == 2: return (hist.GetNbinsY()+2, hist.GetNbinsX()+2)
+    fatal("Cannot view %s with dimension %i" % (hist.GetName(), hist.GetDimension()))
+
+def centers(axis):
+    """ Bin centers of a TAxis, including under- and overflow,
+        with the same convention as TAxis::GetBinCenter. """
+    nbins = axis.GetNbins()
+    if axis.IsVariableBinSize():
+        edges = view(axis.GetXbins().GetArray(), numpy.float64, (nbins+1,)).copy()
+        width = numpy.diff(edges)
+        center = edges[:-1] + width/2
+        return numpy.concatenate([[edges[0]  - width[0]/2], center, [edges[-1] + width[-1]/2]])
+    width = (axis.GetXmax() - axis.GetXmin()) / nbins
+    return axis.GetXmin() + (numpy.arange(nbins+2) - 0.5) * width
+
+def checksum(hist):
+    """ Checksum of the stored bin contents and squared errors.
+        TProfiles are included, even though they store sums rather than contents. """
+    sha = hashlib.sha1()
+    for array, dtype in dtypes:
+        if hist.InheritsFrom(array):
+            sha.update(view(hist.GetArray(), dtype, shape(hist)).tobytes())
+            break
+    if hist.GetSumw2N():
+        sha.update(view(hist.GetSumw2().GetArray(), numpy.float64, shape(hist)).tobytes())
+    return sha.hexdigest()
+
+def edges(axis):
+    """ Bin edges of a TAxis, with -inf and +inf for the under- and overflow. """
+    nbins = axis.GetNbins()
+    if axis.IsVariableBinSize():
+        inner = view(axis.GetXbins().GetArray(), numpy.float64, (nbins+1,)).copy()
+        return numpy.concatenate([[-numpy.inf], inner, [numpy.inf]])
+    return fixed_edges(nbins, axis.GetXmin(), axis.GetXmax())
+
+def fixed_edges(nbins, lo, hi):
+    """ Edges of nbins equal bins from lo to hi, with -inf and +inf for the under- and overflow. """
+    return numpy.concatenate([[-numpy.inf], numpy.linspace(lo, hi, nbins+1), [numpy.inf]])
+
+def fill_arrays(sumw, sumw2, xedges, x, yedges=None, y=None, weights=None):
+    """ Add arrays of values into the arrays of bin contents and squared errors,
+        laid out like contents() and errors2(), with edges like edges(). """
+
+    x = numpy.asarray(x, dtype=numpy.float64)
+    if weights is None:
+        weights = numpy.ones_like(x)
+    weights = numpy.asarray(weights, dtype=numpy.float64)
+
+    if yedges is None:
+        sumw[...]  += numpy.histogram(x, bins=xedges, weights=weights)[0]
+        sumw2[...] += numpy.histogram(x, bins=xedges, weights=weights**2)[0]
+    else:
+        y = numpy.asarray(y, dtype=numpy.float64)
+        sumw[...]  += numpy.histogram2d(y, x, bins=(yedges, xedges), weights=weights)[0]
+        sumw2[...] += numpy.histogram2d(y, x, bins=(yedges, xedges), weights=weights**2)[0]
+
+def labels(axis):
+    """ Bin labels of a TAxis, e.g. the chambers of hits_raw_vs_chamber_vs_lumi, or None. """
+    if not axis.GetLabels():
+        return None
+    return [axis.GetBinLabel(ibin) for ibin in xrange(1, axis.GetNbins()+1)]
+
+def divide(hist, denom):
+    """ Divide hist in place by denom, a histogram or an array which
+        broadcasts onto the bins of hist. Errors are propagated as
+        uncorrelated, like TH1::Divide. Bins with a zero denominator
+        are set to zero. """
+
+    numer  = contents(hist)
+    numer2 = errors2(hist)
+
+    if hasattr(denom, "GetNbinsX"):
+        denom2 = errors2(denom)
+        denom  = contents(denom)
+    else:
+        denom  = numpy.asarray(denom, dtype=numpy.float64)
+        denom2 = numpy.zeros_like(denom)
+
+    denom, denom2 = numpy.broadcast_arrays(denom, denom2)
+    zero = (denom == 0)
+    safe = numpy.where(zero, 1.0, denom)
+
+    ratio  = numer / safe
+    ratio2 = (numer2 * safe**2 + denom2 * numer.astype(numpy.float64)**2) / safe**4
+
+    numer[...]  = numpy.where(zero, 0.0, ratio)
+    numer2[...] = numpy.where(zero, 0.0, ratio2)
+
+    # keep the statistics consistent with the new contents
+    hist.ResetStats()
+    return hist
+
+def fatal(message):
+    import sys
+    sys.exit("Error in %s: %s" % (__file__, message))
@@ -0,0 +1,121 @@
+"""
+hist_npz.py: export every histogram of a root file to a numpy .npz archive,
+and read them back without ROOT.
+
+Each histogram, e.g. 00278880/evts_00278880, is stored as arrays
+  <name>/contents  bin contents, including under- and overflow
+  <name>/errors2   squared bin errors
+  <name>/xedges    bin edges of the x-axis
+  <name>/yedges    bin edges of the y-axis, for 2D histograms
+with the [ybin, xbin] layout of hist_arrays.py. The class, title,
+entries and bin labels, e.g. the chambers of hits_raw_vs_chamber_vs_lumi,
+of every histogram, and the run metadata of histograms.root, are stored
+as json.
+
+> python hist_npz.py --input=histograms.root --output=histograms.npz
+
+> hists = hist_npz.load("histograms.npz")
+> hist  = hists["00278880/evts_00278880"]
+> hist["contents"][1]
+"""
+
+import argparse
+import json
+import os
+import sys
+
+import numpy
+
+def options():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--input",  help="Input root file", default="histograms.root")
+    parser.add_argument("--output", help="Output npz file, default: the input with .npz")
+    return parser.parse_args()
+
+def main():
+    ops = options()
+    output = ops.output or os.path.splitext(ops.input)[0] + ".npz"
+    export(ops.input, output)
+
+def export(input, output):
+
+    import ROOT
+    ROOT.TH1.AddDirectory(False)
+    import hist_arrays
+    import run_metadata
+
+    tfile = ROOT.TFile.Open(input)
+    if not tfile:
+        fatal("Cannot open %s" % (input))
+
+    arrays = {}
+    index  = {}
+    for name, hist in walk(tfile):
+        if name in index:
+            continue
+        arrays[name+"/contents"] = hist_arrays.contents(hist).copy()
+        arrays[name+"/errors2"]  = hist_arrays.errors2(hist).copy()
+        arrays[name+"/xedges"]   = edges(hist.GetXaxis())
+        if hist.GetDimension() == 2:
+            arrays[name+"/yedges"] = edges(hist.GetYaxis())
+        index[name] = {"class": hist.ClassName(), "title": hist.GetTitle(), "entries": hist.GetEntries(),
+                       "xlabels": hist_arrays.labels(hist.GetXaxis()), "ylabels": hist_arrays.labels(hist.GetYaxis())}
+    tfile.Close()
+
+    metadata = run_metadata.read(input)
+    arrays["__index__"]    = numpy.array(json.dumps(index))
+    arrays["__metadata__"] = numpy.array(json.dumps(metadata))
+
+    numpy.savez_compressed(output, **arrays)
+    print " exported %i histograms from %s to %s" % (len(index), input, output)
+
+def walk(directory, prefix=""):
+    """ (path, histogram) of every TH1 and TH2 below directory. """
+    for key in directory.GetListOfKeys():
+        obj  = key.ReadObj()
+        path = prefix + key.GetName()
+        if obj.InheritsFrom("TDirectory"):
+            for item in walk(obj, path+"/"):
+                yield item
+        elif obj.InheritsFrom("TH1") and not obj.InheritsFrom("TProfile") and obj.GetDimension() <= 2:
+            yield path, obj
+
+def edges(axis):
+    if axis.IsVariableBinSize():
+        return numpy.array([axis.GetXbins()[ibin] for ibin in xrange(axis.GetNbins()+1)], dtype=numpy.float64)
+    return numpy.linspace(axis.GetXmin(), axis.GetXmax(), axis.GetNbins()+1)
+
+def load(path):
+    """ Histograms of an exported archive, read lazily by name. No ROOT needed. """
+    if not os.path.isfile(path):
+        fatal("Cannot open %s" % (path))
+    return Archive(numpy.load(path))
+
+class Archive(object):
+
+    def __init__(self, npz):
+        self.npz      = npz
+        self.index    = json.loads(str(npz["__index__"]))
+        self.metadata = json.loads(str(npz["__metadata__"]))
+
+    def keys(self):
+        return sorted(self.index)
+
+    def __contains__(self, name):
+        return name in self.index
+
+    def __getitem__(self, name):
+        if name not in self.index:
+            raise KeyError(name)
+        hist = dict(self.index[name])
+        hist["contents"] = self.npz[name+"/contents"]
+        hist["errors2"]  = self.npz[name+"/errors2"]
+        hist["xedges"]   = self.npz[name+"/xedges"]
+        hist["yedges"]   = self.npz[name+"/yedges"] if name+"/yedges" in self.npz.files else None
+        return hist
+
+def fatal(message):
+    sys.exit("Error in %s: %s" % (__file__, message))
+
+if __name__ == "__main__":
+    main()
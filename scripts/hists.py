@@ -4,13 +4,43 @@ hists.py: script to make histograms from MuonRawHits ntuples.
 Run outside athena.
 
 > python hists.py --input=input_*.root --cpu=2
+
+With --files-per-job=N, every job processes N files, which may be of
+different runs, and writes one directory per run.
+
+With --binning=auto, the axes of lumi, mu and the hits in the full MDT, CSC and regions
+are picked from a pre-scan of the inputs (see binning.py) and stored in
+histograms.root. --binning=histograms.root of an earlier batch uses the same
+axes again, so the two can be merged.
+
+While the workers run, a background thread reads the first --read-ahead-mb of
+the inputs of the next jobs, so the files come from the page cache, or the
+cache of the network filesystem, when they are opened, and every worker reads
+its trees through a TTreeCache of --cache-mb. The time spent opening files,
+in GetEntry and in the rest of the event loop is printed per job at the end.
+
+With --runs and --lbs, only the entries of those runs and lumiblocks are
+processed; the others are skipped after reading their run and lumiblock.
+With --catalog=catalog.json (see catalog.py), the inputs are the files of the
+catalog, refreshed with --input if given, which have entries of --runs and of
+the lumiblocks --lbs, largest first.
+
+The workers send their events, bytes and hits so far to the parent, which
+prints one line with the total rate, the ETA and the slow workers, and writes
+the totals and the time per job to throughput.json at the end.
+
+With --skim, the hits per region of every event are also written to skim.root,
+from which skim_hists.py rebuilds the histograms vs. lumi and bcid.
 """
 
 import argparse
 import glob
 import multiprocessing as mp
+import os
 import subprocess
 import sys
+import threading
+import time
 import warnings
 warnings.filterwarnings(action="ignore", category=RuntimeWarning)
 
@@ -18,64 +48,303 @@ import ROOT
 ROOT.gROOT.SetBatch(True)
 ROOT.gROOT.Macro("$ROOTCOREDIR/scripts/load_packages.C")
 
+import binning
+import catalog
+import hist_npz
+import throughput
+
+# one MuonRawHistograms per process, reused for every file it gets
+worker = None
+
+# what the worker of this process has done in the files before the current one,
+# and whether it is in an event loop now
+done     = {"events": 0, "bytes": 0, "hits": 0, "files_opened": 0, "entries": 0}
+counting = False
+
 def options():
     parser = argparse.ArgumentParser()
     parser.add_argument("--input",  help="comma-separated, glob-able input root files")
     parser.add_argument("--cpu",    help="number of cpu")
-    parser.add_argument("--events", help="max number of events")
+    parser.add_argument("--events", help="max number of events per file")
+    parser.add_argument("--files-per-job", help="number of input files per job, which may be of different runs", default=1, type=int)
+    parser.add_argument("--skim",   help="also write the hits per region per event to skim.root", action="store_true")
+    parser.add_argument("--no-bcid-regions", help="skip the unweighted hits per bcid per region", action="store_true")
+    parser.add_argument("--chamber-tensor", help="hits per chamber vs lumi as one TH2 per type of hits: 0 off, 1 unweighted integers, 2 weighted, 3 weighted with sumw2", default=1, type=int)
+    parser.add_argument("--placeholders", help="also write empty per-chamber histograms of chambers without hits", action="store_true")
+    parser.add_argument("--catalog", help="json catalog of the inputs, from catalog.py")
+    parser.add_argument("--runs",    help="comma-separated runs to process, default: all. with --catalog, only their files are opened")
+    parser.add_argument("--lbs",     help="lumiblock range to process, as first:last, default: all. with --catalog, only their files are opened")
+    parser.add_argument("--read-ahead",    help="number of jobs whose inputs are read ahead, besides the running ones", default=2, type=int)
+    parser.add_argument("--read-ahead-mb", help="MB read ahead per input file, 0 for none", default=512, type=int)
+    parser.add_argument("--cache-mb",      help="TTreeCache per worker in MB, 0 for the default of the file", default=64, type=int)
+    parser.add_argument("--binning", help="json or root file with the axes to use, or auto to pick them from a pre-scan of the inputs")
+    parser.add_argument("--adc-thresholds",  help="comma-separated mdt adc thresholds, to count hits above each in one pass", default="")
+    parser.add_argument("--qmax-thresholds", help="comma-separated csc qmax thresholds [ke], to count hits above each in one pass", default="")
     return parser.parse_args()
 
 def main():
 
     ops = options()
-    if not ops.input:
-        fatal("Please give a comma-separated list of --input files (glob-capable)")
+    if not ops.input and not ops.catalog:
+        fatal("Please give a comma-separated list of --input files (glob-capable), or a --catalog")
 
     inputs = []
-    for inp in ops.input.split(","):
+    for inp in (ops.input or "").split(","):
         if "*" in inp:
             inputs.extend(glob.glob(inp))
-        else:
+        elif inp:
             inputs.append(inp)
 
-    status = parallelize_histograms(inputs)
+    if ops.catalog:
+        records = catalog.load(ops.catalog) if os.path.exists(ops.catalog) else {}
+        if inputs:
+            records = catalog.refresh(records, inputs)
+            catalog.save(records, ops.catalog)
+        records = catalog.select(records, catalog.runs(ops.runs), catalog.lbs(ops.lbs))
+        if not records:
+            fatal("No files of %s with runs %s and lumiblocks %s" % (ops.catalog, ops.runs, ops.lbs))
+        catalog.summary(records, cpu=int(ops.cpu) if ops.cpu else 1)
+        # the largest first, so the pool does not end waiting for one large file
+        inputs = sorted(records, key=lambda path: -records[path]["entries"])
+
+        entries = dict((path, records[path]["entries"]) for path in inputs)
+    else:
+        entries = None
+
+    status = parallelize_histograms(inputs, entries)
 
-def parallelize_histograms(files):
+def parallelize_histograms(files, entries=None):
+    """ Histogram files in a pool. entries: {file: entries}, e.g. from the catalog, for the ETA. """
 
     ops = options()
 
     maxevents   = int(ops.events) if ops.events else -1
     cpu         = int(ops.cpu)    if ops.cpu    else 1
     configs     = []
+    nfiles      = len(files)
+
+    # for the event loop: all lumiblocks if last < first, and last within a C++ int
+    lbs = catalog.lbs(ops.lbs) or (0, -1)
+    lbs = (lbs[0], min(lbs[1], 2**31-1))
+
+    axes = {}
+    if ops.binning == "auto":
+        axes = binning.choose(binning.scan(binning.sample(files, 10)))
+        binning.save(axes, "binning.json")
+    elif ops.binning:
+        axes = binning.load(ops.binning)
+    if axes:
+        binning.summary(axes)
 
     while files:
         iconfig = len(configs)
         configs.append(dict())
-        configs[iconfig]["input"]  = files.pop(0)
+        configs[iconfig]["inputs"] = files[:max(ops.files_per_job, 1)]
+        files = files[max(ops.files_per_job, 1):]
         configs[iconfig]["output"] = "histograms_%04i.root" % (iconfig)
         configs[iconfig]["events"] = maxevents
+        configs[iconfig]["skim"]   = "skim_%04i.root" % (iconfig) if ops.skim else ""
+        configs[iconfig]["bcid"]   = not ops.no_bcid_regions
+        configs[iconfig]["placeholders"] = ops.placeholders
+        configs[iconfig]["tensor"] = ops.chamber_tensor
+        configs[iconfig]["adc"]    = [int(thr) for thr in ops.adc_thresholds.split(",")  if thr]
+        configs[iconfig]["qmax"]   = [int(thr) for thr in ops.qmax_thresholds.split(",") if thr]
+        configs[iconfig]["axes"]   = axes
+        configs[iconfig]["cache"]  = ops.cache_mb * 1024 * 1024
+        configs[iconfig]["runs"]   = [int(run) for run in catalog.runs(ops.runs) or []]
+        configs[iconfig]["lbs"]    = lbs
 
     for iconfig, config in enumerate(configs):
         print " job", iconfig
-        print " -", config["input"]
+        for input in config["inputs"]:
+            print " -", input
 
     # map
+    preload()
     npool = min(len(configs), cpu, mp.cpu_count()-1)
-    if npool > 1:
-        pool = mp.Pool(npool)
-        results = pool.map(ntuple_to_histogram, configs)
+    queue = mp.Queue()
+    pool  = mp.Pool(npool, initializer=throughput.attach, initargs=(queue,)) if npool > 1 else None
+    if not pool:
+        throughput.attach(queue)
+
+    # started after the fork, so the workers do not inherit them
+    slots = read_ahead(configs, ops.read_ahead_mb * 1024 * 1024, max(npool, 1) + ops.read_ahead)
+    expected = None
+    if entries:
+        expected = sum(min(entries[path], maxevents) if maxevents >= 0 else entries[path] for path in entries)
+    monitor = throughput.Monitor(queue, events=expected, files=nfiles).start()
+
+    timings = []
+    if pool:
+        for timing in pool.imap_unordered(ntuple_to_histogram, configs, chunksize=1):
+            slots.release()
+            timings.append(timing)
     else:
-        ntuple_to_histogram(configs[0])
+        for config in configs:
+            timings.append(ntuple_to_histogram(config))
+            slots.release()
+
+    monitor.stop()
+    report(timings)
+    monitor.write("throughput.json", jobs=timings)
 
     # reduce
     hadd("histograms.root", sorted(glob.glob("histograms_*.root")))
+    if axes:
+        binning.store(axes, "histograms.root")
+    hist_npz.export("histograms.root", "histograms.npz")
+    if ops.skim:
+        hadd("skim.root", sorted(glob.glob("skim_*.root")))
+
+def preload():
+    """ Load the class and the dictionaries of the ntuple branches in the parent,
+        so that the forked workers start with them instead of each loading them. """
+    ROOT.MuonRawHistograms
+    for name in ["vector<string>", "vector<int>", "vector<vector<int> >"]:
+        ROOT.TClass.GetClass(name)
+
+    # let the read-ahead thread run while the event loop is in C++
+    for flag in ["_threaded", "__release_gil__"]:
+        try:
+            setattr(ROOT.MuonRawHistograms.execute, flag, True)
+        except AttributeError:
+            pass
+
+def read_ahead(configs, size, jobs):
+    """ Read the first size bytes of the inputs of every job in a background thread,
+        at most jobs jobs ahead of those done: release the semaphore returned per job done. """
+
+    slots = threading.Semaphore(jobs)
+
+    def run():
+        for config in configs:
+            slots.acquire()
+            for path in config["inputs"]:
+                warm(path, size)
+
+    if size > 0:
+        thread = threading.Thread(target=run)
+        thread.daemon = True
+        thread.start()
+    return slots
+
+def warm(path, size, chunk=8*1024*1024):
+    """ Read up to size bytes of a local or mounted file, and throw them away. """
+    if "://" in path:
+        return
+    try:
+        with open(path, "rb") as input:
+            while size > 0:
+                block = input.read(min(chunk, size))
+                if not block:
+                    break
+                size -= len(block)
+    except IOError:
+        pass
 
 def ntuple_to_histogram(config):
 
-    job = ROOT.MuonRawHistograms(config["input"], config["output"])
-    job.initialize()
-    job.execute(config["events"])
-    job.finalize()
+    global worker
+
+    first, rest = config["inputs"][0], config["inputs"][1:]
+    timing = {"job": config["output"], "files": len(config["inputs"]), "open": 0.0, "read": 0.0, "loop": 0.0, "write": 0.0}
+
+    start = time.time()
+    if worker is None:
+        worker = ROOT.MuonRawHistograms(first, config["output"])
+        worker.set_skim_path(config["skim"])
+        worker.set_bcid_regions(config["bcid"])
+        worker.set_placeholders(config["placeholders"])
+        worker.set_chamber_tensor(config["tensor"])
+        worker.set_adc_thresholds(vector(config["adc"]))
+        worker.set_qmax_thresholds(vector(config["qmax"]))
+        binning.apply(worker, config["axes"])
+        worker.set_cache_size(config["cache"])
+        worker.set_runs(vector(config["runs"]))
+        worker.set_lbs(*config["lbs"])
+        worker.initialize()
+    else:
+        worker.set_skim_path(config["skim"])
+        worker.set_bcid_regions(config["bcid"])
+        worker.set_runs(vector(config["runs"]))
+        worker.set_lbs(*config["lbs"])
+        worker.reuse(first, config["output"])
+    timing["open"] += time.time() - start
+
+    # one progress line in the parent instead of one per worker
+    worker.set_progress_print(throughput.queue is None)
+    stop     = threading.Event()
+    reporter = threading.Thread(target=report_progress, args=(stop,))
+    reporter.daemon = True
+    reporter.start()
+
+    execute(config, timing)
+
+    # histograms of every run in the job are kept apart and written per run
+    for input in rest:
+        start = time.time()
+        worker.append(input)
+        timing["open"] += time.time() - start
+        execute(config, timing)
+
+    start = time.time()
+    worker.finalize()
+    timing["write"] += time.time() - start
+
+    stop.set()
+    reporter.join()
+    throughput.send(busy=False, **done)
+
+    return timing
+
+def execute(config, timing):
+
+    global counting
+
+    entries = worker.tree.GetEntries()
+    done["files_opened"] += 1
+    done["entries"]      += min(entries, config["events"]) if config["events"] >= 0 else entries
+
+    counting = True
+    worker.execute(config["events"])
+    counting = False
+
+    done["events"] += worker.progress_events
+    done["bytes"]  += worker.progress_bytes
+    done["hits"]   += worker.progress_hits
+
+    timing["read"] += worker.seconds_read
+    timing["loop"] += worker.seconds_execute - worker.seconds_read
+
+def report_progress(stop):
+    """ Send the counters of this worker every throughput.interval seconds, until stop is set. """
+    while not stop.wait(throughput.interval):
+        counters = dict(done)
+        if counting:
+            counters["events"] += worker.progress_events
+            counters["bytes"]  += worker.progress_bytes
+            counters["hits"]   += worker.progress_hits
+        throughput.send(busy=True, **counters)
+
+def report(timings):
+    """ Seconds per job spent opening files, in GetEntry, in the rest of the event loop and writing. """
+
+    columns = ["open", "read", "loop", "write"]
+    print
+    print " %-24s %6s %9s %9s %9s %9s" % tuple(["job", "files"] + columns)
+    for timing in sorted(timings, key=lambda timing: timing["job"]):
+        print " %-24s %6i %9.1f %9.1f %9.1f %9.1f" % tuple([timing["job"], timing["files"]] + [timing[col] for col in columns])
+    total = dict((col, sum(timing[col] for timing in timings)) for col in columns)
+    print " %-24s %6i %9.1f %9.1f %9.1f %9.1f" % tuple(["total", sum(timing["files"] for timing in timings)] + [total[col] for col in columns])
+    if sum(total.values()) > 0:
+        print " i/o (open + read): %.0f%% of the time of the workers" % (100.0 * (total["open"] + total["read"]) / sum(total.values()))
+    print
+
+def vector(values):
+    vec = ROOT.std.vector("int")()
+    for value in values:
+        vec.push_back(value)
+    return vec
 
 def hadd(output, inputs, delete=False):
 
@@ -1,9 +1,15 @@
 import copy
 import os
+
+import analysis_server
+if __name__ == "__main__":
+    analysis_server.run_remote(__file__)
+
+import numpy
 import ROOT
 import rootlogon
+import hist_arrays
 ROOT.gROOT.SetBatch(True)
-ROOT.gStyle.SetPadRightMargin(0.06)
 
 run      = "00284285"
 template = "%s/hits_raw_vs_r_%sxx%s_%s"
@@ -12,9 +18,6 @@ rebin    = 4
 hits     = "raw"
 outdir   = "phi_symmetry"
 
-if not os.path.isdir(outdir):
-    os.makedirs(outdir)
-
 livetime_csc = 140e-9
 livetime_mdt = 1300e-9
 
@@ -26,11 +29,16 @@ sectors = [["01", "03", "05", "07", "09", "11", "13", "15"],
            ["02", "04", "06", "08", "10", "12", "14", "16"],
            ]
 
-fi         = ROOT.TFile.Open("histograms.root")
-input_area = ROOT.TFile.Open("area.root")
-
 def main():
 
+    ROOT.gStyle.SetPadRightMargin(0.06)
+
+    if not os.path.isdir(outdir):
+        os.makedirs(outdir)
+
+    fi         = analysis_server.open_root("histograms.root")
+    input_area = analysis_server.open_root("area.root")
+
     entries = fi.Get("%s/evts_%s" % (run, run))
     entries = entries.GetBinContent(1)
 
@@ -52,23 +60,20 @@ def main():
             for hist in [hists[name], area]:
                 hist.Rebin(rebin)
 
-            numer = copy.copy(hists[name])
-            denom = copy.copy(area)
+            numer = hists[name]
 
-            for bin in xrange(0, denom.GetNbinsX()+1):
-                radius     = denom.GetBinCenter(bin)
-                thisarea   = denom.GetBinContent(bin)
-                livetime   = livetime_csc       if (radius < boundary and "EI" in region) else livetime_mdt
-                efficiency = efficiency_csc_adc if (radius < boundary and "EI" in region) else efficiency_mdt_adc
-                if hits=="raw":
-                    efficiency = 1.0
-                denom.SetBinContent(bin, entries * thisarea * livetime * efficiency)
+            radius     = hist_arrays.centers(area.GetXaxis())
+            csc        = (radius < boundary) & ("EI" in region)
+            livetime   = numpy.where(csc, livetime_csc,       livetime_mdt)
+            efficiency = numpy.where(csc, efficiency_csc_adc, efficiency_mdt_adc)
+            if hits=="raw":
+                efficiency = 1.0
+            denom = entries * hist_arrays.contents(area) * livetime * efficiency
 
             name = numer.GetName().replace("hits_", "rate_")
             hists[name] = copy.copy(numer)
-            hists[name].Reset()
-            hists[name].Divide(numer, denom)
             hists[name].SetName(name)
+            hist_arrays.divide(hists[name], denom)
 
             style(hists[name], sect)
             hists[name].Draw("psame")
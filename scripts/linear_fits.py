@@ -0,0 +1,231 @@
+"""
+linear_fits.py: straight-line fits of hit rate vs. inst. lumi.
+for every run, region and hit type at once.
+
+The profiles of hits_{raw,adc}_vs_lumi_vs_evts_* are built from the
+2D histogram arrays, normalized to rates like plots.py, and fit with
+closed-form least squares vectorized over all profiles, instead of
+one TF1 fit per profile.
+
+Run outside athena.
+
+> python linear_fits.py --input=histograms.root --output=fits.csv
+
+The fits are also stored in fit_store.py's database (--db),
+keyed by run, region, hits and bunches.
+"""
+
+import argparse
+import csv
+import os
+import sys
+
+import analysis_server
+if __name__ == "__main__":
+    analysis_server.run_remote(__file__)
+
+import numpy
+import ROOT
+ROOT.gROOT.SetBatch(True)
+ROOT.TH1.AddDirectory(False)
+
+import fit_store
+import hist_arrays
+
+template = "hits_%s_vs_lumi_vs_evts_%s_%s"
+columns  = ["name", "run", "bunches", "region", "hits",
+            "slope", "slope_err", "offset", "offset_err", "chi2", "ndf"]
+
+def options():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--input",    help="Input histograms.root", default="histograms.root")
+    parser.add_argument("--output",   help="Output table of fit results", default="fits.csv")
+    parser.add_argument("--db",       help="Database of fit results to update", default=fit_store.default_db)
+    parser.add_argument("--hits",     help="Comma-separated types of hits to fit", default="raw,adc")
+    parser.add_argument("--weighted", help="Weight bins by their errors, instead of 1 like the RWQN fits", action="store_true")
+    return parser.parse_args()
+
+def main():
+
+    import plots
+
+    ops = options()
+    input = analysis_server.open_root(ops.input)
+    if not input:
+        fatal("Cannot open %s" % (ops.input))
+
+    keys   = []
+    hists  = []
+    scales = []
+    xlos   = []
+
+    for hits in ops.hits.split(","):
+        for region in plots.regions_vs_lumi:
+            for run in plots.default_runs():
+
+                name = template % (hits, region, run)
+                hist = input.Get(os.path.join(run, name))
+                if not hist:
+                    fatal("Cannot retrieve %s" % (os.path.join(run, name)))
+
+                keys.append({"name": name+"_pfx", "run": run, "bunches": plots.bunches(run), "region": region, "hits": hits})
+                hists.append(hist)
+                scales.append(plots.rate_scale(region, hits))
+                xlos.append(plots.fit_xlo(run))
+
+    results = fit_vs_lumi(hists, scales, (0.5, 5.4), xlos, weighted=ops.weighted)
+
+    fits = [dict(key, **row) for key, row in zip(keys, rows(results))]
+    write(ops.output, fits)
+    fit_store.write_fits(fits, ops.db)
+    print " wrote %i fits to %s and %s" % (len(fits), ops.output, ops.db)
+
+def fit_vs_lumi(hists, scales, rangex, xlos=None, weighted=False, kill=True):
+    """ Fit the x-profile of every 2D hist at once.
+        Profiles are scaled by scales, and fit over the bins in rangex above xlos. """
+
+    profiles = [profile_x(hist) for hist in hists]
+    if len(set(len(prof[0]) for prof in profiles)) > 1:
+        fatal("Cannot fit profiles with different x-axis binning together")
+
+    scales = numpy.array(scales, dtype=numpy.float64)[:, numpy.newaxis]
+    x      = numpy.array([prof[0] for prof in profiles])
+    y      = numpy.array([prof[1] for prof in profiles]) * scales
+    error  = numpy.array([prof[2] for prof in profiles]) * scales
+
+    # only the bins in rangex, like SetRangeUser before ProfileX,
+    # so kill_weird_bins sees the bins outside of it as empty
+    axis   = hists[0].GetXaxis()
+    bins   = numpy.arange(x.shape[1])
+    inside = (bins >= axis.FindFixBin(rangex[0])) & (bins <= axis.FindFixBin(rangex[1]))
+    y[:, ~inside]     = 0
+    error[:, ~inside] = 0
+
+    if kill:
+        kill_weird_bins(y, error)
+
+    mask = inside & (y != 0)
+    if xlos is not None:
+        mask = mask & (x >= numpy.array(xlos, dtype=numpy.float64)[:, numpy.newaxis])
+
+    return linear_fit(x, y, error, mask, weighted)
+
+def profile_x(hist):
+    """ Bin centers, means and errors of hist.ProfileX(name, 1, -1, ""),
+        computed from the 2D bin arrays. The y-overflow is included,
+        and the errors are errors on the mean, like TProfile. """
+
+    contents = hist_arrays.contents(hist).astype(numpy.float64)[1:]
+    errors2  = hist_arrays.errors2(hist)[1:]
+    y        = hist_arrays.centers(hist.GetYaxis())[1:, numpy.newaxis]
+
+    sumw   = contents.sum(axis=0)
+    sumwy  = (contents * y).sum(axis=0)
+    sumwy2 = (contents * y * y).sum(axis=0)
+    sumw2  = errors2.sum(axis=0)
+
+    filled = (sumw != 0) & (sumw2 > 0)
+    sumw   = numpy.where(filled, sumw,  1.0)
+    sumw2  = numpy.where(filled, sumw2, 1.0)
+
+    mean   = sumwy / sumw
+    spread = numpy.sqrt(numpy.abs(sumwy2 / sumw - mean**2))
+    neff   = sumw**2 / sumw2
+
+    mean  = numpy.where(filled, mean, 0.0)
+    error = numpy.where(filled, spread / numpy.sqrt(neff), 0.0)
+
+    return hist_arrays.centers(hist.GetXaxis()), mean, error
+
+def kill_weird_bins(y, error):
+    """ plots.kill_weird_bins for a stack of profiles [profile, bin].
+        Bins are visited in order, so bins killed earlier count as empty. """
+    nbins = y.shape[1] - 2
+    for bin in xrange(1, nbins):
+        prev1 = y[:, bin-1]
+        prev2 = y[:, bin-2] if bin >= 2 else numpy.zeros(len(y))
+        next1 = y[:, bin+1]
+        next2 = y[:, bin+2]
+        kill  = ((prev1 == 0) & (next1 == 0)) | ((prev2 == 0) & (next1 == 0)) | ((prev1 == 0) & (next2 == 0))
+        y[kill, bin]     = 0
+        error[kill, bin] = 0
+
+def linear_fit(x, y, error, mask, weighted=False):
+    """ Least-squares fit of y = slope*x + offset for every row at once.
+
+        weighted: weight bins by 1/error^2.
+        otherwise every bin in the mask gets weight 1, like the "W" fit option,
+        but unlike it the parameter errors are scaled by ssr/ndf of the residuals.
+
+        chi2 is always computed with the bin errors. """
+
+    has_error = error > 0
+    if weighted:
+        mask = mask & has_error
+        w = numpy.where(mask, 1.0 / numpy.where(has_error, error, 1.0)**2, 0.0)
+    else:
+        w = numpy.where(mask, 1.0, 0.0)
+
+    s   = w.sum(axis=1)
+    sx  = (w * x).sum(axis=1)
+    sy  = (w * y).sum(axis=1)
+    sxx = (w * x * x).sum(axis=1)
+    sxy = (w * x * y).sum(axis=1)
+
+    det  = s*sxx - sx**2
+    good = det > 0
+    det  = numpy.where(good, det, 1.0)
+
+    slope  = (s*sxy - sx*sy) / det
+    offset = (sxx*sy - sx*sxy) / det
+    var_slope  = s   / det
+    var_offset = sxx / det
+
+    ndf   = mask.sum(axis=1) - 2
+    resid = y - slope[:, numpy.newaxis]*x - offset[:, numpy.newaxis]
+    pull  = numpy.where(has_error, resid / numpy.where(has_error, error, 1.0), 0.0)
+    chi2  = numpy.where(mask, pull**2, 0.0).sum(axis=1)
+
+    if not weighted:
+        ssr = (w * resid**2).sum(axis=1)
+        var_slope  = var_slope  * ssr / numpy.maximum(ndf, 1)
+        var_offset = var_offset * ssr / numpy.maximum(ndf, 1)
+
+    nan = float("nan")
+    results = {}
+    results["slope"]      = numpy.where(good, slope,  nan)
+    results["offset"]     = numpy.where(good, offset, nan)
+    results["slope_err"]  = numpy.where(good, numpy.sqrt(var_slope),  nan)
+    results["offset_err"] = numpy.where(good, numpy.sqrt(var_offset), nan)
+    results["chi2"]       = numpy.where(good, chi2, nan)
+    results["ndf"]        = ndf
+    return results
+
+def rows(results):
+    """ Split the arrays of fit results into one dict per fit. """
+    keys = sorted(results)
+    return [dict(zip(keys, values)) for values in zip(*[results[key].tolist() for key in keys])]
+
+def write(output, rows):
+    with open(output, "w") as fi:
+        writer = csv.DictWriter(fi, fieldnames=columns)
+        writer.writeheader()
+        for row in rows:
+            writer.writerow(row)
+
+def read(path):
+    """ Read a table written by write(), with numbers converted back. """
+    results = []
+    for row in csv.DictReader(open(path)):
+        for key in ["slope", "slope_err", "offset", "offset_err", "chi2"]:
+            row[key] = float(row[key])
+        for key in ["bunches", "ndf"]:
+            row[key] = int(row[key])
+        results.append(row)
+    return results
+
+def fatal(message):
+    sys.exit("Error in %s: %s" % (__file__, message))
+
+if __name__ == "__main__":
+    main()
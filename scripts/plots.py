@@ -9,6 +9,9 @@ Run outside athena.
 import argparse
 import copy
 import glob
+import hashlib
+import inspect
+import json
 import multiprocessing as mp
 import os
 import sys
@@ -16,11 +19,21 @@ import time
 import warnings
 warnings.filterwarnings(action="ignore", category=RuntimeWarning)
 
+import analysis_server
+if __name__ == "__main__":
+    analysis_server.run_remote(__file__)
+
+import numpy
 import ROOT
 import rootlogon
+import bcid
+import fit_store
+import hist_arrays
+import linear_fits
+import run_metadata
 ROOT.gROOT.SetBatch(True)
-ROOT.gStyle.SetPadBottomMargin(0.12)
 ROOT.gErrorIgnoreLevel = ROOT.kWarning
+ROOT.TH1.AddDirectory(False)
 
 livetime_csc = 140e-9
 livetime_mdt = 1300e-9
@@ -28,19 +41,48 @@ livetime_mdt = 1300e-9
 efficiency_csc_adc = 0.789
 efficiency_mdt_adc = 1.0
 
+regions_vs_lumi = ["mdt_full",
+                   "mdt_EIL1",
+                   "mdt_EIS1",
+                   "mdt_EML1",
+                   "mdt_EMS1",
+                   "mdt_BIS8",
+                   "csc_CSL1",
+                   "csc_CSS1",
+                   ]
+
 def options():
     parser = argparse.ArgumentParser()
     parser.add_argument("--output",  help="Output directory for plots.")
     parser.add_argument("--hits",    help="Type of hits to use: raw or adc")
+    parser.add_argument("--cpu",     help="Number of cpu for drawing.")
+    parser.add_argument("--force",   help="Redraw plots which are unchanged since the last run.", action="store_true")
     return parser.parse_args()
 
 def main():
 
+    style()
     ops = options()
     if not ops.output                : ops.output = "output"
     if not os.path.isdir(ops.output) : os.makedirs(ops.output)
     if not ops.hits in ["raw", "adc"]: fatal("Please give --hits as raw or adc")
 
+    runs = default_runs()
+    
+    jobs = []
+    for perbc in [False]:
+        jobs += plots_vs_lumi(runs, perbc, rate=True, extrapolate=False)
+        jobs += plots_vs_r(runs, layer="EI")
+        jobs += plots_vs_r(runs, layer="EM")
+        jobs += plots_vs_region(runs, rate=True, logz=True)
+#     jobs += plots_vs_bcid(runs)
+#     jobs += plots_vs_train(runs)
+#     jobs += plots_vs_lumi_vs_r(runs)
+
+    render(jobs)
+
+def default_runs():
+
     runs = [
         "00278880",
         "00279169",
@@ -76,15 +118,125 @@ def main():
 #             "00281143", "00284285", 
 #             ]
 
-    runs = sorted(runs)
-    
-    for perbc in [False]:
-        plots_vs_lumi(runs, perbc, rate=True, extrapolate=False)
-        plots_vs_r(runs, layer="EI")
-        plots_vs_r(runs, layer="EM")
-        plots_vs_region(runs, rate=True, logz=True)
-#     plots_vs_bcid(runs)
-#     plots_vs_lumi_vs_r(runs)
+    return sorted(runs)
+
+def render(jobs):
+    """ Draw and save every plot job, farmed over --cpu processes. 
+        The histograms in each job are already normalized and styled, 
+        so the workers only need to draw them onto a canvas. 
+        Each job starts from style(), and jobs whose fingerprint matches
+        the cache next to the output are skipped. """
+
+    ops = options()
+    cpu = int(ops.cpu) if ops.cpu else 1
+
+    common = style_and_code()
+    caches = {}
+    todo   = []
+    for job in jobs:
+        if not job["output"] in caches:
+            caches[job["output"]] = read_cache(job["output"])
+        job["fingerprint"] = fingerprint(job, common)
+        pdf = os.path.join(job["output"], job["name"]+".pdf")
+        if ops.force or caches[job["output"]].get(job["name"]) != job["fingerprint"] or not os.path.isfile(pdf):
+            todo.append(job)
+
+    start_time = time.time()
+    npool = min(len(todo), cpu, mp.cpu_count()-1)
+    if npool > 1:
+        pool = mp.Pool(npool, initializer=batch_mode)
+        names = pool.map(render_job, todo)
+        pool.close()
+        pool.join()
+    else:
+        names = map(render_job, todo)
+
+    for job in todo:
+        caches[job["output"]][job["name"]] = job["fingerprint"]
+    for output in caches:
+        write_cache(output, caches[output])
+
+    print " rendered %i plots in %.1f s, %i unchanged" % (len(names), time.time() - start_time, len(jobs) - len(todo))
+
+def render_job(job):
+    # the draw functions change gStyle, so every job starts from the same style,
+    # whichever jobs ran before it in this process
+    style()
+    job["draw"](job)
+    return job["name"]
+
+def batch_mode():
+    ROOT.gROOT.SetBatch(True)
+    ROOT.gErrorIgnoreLevel = ROOT.kWarning
+
+def fingerprint(job, common=""):
+    """ Checksum of everything a plot job draws: the bin contents and style
+        of its histograms, its other options, the code which draws it, and
+        common to every job, e.g. style_and_code(). """
+    sha = hashlib.sha1()
+    sha.update(common)
+    sha.update(inspect.getsource(job["draw"]))
+    for key in sorted(job):
+        if key in ["draw", "fingerprint"]:
+            continue
+        values = job[key] if isinstance(job[key], list) else [job[key]]
+        for value in values:
+            if isinstance(value, ROOT.TH1):
+                sha.update(hist_arrays.checksum(value))
+                sha.update(repr(style_tuple(value)))
+            else:
+                sha.update(repr((key, value)))
+    return sha.hexdigest()
+
+def style_and_code():
+    """ Checksum of what every plot job starts from: gStyle, with its palette,
+        and the source of plots.py, with the helpers the draw functions call,
+        and of rootlogon.py. """
+    sha = hashlib.sha1()
+    for module in [sys.modules[__name__], rootlogon]:
+        sha.update(inspect.getsource(module))
+    sha.update(repr(gstyle_tuple()))
+    return sha.hexdigest()
+
+def gstyle_tuple():
+    style  = ROOT.gStyle
+    values = (style.GetOptStat(), style.GetOptTitle(), style.GetOptFit(),
+              style.GetPadTopMargin(), style.GetPadBottomMargin(), style.GetPadLeftMargin(), style.GetPadRightMargin(),
+              style.GetPadTickX(), style.GetPadTickY(), style.GetPadGridX(), style.GetPadGridY(),
+              style.GetPaintTextFormat(), style.GetTextFont(), style.GetTextSize(),
+              style.GetNumberContours(), style.GetCanvasDefW(), style.GetCanvasDefH(),
+              style.GetLegendFont(), style.GetLegendBorderSize(), style.GetLegendFillColor(),
+              )
+    for axis in ["x", "y", "z"]:
+        values += (style.GetLabelFont(axis), style.GetLabelSize(axis), style.GetLabelOffset(axis),
+                   style.GetTitleFont(axis), style.GetTitleSize(axis), style.GetTitleOffset(axis),
+                   style.GetNdivisions(axis), style.GetTickLength(axis),
+                   )
+    values += tuple(style.GetColorPalette(icolor) for icolor in xrange(style.GetNumberOfColors()))
+    return values
+
+def style_tuple(hist):
+    style = (hist.GetName(), hist.GetTitle(),
+             hist.GetMinimumStored(), hist.GetMaximumStored(),
+             hist.GetLineColor(), hist.GetLineWidth(), hist.GetLineStyle(),
+             hist.GetMarkerColor(), hist.GetMarkerStyle(), hist.GetMarkerSize(),
+             hist.GetFillColor(), hist.GetFillStyle(),
+             )
+    for axis in [hist.GetXaxis(), hist.GetYaxis(), hist.GetZaxis()]:
+        style += (axis.GetTitle(), axis.GetFirst(), axis.GetLast(), axis.GetNdivisions(),
+                  axis.GetTitleSize(), axis.GetTitleOffset(), axis.GetLabelSize(), axis.GetTickLength(),
+                  )
+    return style
+
+def read_cache(output):
+    path = os.path.join(output, ".plots_cache.json")
+    if not os.path.isfile(path):
+        return {}
+    return json.load(open(path))
+
+def write_cache(output, cache):
+    path = os.path.join(output, ".plots_cache.json")
+    json.dump(cache, open(path, "w"), indent=1, sort_keys=True)
 
 def plots_vs_lumi(runs, perbc, rate, extrapolate):
 
@@ -95,17 +247,15 @@ def plots_vs_lumi(runs, perbc, rate, extrapolate):
         os.makedirs(ops.output)
 
     verbose = False
-    colz()
 
     fits              = True
     draw_slope        = False
     suppress_bullshit = True
     ndiv              = 505
 
-    input = ROOT.TFile.Open("histograms.root")
+    input = analysis_server.open_root("histograms.root")
     hists  = {}
-    graphs = {}
-    funcs  = {}
+    jobs   = []
     template = "hits_%s_vs_lumi_vs_evts_%s_%s"
     if perbc:
         template = template.replace("lumi", "mu")
@@ -116,92 +266,50 @@ def plots_vs_lumi(runs, perbc, rate, extrapolate):
     else:
         rangex = (8, 19)
 
-    for region in ["mdt_full",
-                   "mdt_EIL1",
-                   "mdt_EIS1",
-                   "mdt_EML1",
-                   "mdt_EMS1",
-                   "mdt_BIS8",
-                   "csc_CSL1",
-                   "csc_CSS1",
-                   ]:
-
-        # for 2D plots
-        ROOT.gStyle.SetPadRightMargin(0.18)
-        ROOT.gStyle.SetPadBottomMargin(0.12)
-
+    # the 2D canvases per run are not saved, so only the profiles are needed
+    for region in regions_vs_lumi:
         for run in runs:
 
             name = template % (ops.hits, region, run)
 
-            canvas = ROOT.TCanvas(name, name, 800, 800)
-            canvas.Draw()
-
             hists[name] = input.Get(os.path.join(run, name))
             if not hists[name]:
                 fatal("Cannot retrieve %s" % (os.path.join(run, name)))
-            yaxis = hists[name].GetYaxis()
-            hists[name].GetXaxis().SetTitle(xtitle(name))
-            hists[name].GetYaxis().SetTitle(ytitle(name))
-            # hists[name].Rebin2D(2, 2)
             hists[name].GetXaxis().SetRangeUser(*rangex)
-            hists[name].GetXaxis().SetNdivisions(ndiv)
-            hists[name].Draw("same,colz")
 
             pfx = name+"_pfx"
             hists[pfx] = hists[name].ProfileX(pfx, 1, -1, "")
             if suppress_bullshit:
                 kill_weird_bins(hists[pfx])
             if rate:
-                livetime = livetime_csc if "csc" in region else livetime_mdt
-                areas = chamber_area()
-                area = -1
-                if region == "mdt_full": area = sum([areas[cham] for cham in filter(lambda key: not "CS" in key, areas)])
-                if region == "mdt_EIL1": area = sum([areas[cham] for cham in filter(lambda key:   "EIL1" in key, areas)])
-                if region == "mdt_EIL2": area = sum([areas[cham] for cham in filter(lambda key:   "EIL2" in key, areas)])
-                if region == "mdt_EIS1": area = sum([areas[cham] for cham in filter(lambda key:   "EIS1" in key, areas)])
-                if region == "mdt_EIS2": area = sum([areas[cham] for cham in filter(lambda key:   "EIS2" in key, areas)])
-                if region == "mdt_EML1": area = sum([areas[cham] for cham in filter(lambda key:   "EML1" in key, areas)])
-                if region == "mdt_EML2": area = sum([areas[cham] for cham in filter(lambda key:   "EML2" in key, areas)])
-                if region == "mdt_EMS1": area = sum([areas[cham] for cham in filter(lambda key:   "EMS1" in key, areas)])
-                if region == "mdt_EMS2": area = sum([areas[cham] for cham in filter(lambda key:   "EMS2" in key, areas)])
-                if region == "mdt_BIS7": area = sum([areas[cham] for cham in filter(lambda key:   "BIS7" in key, areas)])
-                if region == "mdt_BIS8": area = sum([areas[cham] for cham in filter(lambda key:   "BIS8" in key, areas)])
-                if region == "csc_CSL1": area = sum([areas[cham] for cham in filter(lambda key:   "CSL1" in key, areas)])
-                if region == "csc_CSS1": area = sum([areas[cham] for cham in filter(lambda key:   "CSS1" in key, areas)])
-                hists[pfx].Scale(1.0 / (livetime * area))
-
-                if ops.hits=="adc":
-                    efficiency = efficiency_csc_adc if "csc" in region else efficiency_mdt_adc
-                    hists[pfx].Scale(1 / efficiency)
-                
-            hists[pfx].SetLineColor(ROOT.kBlack)
+                hists[pfx].Scale(rate_scale(region, ops.hits))
             hists[pfx].SetLineWidth(3)
-            hists[pfx].GetXaxis().SetRangeUser(*rangex)
-            hists[pfx].GetXaxis().SetNdivisions(ndiv)
-            graphs[pfx] = ROOT.TGraph(hists[pfx])
-            
-            hists[pfx].Draw("pe,same")
 
-            draw_logos(0.36, 0.86, run)
-            ROOT.gPad.RedrawAxis()
-            # canvas.SaveAs(os.path.join(ops.output, canvas.GetName()+".pdf"))
+    # fit every profile at once
+    if fits:
+        keys    = [(region, run) for region in regions_vs_lumi for run in runs]
+        fitted  = [hists[template % (ops.hits, region, run)] for (region, run) in keys]
+        scales  = [rate_scale(region, ops.hits) if rate else 1.0 for (region, run) in keys]
+        xlos    = [fit_xlo(run, perbc) for (region, run) in keys]
+        results = linear_fits.fit_vs_lumi(fitted, scales, rangex, xlos, weighted=False, kill=suppress_bullshit)
+        results = dict(zip(keys, linear_fits.rows(results)))
 
-        # for 1D plots
-        ROOT.gStyle.SetPadRightMargin(0.06)
-        ROOT.gStyle.SetPadBottomMargin(0.12)
+    for region in regions_vs_lumi:
 
         name = template % (ops.hits, region, "overlay")
-        canvas = ROOT.TCanvas(name, name, 800, 800)
-        canvas.Draw()
-
-        multi = ROOT.TMultiGraph()
-
-        xleg, yleg = 0.180, 0.86
-        ydelta = (0.035*len(runs)) if draw_slope else (0.02*len(runs))
-        legend = ROOT.TLegend(xleg, yleg-ydelta, xleg+0.6, yleg)
-        if not draw_slope:
-            legend.SetNColumns(2)
+        if rate:
+            name = name.replace("hits_", "rate_")
+
+        job = {}
+        job["draw"]       = draw_vs_lumi
+        job["name"]       = name
+        job["output"]     = ops.output
+        job["runs"]       = runs
+        job["hists"]      = []
+        job["fits"]       = []
+        job["captions"]   = []
+        job["draw_slope"] = draw_slope
+        job["extrap"]     = slope_offset(region, ops.hits) if (rate and extrapolate) else None
 
         for run in runs:
             name = (template % (ops.hits, region, run)) + "_pfx"
@@ -223,69 +331,93 @@ def plots_vs_lumi(runs, perbc, rate, extrapolate):
             hists[name].GetXaxis().SetLabelSize(0.05)
             hists[name].GetYaxis().SetLabelSize(0.05)
 
-            hists[name].Draw("pe,same")
-
+            fit = None
             if fits:
-                x1 = hists[name].GetBinCenter(hists[name].FindFirstBinAbove()-1)
-                x2 = hists[name].GetBinCenter(hists[name].FindLastBinAbove()+1)
-                y1 = hists[name].GetBinContent(hists[name].FindFirstBinAbove())
-                y2 = hists[name].GetBinContent(hists[name].FindLastBinAbove())
-                if run == "00278880" and not perbc:
-                    x1 = 0.8
-                funcs[name] = ROOT.TF1("fit"+name,"[0]*(x) + [1]", 0.9*x1, 1.1*x2)
-
-                m = (y2-y1)/(x2-x1)
-                funcs[name].SetParameter(0, m)
-                funcs[name].SetParameter(1, y1 - m*x1)
-
-                funcs[name].SetLineColor(color(run))
-                funcs[name].SetLineWidth(1)
-                funcs[name].SetLineStyle(1)
-                hists[name].Fit(funcs[name], "RWQN")
+                result = results[(region, run)]
+                slope  = result["slope"]
+                offset = result["offset"]
                 if verbose:
                     print " [ fit ] %s: %7.2f (%5.2f), %7.2f (%5.2f) %7.2f" % (
                         run,
-                        funcs[name].GetParameter(0), funcs[name].GetParError(0),
-                        funcs[name].GetParameter(1), funcs[name].GetParError(1),
-                        funcs[name].GetChisquare(),
+                        slope,  result["slope_err"],
+                        offset, result["offset_err"],
+                        result["chi2"],
                         )
                 else:
-                    print "%20s %10s %5s %10.5f %10.5f" % (name, run, bunches(run), funcs[name].GetParameter(0), funcs[name].GetParameter(1))
-                slope  = funcs[name].GetParameter(0)
-                offset = funcs[name].GetParameter(1)
-                chi2   = funcs[name].GetChisquare()
-                funcs[name].Draw("same")
+                    print "%20s %10s %5s %10.5f %10.5f" % (name, run, bunches(run), slope, offset)
+
+                x1 = hists[name].GetBinCenter(hists[name].FindFirstBinAbove()-1)
+                x2 = hists[name].GetBinCenter(hists[name].FindLastBinAbove()+1)
+                if run == "00278880" and not perbc:
+                    x1 = 0.8
+                fit = (0.9*x1, 1.1*x2, slope, offset)
 
             capt = caption(run) if (not draw_slope or not fits) else "%s (%.2f, %.2f)" % (caption(run), slope, offset)
-                
-            entry = legend.AddEntry(hists[name], capt, "")
-            entry.SetTextColor(color(run))
 
-        draw_logos(0.36, 0.89, fit=draw_slope)
+            job["hists"].append(hists[name])
+            job["fits"].append(fit)
+            job["captions"].append(capt)
 
-        legend.SetBorderSize(0)
-        legend.SetFillColor(0)
-        legend.SetMargin(0.3)
-        legend.SetTextSize(0.03)
-        legend.Draw()
+        jobs.append(job)
 
-        if rate:
-            canvas.SetName(canvas.GetName().replace("hits_", "rate_"))
-        if rate and extrapolate:
-            name = region+"extrap"
-            funcs[name] = ROOT.TF1("fit"+name,"[0]*(x) + [1]", 3, 6)
-            slope, offset = slope_offset(region)
-            funcs[name].SetParameter(0, slope)
-            funcs[name].SetParameter(1, offset)
-            funcs[name].SetLineColor(ROOT.kBlack)
-            funcs[name].SetLineWidth(1)
-            funcs[name].SetLineStyle(7)
-            funcs[name].Draw("same")
-
-        ROOT.gPad.RedrawAxis()
-        ROOT.gPad.Modified()
-        ROOT.gPad.Update()
-        canvas.SaveAs(os.path.join(ops.output, canvas.GetName()+".pdf"))
+    return jobs
+
+def draw_vs_lumi(job):
+
+    # for 1D plots
+    ROOT.gStyle.SetPadRightMargin(0.06)
+    ROOT.gStyle.SetPadBottomMargin(0.12)
+
+    name = job["name"]
+    canvas = ROOT.TCanvas(name, name, 800, 800)
+    canvas.Draw()
+
+    xleg, yleg = 0.180, 0.86
+    ydelta = (0.035*len(job["runs"])) if job["draw_slope"] else (0.02*len(job["runs"]))
+    legend = ROOT.TLegend(xleg, yleg-ydelta, xleg+0.6, yleg)
+    if not job["draw_slope"]:
+        legend.SetNColumns(2)
+
+    funcs = []
+    for run, hist, fit, capt in zip(job["runs"], job["hists"], job["fits"], job["captions"]):
+
+        hist.Draw("pe,same")
+
+        if fit:
+            xlo, xhi, slope, offset = fit
+            funcs.append(ROOT.TF1("fit"+hist.GetName(), "[0]*(x) + [1]", xlo, xhi))
+            funcs[-1].SetParameter(0, slope)
+            funcs[-1].SetParameter(1, offset)
+            funcs[-1].SetLineColor(color(run))
+            funcs[-1].SetLineWidth(1)
+            funcs[-1].SetLineStyle(1)
+            funcs[-1].Draw("same")
+
+        entry = legend.AddEntry(hist, capt, "")
+        entry.SetTextColor(color(run))
+
+    draw_logos(0.36, 0.89, fit=job["draw_slope"])
+
+    legend.SetBorderSize(0)
+    legend.SetFillColor(0)
+    legend.SetMargin(0.3)
+    legend.SetTextSize(0.03)
+    legend.Draw()
+
+    if job["extrap"]:
+        funcs.append(ROOT.TF1("fit"+name+"extrap","[0]*(x) + [1]", 3, 6))
+        slope, offset = job["extrap"]
+        funcs[-1].SetParameter(0, slope)
+        funcs[-1].SetParameter(1, offset)
+        funcs[-1].SetLineColor(ROOT.kBlack)
+        funcs[-1].SetLineWidth(1)
+        funcs[-1].SetLineStyle(7)
+        funcs[-1].Draw("same")
+
+    ROOT.gPad.RedrawAxis()
+    ROOT.gPad.Modified()
+    ROOT.gPad.Update()
+    canvas.SaveAs(os.path.join(job["output"], canvas.GetName()+".pdf"))
 
 
 def plots_vs_r(runs, layer):
@@ -298,24 +430,22 @@ def plots_vs_r(runs, layer):
     if not layer in ["EI", "EM"]:
         fatal("Need layer to be EI or EM")
     
-    ROOT.gStyle.SetPadRightMargin(0.06)
-
-    input = ROOT.TFile.Open("histograms.root")
+    input = analysis_server.open_root("histograms.root")
     hists  = {}
-    funcs  = {}
+    jobs   = []
     rebin  = 4
 
     boundary = 2050 # mm
 
     # area vs r
-    input_area = ROOT.TFile.Open("area.root")
+    input_area = analysis_server.open_root("area.root")
     area_L = input_area.Get("area_vs_r_%sL" % layer)
     area_S = input_area.Get("area_vs_r_%sS" % layer)
 
     for hist in [area_L, area_S]:
         hist.Rebin(rebin)
         style_vs_r(hist, layer)
-        draw_vs_r(hist, ops.output)
+        jobs.append({"draw": draw_vs_r, "name": hist.GetName(), "output": ops.output, "hist": hist})
 
     sectors = [layer+"L",
                layer+"S", 
@@ -335,37 +465,29 @@ def plots_vs_r(runs, layer):
                 fatal("Could not retrieve %s" % (os.path.join(run, name)))
             hists[name].Rebin(rebin)
             style_vs_r(hists[name], layer)
-            for bin in xrange(0, hists[name].GetNbinsX()+1):
-                hists[name].SetBinError(bin, 0)
-            # draw_vs_r(hists[name], ops.output)
+            hist_arrays.errors2(hists[name])[...] = 0
             
-            numer = copy.copy(hists[name])
-            denom = copy.copy(area_L if "L" in sector else area_S)
-
-            for bin in xrange(0, denom.GetNbinsX()+1):
-                radius     = denom.GetBinCenter(bin)
-                area       = denom.GetBinContent(bin)
-                livetime   = livetime_csc       if (radius < boundary and layer=="EI") else livetime_mdt
-                efficiency = efficiency_csc_adc if (radius < boundary and layer=="EI") else efficiency_mdt_adc
-                if ops.hits=="raw":
-                    efficiency = 1.0
-                denom.SetBinContent(bin, entries * area * livetime * efficiency)
+            numer = hists[name]
+            area  = area_L if "L" in sector else area_S
+
+            radius     = hist_arrays.centers(area.GetXaxis())
+            csc        = (radius < boundary) & (layer=="EI")
+            livetime   = numpy.where(csc, livetime_csc,       livetime_mdt)
+            efficiency = numpy.where(csc, efficiency_csc_adc, efficiency_mdt_adc)
+            if ops.hits=="raw":
+                efficiency = 1.0
+            denom = entries * hist_arrays.contents(area) * livetime * efficiency
 
             name = numer.GetName().replace("hits_", "rate_")
             hists[name] = copy.copy(numer)
-            hists[name].Reset()
-            hists[name].Divide(numer, denom)
             hists[name].SetName(name)
+            hist_arrays.divide(hists[name], denom)
 
             style_vs_r(hists[name], layer)
             hists[name].GetYaxis().SetTitle(hists[name].GetYaxis().GetTitle().replace("hits", "hit rate [ cm^{-2} s^{-1} ]"))
             hists[name].SetMaximum(950 if layer=="EI" else 45)
 
             name = "rate_%s_vs_r_%s_%s" % (ops.hits, sector, run)
-            canvas = ROOT.TCanvas(name, name, 800, 800)
-            canvas.Draw()
-        
-            hists[name].Draw("psame")
             
             if layer=="EI":
                 exponential_csc = ROOT.TF1("fit_csc_"+name, "expo(0)",  950, 2000)
@@ -379,22 +501,7 @@ def plots_vs_r(runs, layer):
                 expos = [exponential_em1, exponential_em2]
 
             for expo in expos:
-                expo.SetFillStyle(1001)
-                expo.SetFillColor(18)
-                expo.SetLineColor(ROOT.kBlack)
-                expo.SetLineWidth(2)
-                expo.SetLineStyle(1)
                 hists[name].Fit(expo, "RWQN")
-                expo.Draw("FCsame")
-
-                line_lo = ROOT.TLine(expo.GetMaximumX(), 0, expo.GetMaximumX(), expo.GetMaximum())
-                line_hi = ROOT.TLine(expo.GetMinimumX(), 0, expo.GetMinimumX(), expo.GetMinimum())
-                for line in [line_lo, line_hi]:
-                    ROOT.SetOwnership(line, False)
-                    line.SetLineColor(ROOT.kBlack)
-                    line.SetLineWidth(2)
-                    line.SetLineStyle(1)
-                    line.Draw()
 
             for expo in expos:
                 # exp([0] + [1]*x)
@@ -402,35 +509,83 @@ def plots_vs_r(runs, layer):
                 print "%s: exp(%.3f + %.3f*x)" % (expo.GetName(), expo.GetParameter(0), expo.GetParameter(1)*1000)
             print
 
-            hists[name].Draw("psame")
+            job = {}
+            job["draw"]     = draw_rate_vs_r
+            job["name"]     = name
+            job["output"]   = ops.output
+            job["hist"]     = hists[name]
+            job["run"]      = run
+            job["layer"]    = layer
+            job["sector"]   = sector
+            job["boundary"] = boundary
+            job["expos"]    = [(expo.GetName(), expo.GetXmin(), expo.GetXmax(), expo.GetParameter(0), expo.GetParameter(1)) for expo in expos]
+            jobs.append(job)
 
-            xleg, yleg = 0.60, 0.66
-            ydelta = 0.1
-            legend = ROOT.TLegend(xleg, yleg-ydelta, xleg+0.2, yleg)
-            legend.AddEntry(hists[name], "%s sectors" % (sector), "p")
-            legend.AddEntry(expo,        "expo. fits",            "f")
-            legend.SetBorderSize(0)
-            legend.SetFillColor(0)
-            legend.SetMargin(0.3)
-            legend.SetTextSize(0.045)
-            legend.Draw()
-            draw_logos(xcoord=0.55, ycoord=0.85, run=run, fit=False)
+    return jobs
 
-            if layer=="EI":
-                boundary_line = ROOT.TLine(boundary, 300, boundary, 500)
-                boundary_line.Draw()
-                arrow_csc = ROOT.TArrow(boundary, 400, boundary-350, 400, 0.01, "|>")
-                arrow_mdt = ROOT.TArrow(boundary, 350, boundary+350, 350, 0.01, "|>")
-                for arrow in [arrow_csc, arrow_mdt]:
-                    arrow.Draw()
-                blurb_csc = ROOT.TLatex(boundary-280, 405, "CSC")
-                blurb_mdt = ROOT.TLatex(boundary+050, 355, "MDT")
-                for blurb in [blurb_csc, blurb_mdt]:
-                    blurb.SetTextSize(0.025)
-                    blurb.Draw()
-
-            ROOT.gPad.RedrawAxis()
-            canvas.SaveAs(os.path.join(ops.output, canvas.GetName()+".pdf"))
+def draw_rate_vs_r(job):
+
+    ROOT.gStyle.SetPadRightMargin(0.06)
+
+    name     = job["name"]
+    boundary = job["boundary"]
+
+    canvas = ROOT.TCanvas(name, name, 800, 800)
+    canvas.Draw()
+
+    job["hist"].Draw("psame")
+
+    expos = []
+    for expo_name, xlo, xhi, constant, slope in job["expos"]:
+        expo = ROOT.TF1(expo_name, "expo(0)", xlo, xhi)
+        expo.SetParameter(0, constant)
+        expo.SetParameter(1, slope)
+        expo.SetFillStyle(1001)
+        expo.SetFillColor(18)
+        expo.SetLineColor(ROOT.kBlack)
+        expo.SetLineWidth(2)
+        expo.SetLineStyle(1)
+        expo.Draw("FCsame")
+        expos.append(expo)
+
+        line_lo = ROOT.TLine(expo.GetMaximumX(), 0, expo.GetMaximumX(), expo.GetMaximum())
+        line_hi = ROOT.TLine(expo.GetMinimumX(), 0, expo.GetMinimumX(), expo.GetMinimum())
+        for line in [line_lo, line_hi]:
+            ROOT.SetOwnership(line, False)
+            line.SetLineColor(ROOT.kBlack)
+            line.SetLineWidth(2)
+            line.SetLineStyle(1)
+            line.Draw()
+
+    job["hist"].Draw("psame")
+
+    xleg, yleg = 0.60, 0.66
+    ydelta = 0.1
+    legend = ROOT.TLegend(xleg, yleg-ydelta, xleg+0.2, yleg)
+    legend.AddEntry(job["hist"], "%s sectors" % (job["sector"]), "p")
+    legend.AddEntry(expos[-1],   "expo. fits",                   "f")
+    legend.SetBorderSize(0)
+    legend.SetFillColor(0)
+    legend.SetMargin(0.3)
+    legend.SetTextSize(0.045)
+    legend.Draw()
+    draw_logos(xcoord=0.55, ycoord=0.85, run=job["run"], fit=False)
+
+    if job["layer"]=="EI":
+        boundary_line = ROOT.TLine(boundary, 300, boundary, 500)
+        boundary_line.Draw()
+        arrow_csc = ROOT.TArrow(boundary, 400, boundary-350, 400, 0.01, "|>")
+        arrow_mdt = ROOT.TArrow(boundary, 350, boundary+350, 350, 0.01, "|>")
+        for arrow in [arrow_csc, arrow_mdt]:
+            arrow.Draw()
+        blurb_csc = ROOT.TLatex(boundary-280, 405, "CSC")
+        blurb_mdt = ROOT.TLatex(boundary+050, 355, "MDT")
+        for blurb in [blurb_csc, blurb_mdt]:
+            blurb.SetTextSize(0.025)
+            blurb.Draw()
+
+    ROOT.gPad.RedrawAxis()
+    canvas.SaveAs(os.path.join(job["output"], canvas.GetName()+".pdf"))
             
 def plots_vs_bcid(runs):
 
@@ -442,12 +597,9 @@ def plots_vs_bcid(runs):
 
     per_event = True
 
-    ROOT.gStyle.SetPadLeftMargin(0.08)
-    ROOT.gStyle.SetPadRightMargin(0.04)
-
-    input = ROOT.TFile.Open("histograms.root")
+    input = analysis_server.open_root("histograms.root")
     hists  = {}
-    funcs  = {}
+    jobs   = []
     rebin  = 1
 
     # hits vs bcid
@@ -468,16 +620,10 @@ def plots_vs_bcid(runs):
             hist.GetXaxis().SetTitle("BCID")
             hist.SetTitle("")
 
-            for bcid in xrange(3600):
-                hist.SetBinError(bcid, 0)
+            hist_arrays.errors2(hist)[...] = 0
             style_vs_bcid(hist, per_event, setmax=4)
 
-            name = hist.GetName()
-            canvas = ROOT.TCanvas(name, name, 1600, 500)
-            canvas.Draw()
-            hist.Draw("histsame")
-            draw_logos(xcoord=0.35, ycoord=0.85, run=run, fit=False)
-            canvas.SaveAs(os.path.join(ops.output, canvas.GetName()+".pdf"))
+            jobs.append({"draw": draw_vs_bcid, "name": hist.GetName(), "output": ops.output, "hist": hist, "run": run})
 
         for det in ["mdt_full", "csc_full"]:
 
@@ -489,27 +635,69 @@ def plots_vs_bcid(runs):
             setmax=4300 if "mdt" in det else 60
             style_vs_bcid(hists[name], per_event, setmax=setmax)
 
-            canvas = ROOT.TCanvas(name, name, 1600, 500)
-            canvas.Draw()
-            hists[name].Draw("histsame")
-            draw_logos(xcoord=0.35, ycoord=0.85, run=run, fit=False)
-            canvas.SaveAs(os.path.join(ops.output, canvas.GetName()+".pdf"))
+            jobs.append({"draw": draw_vs_bcid, "name": name, "output": ops.output, "hist": hists[name], "run": run})
 
-def plots_vs_region(runs, rate=True, logz=False):
+    return jobs
 
-    colz()
+def plots_vs_train(runs):
+    """ Hits per event and per lumi vs position in the bunch train, summed over runs. """
+
+    ops = options()
+    if not ops.output:
+        ops.output = "output"
+    if not os.path.isdir(ops.output):
+        os.makedirs(ops.output)
+
+    arrays = bcid.load("histograms.root", runs)
+    jobs   = []
+
+    for by, xtitle in [("position", "position in train"),
+                       ("to_end",   "position in train from the trailing bunch"),
+                       ("gap",      "empty bunches before the train"),
+                       ]:
+        sums   = bcid.vs_train(arrays, by=by)
+        length = min(len(sums["evts"]), 80)
+
+        for det in ["mdt_full", "csc_full"]:
+            for per in ["event", "lumi"]:
+
+                name = "hits_per_%s_%s_vs_%s" % (per, det, by)
+                hist = ROOT.TH1F(name, "", length-1, 0.5, length-0.5)
+                hist_arrays.contents(hist)[1:length] = sums["hits_per_%s_%s" % (per, det)][1:length]
+                hist.ResetStats()
+
+                style_vs_bcid(hist, per_event=False)
+                hist.GetXaxis().SetTitle(xtitle)
+                hist.GetYaxis().SetTitle("< hits in %s > per %s" % (det.split("_")[0].upper(),
+                                                                   "event" if per == "event" else "unit of bunch lumi"))
+
+                jobs.append({"draw": draw_vs_bcid, "name": name, "output": ops.output, "hist": hist, "run": None})
+
+    return jobs
+
+def draw_vs_bcid(job):
+
+    ROOT.gStyle.SetPadLeftMargin(0.08)
+    ROOT.gStyle.SetPadRightMargin(0.04)
+
+    name = job["name"]
+    canvas = ROOT.TCanvas(name, name, 1600, 500)
+    canvas.Draw()
+    job["hist"].Draw("histsame")
+    draw_logos(xcoord=0.35, ycoord=0.85, run=job["run"], fit=False)
+    canvas.SaveAs(os.path.join(job["output"], canvas.GetName()+".pdf"))
+
+def plots_vs_region(runs, rate=True, logz=False):
 
     ops = options()
     if not ops.output:                ops.output = "output"
     if not os.path.isdir(ops.output): os.makedirs(ops.output)
 
-    ROOT.gStyle.SetPadLeftMargin(0.12)
-    ROOT.gStyle.SetPadRightMargin(0.20)
-
-    input = ROOT.TFile.Open("histograms.root")
+    input = analysis_server.open_root("histograms.root")
     hists = {}
+    jobs  = []
 
-    area = ROOT.TFile.Open("area.root")
+    area = analysis_server.open_root("area.root")
     area_L = area.Get("area_vs_region_L")
     area_S = area.Get("area_vs_region_S")
 
@@ -529,53 +717,61 @@ def plots_vs_region(runs, rate=True, logz=False):
             style_vs_region(hists[name], rate)
 
             # turn off BOL7 right now because they arent actually BOL7
-            for binx in xrange(hists[name].GetNbinsX()+1):
-                if abs(hists[name].GetXaxis().GetBinCenter(binx)) != 7:
-                    continue
-                for biny in xrange(hists[name].GetNbinsX()+1):
-                    if hists[name].GetYaxis().GetBinLabel(biny) == "BOL":
-                        hists[name].SetBinContent(binx, biny, 0.0)
-                        hists[name].SetBinError(  binx, biny, 0.0)
+            biny_bol = hists[name].GetYaxis().FindFixBin("BOL")
+            if biny_bol > 0:
+                eta7 = numpy.abs(hist_arrays.centers(hists[name].GetXaxis())) == 7
+                hist_arrays.contents(hists[name])[biny_bol, eta7] = 0.0
+                hist_arrays.errors2( hists[name])[biny_bol, eta7] = 0.0
 
             if rate:
-                numer = copy.copy(hists[name])
-                denom = copy.copy(area_L if "L" in sector else area_S)
+                numer = hists[name]
+                area  = area_L if "L" in sector else area_S
 
                 biny_csc = 8
-                for biny in xrange(denom.GetNbinsX()+1):
-                    livetime = livetime_csc if biny == biny_csc else livetime_mdt
-                    for binx in xrange(denom.GetNbinsX()+1):
-                        denom.SetBinContent(binx, biny, entries * livetime * denom.GetBinContent(binx, biny))
+                biny     = numpy.arange(area.GetNbinsY()+2)
+                livetime = numpy.where(biny == biny_csc, livetime_csc, livetime_mdt)
+                denom    = entries * livetime[:, numpy.newaxis] * hist_arrays.contents(area)
 
                 name = numer.GetName().replace("hits_", "rate_")
                 hists[name] = copy.copy(numer)
-                hists[name].Reset()
-                hists[name].Divide(numer, denom)
                 hists[name].SetName(name)
+                hist_arrays.divide(hists[name], denom)
                 hists[name].GetZaxis().SetTitle(ytitle(name))
                 hists[name].SetMinimum(0.9)
                 hists[name].SetMaximum(409)
 
-            canvas = ROOT.TCanvas(name, name, 800, 800)
-            canvas.Draw()
-            ROOT.gStyle.SetPaintTextFormat(".1f")
             hists[name].SetMarkerSize(1.2)
             hists[name].GetYaxis().SetTickLength(0.00)
-            hists[name].Draw("histsame,colz")
-            hists[name].Draw("histsame,text35")
 
-            logo = ROOT.TLatex(0.15, 0.96, "ATLAS Internal        Run %s      13 TeV" % (int(run)))
-            logo.SetTextSize(0.035)
-            logo.SetTextFont(42)
-            # logo.SetTextAlign(22)
-            logo.SetNDC()
-            logo.Draw()
+            jobs.append({"draw": draw_vs_region, "name": name, "output": ops.output, "hist": hists[name], "run": run, "logz": logz})
 
-            if logz: ROOT.gPad.SetLogz(1)
-            
-            canvas.SaveAs(os.path.join(ops.output, canvas.GetName()+".pdf"))
+    return jobs
+
+def draw_vs_region(job):
+
+    colz()
+    ROOT.gStyle.SetPadLeftMargin(0.12)
+    ROOT.gStyle.SetPadRightMargin(0.20)
+    ROOT.gStyle.SetPaintTextFormat(".1f")
+
+    name = job["name"]
+    canvas = ROOT.TCanvas(name, name, 800, 800)
+    canvas.Draw()
+    job["hist"].Draw("histsame,colz")
+    job["hist"].Draw("histsame,text35")
+
+    logo = ROOT.TLatex(0.15, 0.96, "ATLAS Internal        Run %s      13 TeV" % (int(job["run"])))
+    logo.SetTextSize(0.035)
+    logo.SetTextFont(42)
+    # logo.SetTextAlign(22)
+    logo.SetNDC()
+    logo.Draw()
+
+    if job["logz"]: ROOT.gPad.SetLogz(1)
+    
+    canvas.SaveAs(os.path.join(job["output"], canvas.GetName()+".pdf"))
 
-            if logz: ROOT.gPad.SetLogz(0)
+    if job["logz"]: ROOT.gPad.SetLogz(0)
 
 def plots_vs_lumi_vs_r(runs):
 
@@ -583,18 +779,15 @@ def plots_vs_lumi_vs_r(runs):
     if not ops.output:                ops.output = "output"
     if not os.path.isdir(ops.output): os.makedirs(ops.output)
     
-    colz()
-    ROOT.gStyle.SetPadRightMargin(0.20)
-
-    input = ROOT.TFile.Open("histograms.root")
+    input = analysis_server.open_root("histograms.root")
     hists  = {}
-    funcs  = {}
+    jobs   = []
     rebin  = 4
 
     boundary = 2050 # mm
 
     # area vs r
-    input_area = ROOT.TFile.Open("area.root")
+    input_area = analysis_server.open_root("area.root")
     area_L = input_area.Get("area_vs_r_L")
     area_S = input_area.Get("area_vs_r_S")
 
@@ -618,52 +811,51 @@ def plots_vs_lumi_vs_r(runs):
                 fatal("Could not retrieve %s" % (os.path.join(run, name)))
             hists[name].Rebin2D(rebin, rebin)
 
-            numer = copy.copy(hists[name])
-            denom = copy.copy(hists[name])
-            denom.Reset()
-            denom_area = copy.copy(area_L if "L" in sector else area_S)
+            numer = hists[name]
+            area  = area_L if "L" in sector else area_S
 
-            if not denom.GetNbinsX() == entries.GetNbinsX():
+            if not numer.GetNbinsX() == entries.GetNbinsX():
                 fatal("Cannot make rate for %s. Conflict in x-axis and entries vs. lumi." % (name))
+            if not numer.GetNbinsY() == area.GetNbinsX():
+                fatal("Cannot make rate for %s. Conflict in y-axis and area." % (name))
 
-            for xbin in xrange(denom.GetNbinsX()):
-
-                ents = entries.GetBinContent(xbin)
-
-                if not denom.GetNbinsY() == denom_area.GetNbinsX():
-                    fatal("Cannot make rate for %s. Conflict in y-axis and area." % (name))
-
-                for ybin in xrange(denom.GetNbinsY()):
-                    radius   = denom_area.GetBinCenter(ybin)
-                    area     = denom_area.GetBinContent(ybin)
-                    livetime = livetime_csc if radius < boundary else livetime_mdt
-                    denom.SetBinContent(xbin, ybin, ents * area * livetime)
+            # denominator is [radius, lumi], like the [ybin, xbin] view of numer
+            radius   = hist_arrays.centers(area.GetXaxis())
+            livetime = numpy.where(radius < boundary, livetime_csc, livetime_mdt)
+            denom    = numpy.outer(hist_arrays.contents(area) * livetime, hist_arrays.contents(entries))
 
             name = numer.GetName().replace("hits_", "rate_")
             hists[name] = copy.copy(numer)
-            hists[name].Reset()
-            hists[name].Divide(numer, denom)
             hists[name].SetName(name)
+            hist_arrays.divide(hists[name], denom)
             style_vs_lumi_vs_r(hists[name])
-            for xbin in xrange(0, hists[name].GetNbinsX()+1):
-                for ybin in xrange(0, hists[name].GetNbinsY()+1):
-                    hists[name].SetBinError(xbin, ybin, 0)
+            hist_arrays.errors2(hists[name])[...] = 0
 
             name = "rate_%s_vs_lumi_vs_r_%s_%s" % (ops.hits, sector, run)
-            canvas = ROOT.TCanvas(name, name, 800, 800)
-            canvas.Draw()
-        
-            hists[name].Draw("colz,same")
+            jobs.append({"draw": draw_vs_lumi_vs_r, "name": name, "output": ops.output, "hist": hists[name], "run": run})
+
+    return jobs
+
+def draw_vs_lumi_vs_r(job):
+
+    colz()
+    ROOT.gStyle.SetPadRightMargin(0.20)
 
-            xcoord, ycoord = 0.2, 0.96
-            atlas = ROOT.TLatex(xcoord, ycoord, "ATLAS Internal, Run %s      #rho = %.3f" % (run.lstrip("0"), hists[name].GetCorrelationFactor()))
-            atlas.SetTextSize(0.03)
-            atlas.SetTextFont(42)
-            atlas.SetNDC()
-            atlas.Draw()
+    name = job["name"]
+    canvas = ROOT.TCanvas(name, name, 800, 800)
+    canvas.Draw()
+
+    job["hist"].Draw("colz,same")
 
-            ROOT.gPad.RedrawAxis()
-            canvas.SaveAs(os.path.join(ops.output, canvas.GetName()+".pdf"))
+    xcoord, ycoord = 0.2, 0.96
+    atlas = ROOT.TLatex(xcoord, ycoord, "ATLAS Internal, Run %s      #rho = %.3f" % (job["run"].lstrip("0"), job["hist"].GetCorrelationFactor()))
+    atlas.SetTextSize(0.03)
+    atlas.SetTextFont(42)
+    atlas.SetNDC()
+    atlas.Draw()
+
+    ROOT.gPad.RedrawAxis()
+    canvas.SaveAs(os.path.join(job["output"], canvas.GetName()+".pdf"))
             
 
 def style_vs_r(hist, layer, ndiv=505):
@@ -703,14 +895,15 @@ def style_vs_lumi_vs_r(hist, ndiv=505):
     hist.GetYaxis().SetTitleOffset(1.7)
     hist.GetZaxis().SetTitleOffset(1.4)
 
-def draw_vs_r(hist, output, height=800, width=800, drawopt="psame", logos=False):
-    name = hist.GetName()
+def draw_vs_r(job, height=800, width=800, drawopt="psame", logos=False):
+    ROOT.gStyle.SetPadRightMargin(0.06)
+    name = job["name"]
     canvas = ROOT.TCanvas(name, name, width, height)
     canvas.Draw()
-    hist.Draw(drawopt)
+    job["hist"].Draw(drawopt)
     if logos:
         draw_logos()
-    canvas.SaveAs(os.path.join(output, canvas.GetName()+".pdf"))
+    canvas.SaveAs(os.path.join(job["output"], canvas.GetName()+".pdf"))
 
 def style_vs_bcid(hist, per_event, ndiv=505, setmax=False):
     name = hist.GetName()
@@ -785,6 +978,11 @@ def color(run):
     if run == "00284213": return ROOT.kAzure+1
     if run == "00284285": return ROOT.kBlue
 
+    # other runs get a palette color by their order in the metadata
+    runs = sorted(run_metadata.index())
+    if run in runs:
+        return ROOT.gStyle.GetColorPalette(int(runs.index(run) * (ROOT.gStyle.GetNumberOfColors()-1) / max(len(runs)-1, 1)))
+
     return ROOT.kBlack
 
 def ymax(region, rate=False, draw_slope=True):
@@ -894,6 +1092,11 @@ def caption(run):
     return "%s, %s bunches" % (int(run), bunches(run))
 
 def bunches(run):
+    meta = run_metadata.lookup(run)
+    if meta:
+        return meta["bunches"]
+
+    # histograms made before the run metadata was written
     if run == "00278880": return  447
     if run == "00279169": return  733
     if run == "00279345": return  877
@@ -927,20 +1130,44 @@ def kill_weird_bins(hist):
             hist.SetBinContent(bin, 0)
             hist.SetBinError(bin, 0)
 
-def slope_offset(region, bunches=2808):
-    if bunches == 2808:
-        if region == "csc_CSS1": return (82.984, 0)
-        if region == "csc_CSL1": return (80.863, 0)
-        if region == "mdt_EIS1": return (18.522, 0)
-        if region == "mdt_EIL1": return (19.531, 0)
-        if region == "mdt_full": return (0, 0)
-    if bunches == 3564:
-        if region == "csc_CSS1": return (75.131, 0)
-        if region == "csc_CSL1": return (72.823, 0)
-        if region == "mdt_EIS1": return (17.082, 0)
-        if region == "mdt_EIL1": return (17.745, 0)
-        if region == "mdt_full": return (0, 0)
-    fatal("No slope, offset for %s, %s bunches" % (region, bunches))
+def region_area(region):
+    areas = chamber_area()
+    if region == "mdt_full": return sum([areas[cham] for cham in filter(lambda key: not "CS" in key, areas)])
+    if region == "mdt_EIL1": return sum([areas[cham] for cham in filter(lambda key:   "EIL1" in key, areas)])
+    if region == "mdt_EIL2": return sum([areas[cham] for cham in filter(lambda key:   "EIL2" in key, areas)])
+    if region == "mdt_EIS1": return sum([areas[cham] for cham in filter(lambda key:   "EIS1" in key, areas)])
+    if region == "mdt_EIS2": return sum([areas[cham] for cham in filter(lambda key:   "EIS2" in key, areas)])
+    if region == "mdt_EML1": return sum([areas[cham] for cham in filter(lambda key:   "EML1" in key, areas)])
+    if region == "mdt_EML2": return sum([areas[cham] for cham in filter(lambda key:   "EML2" in key, areas)])
+    if region == "mdt_EMS1": return sum([areas[cham] for cham in filter(lambda key:   "EMS1" in key, areas)])
+    if region == "mdt_EMS2": return sum([areas[cham] for cham in filter(lambda key:   "EMS2" in key, areas)])
+    if region == "mdt_BIS7": return sum([areas[cham] for cham in filter(lambda key:   "BIS7" in key, areas)])
+    if region == "mdt_BIS8": return sum([areas[cham] for cham in filter(lambda key:   "BIS8" in key, areas)])
+    if region == "csc_CSL1": return sum([areas[cham] for cham in filter(lambda key:   "CSL1" in key, areas)])
+    if region == "csc_CSS1": return sum([areas[cham] for cham in filter(lambda key:   "CSS1" in key, areas)])
+    return -1
+
+def rate_scale(region, hits):
+    """ Factor turning < hits per event > in a region into a hit rate [Hz / cm^2]. """
+    livetime   = livetime_csc if "csc" in region else livetime_mdt
+    efficiency = efficiency_csc_adc if "csc" in region else efficiency_mdt_adc
+    if hits=="raw":
+        efficiency = 1.0
+    return 1.0 / (livetime * region_area(region) * efficiency)
+
+def fit_xlo(run, perbc=False):
+    """ Lower edge of the lumi fit, for runs with a weird start. """
+    if run == "00278880" and not perbc:
+        return 0.9*0.8
+    return float("-inf")
+
+def slope_offset(region, hits, bunches=2808):
+    if region == "mdt_full":
+        return (0, 0)
+    projection = fit_store.projection(region, bunches, hits)
+    if projection:
+        return projection
+    fatal("No slope, offset for %s, %s bunches, %s hits. Please run slope_vs_bunches.py first" % (region, bunches, hits))
 
 def chamber_area():
 
@@ -964,6 +1191,10 @@ def chamber_area():
             
     return areas
 
+def style():
+    rootlogon.style()
+    ROOT.gStyle.SetPadBottomMargin(0.12)
+
 def fatal(message):
     sys.exit("Error in %s: %s" % (__file__, message))
 
@@ -0,0 +1,305 @@
+"""
+preview.py: quick png previews of the main plots.py families,
+without ROOT, plus an index.html to browse them.
+
+The histograms are read from the .npz archives of hist_npz.py, or from
+the root files with uproot (version 3, which runs on python 2), into
+numpy arrays laid out like hist_arrays.py, [ybin, xbin] including
+under- and overflow, and drawn with matplotlib's Agg backend:
+  - rate vs. lumi for each region, all runs overlaid
+  - rate vs. r for each sector, all runs overlaid
+  - rate vs. region maps for each run
+
+> python preview.py --hits=raw --output=preview
+> python preview.py --input=histograms.npz --area=area.npz
+"""
+
+import argparse
+import os
+import sys
+import time
+
+import numpy
+
+import hist_npz
+
+livetime_csc       = 140e-9
+livetime_mdt       = 1300e-9
+efficiency_csc_adc = 0.789
+efficiency_mdt_adc = 1.0
+
+regions_vs_lumi = ["mdt_full", "mdt_EIL1", "mdt_EIS1", "mdt_EML1", "mdt_EMS1", "mdt_BIS8", "csc_CSL1", "csc_CSS1"]
+
+# chamber type: (map of area_vs_region_{L,S}, y bin)
+region_bins = {"EIL": ("L", 4), "EIS": ("S", 4),
+               "EML": ("L", 6), "EMS": ("S", 6),
+               "BIS": ("S", 1),
+               "CSL": ("L", 8), "CSS": ("S", 8),
+               }
+biny_csc = 8
+
+def options():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--input",  help="Input histograms.root", default="histograms.root")
+    parser.add_argument("--area",   help="Input area.root",       default="area.root")
+    parser.add_argument("--output", help="Output directory",      default="preview")
+    parser.add_argument("--hits",   help="Type of hits to use: raw or adc", default="raw")
+    parser.add_argument("--dpi",    help="Resolution of the thumbnails", default=80, type=int)
+    return parser.parse_args()
+
+def main():
+
+    ops = options()
+    if not ops.hits in ["raw", "adc"]:
+        fatal("Please give --hits as raw or adc")
+    if not os.path.isdir(ops.output):
+        os.makedirs(ops.output)
+
+    start  = time.time()
+    input  = open_file(ops.input)
+    area   = open_file(ops.area)
+    runs   = sorted(key for key in keys(input) if key.startswith("00"))
+    pyplot = backend()
+
+    pngs = []
+    pngs += preview_vs_lumi(pyplot, input, area, runs, ops)
+    pngs += preview_vs_r(pyplot, input, area, runs, ops)
+    pngs += preview_vs_region(pyplot, input, area, runs, ops)
+
+    write_index(ops.output, pngs)
+    print " wrote %i previews to %s in %.1f s" % (sum(len(family[1]) for family in pngs), ops.output, time.time() - start)
+
+def backend():
+    try:
+        import matplotlib
+    except ImportError:
+        fatal("preview.py needs matplotlib")
+    matplotlib.use("Agg")
+    import matplotlib.pyplot as pyplot
+    return pyplot
+
+def open_file(path):
+    if path.endswith(".npz"):
+        return hist_npz.load(path)
+    try:
+        import uproot3 as uproot
+    except ImportError:
+        try:
+            import uproot
+        except ImportError:
+            fatal("preview.py needs uproot")
+    if not os.path.isfile(path):
+        fatal("Cannot open %s" % (path))
+    return uproot.open(path)
+
+def keys(directory):
+    if isinstance(directory, hist_npz.Archive):
+        return sorted(set(name.split("/")[0] for name in directory.keys()))
+    names = []
+    for key in directory.keys():
+        if not isinstance(key, str):
+            key = key.decode()
+        names.append(key.split(";")[0])
+    return names
+
+def read(directory, path):
+    """ Contents, squared errors and edges of a TH1/TH2, without ROOT. """
+    if isinstance(directory, hist_npz.Archive):
+        if path not in directory:
+            fatal("Cannot retrieve %s" % (path))
+        hist = directory[path]
+        return {"contents": hist["contents"].astype(numpy.float64), "errors2": hist["errors2"],
+                "xedges":   hist["xedges"],                         "yedges":  hist["yedges"]}
+    try:
+        hist = directory[path]
+    except KeyError:
+        fatal("Cannot retrieve %s" % (path))
+
+    classname = hist._classname
+    if not isinstance(classname, str):
+        classname = classname.decode()
+
+    xedges = edges(hist._fXaxis)
+    if classname.startswith("TH2"):
+        yedges = edges(hist._fYaxis)
+        shape  = (len(yedges)+1, len(xedges)+1)
+    else:
+        yedges = None
+        shape  = (len(xedges)+1,)
+
+    contents = numpy.array(hist[:], dtype=numpy.float64).reshape(shape)
+    if len(hist._fSumw2):
+        errors2 = numpy.array(hist._fSumw2, dtype=numpy.float64).reshape(shape)
+    else:
+        errors2 = contents.copy()
+    return {"contents": contents, "errors2": errors2, "xedges": xedges, "yedges": yedges}
+
+def edges(axis):
+    if len(axis._fXbins):
+        return numpy.array(axis._fXbins, dtype=numpy.float64)
+    return numpy.linspace(axis._fXmin, axis._fXmax, axis._fNbins+1)
+
+def centers(edges):
+    """ Bin centers including under- and overflow, like hist_arrays.centers. """
+    width = numpy.diff(edges)
+    return numpy.concatenate([[edges[0] - width[0]/2], edges[:-1] + width/2, [edges[-1] + width[-1]/2]])
+
+def rebin(hist, ngroup):
+    """ Merge ngroup bins of a 1D hist, like TH1::Rebin. Leftover bins go to the overflow. """
+    nbins = len(hist["xedges"]) - 1
+    nnew  = nbins // ngroup
+    out   = {"xedges": hist["xedges"][::ngroup][:nnew+1], "yedges": None}
+    for key in ["contents", "errors2"]:
+        inner = hist[key][1:1+nnew*ngroup].reshape(nnew, ngroup).sum(axis=1)
+        out[key] = numpy.concatenate([[hist[key][0]], inner, [hist[key][1+nnew*ngroup:].sum()]])
+    return out
+
+def profile_x(hist):
+    """ Means and errors on the mean of y per x bin, like linear_fits.profile_x. """
+    contents = hist["contents"][1:]
+    errors2  = hist["errors2"][1:]
+    y        = centers(hist["yedges"])[1:, numpy.newaxis]
+
+    sumw   = contents.sum(axis=0)
+    sumwy  = (contents * y).sum(axis=0)
+    sumwy2 = (contents * y * y).sum(axis=0)
+    sumw2  = errors2.sum(axis=0)
+
+    filled = (sumw != 0) & (sumw2 > 0)
+    sumw   = numpy.where(filled, sumw,  1.0)
+    sumw2  = numpy.where(filled, sumw2, 1.0)
+    mean   = sumwy / sumw
+    spread = numpy.sqrt(numpy.abs(sumwy2 / sumw - mean**2))
+
+    mean  = numpy.where(filled, mean, 0.0)
+    error = numpy.where(filled, spread / numpy.sqrt(sumw**2 / sumw2), 0.0)
+    return centers(hist["xedges"]), mean, error
+
+def region_area(area, region):
+    """ Area of a region [cm2], summed from the area_vs_region maps. """
+    maps = {"L": area_map(area, "L"), "S": area_map(area, "S")}
+    if region == "mdt_full":
+        return sum(numpy.delete(maps[sector], biny_csc, axis=0).sum() for sector in maps)
+    chamber = region.split("_")[1]
+    sector, biny = region_bins[chamber[:3]]
+    eta = numpy.abs(centers(numpy.linspace(-8.5, 8.5, 18)))
+    return maps[sector][biny, eta == int(chamber[3:])].sum()
+
+def area_map(area, sector):
+    return read(area, "area_vs_region_%s" % (sector))["contents"]
+
+def livetime_efficiency(csc, hits):
+    livetime   = numpy.where(csc, livetime_csc,       livetime_mdt)
+    efficiency = numpy.where(csc, efficiency_csc_adc, efficiency_mdt_adc)
+    if hits == "raw":
+        efficiency = numpy.ones_like(efficiency)
+    return livetime, efficiency
+
+def entries(input, run):
+    return read(input, "%s/evts_%s" % (run, run))["contents"][1]
+
+def colors(pyplot, runs):
+    cmap = pyplot.get_cmap("viridis")
+    return dict((run, cmap(irun / float(max(len(runs)-1, 1)))) for irun, run in enumerate(runs))
+
+def preview_vs_lumi(pyplot, input, area, runs, ops):
+
+    pngs  = []
+    color = colors(pyplot, runs)
+
+    for region in regions_vs_lumi:
+        livetime, efficiency = livetime_efficiency("csc" in region, ops.hits)
+        scale = 1.0 / (livetime * region_area(area, region) * efficiency)
+
+        figure, axes = pyplot.subplots(figsize=(4, 4))
+        for run in runs:
+            hist = read(input, "%s/hits_%s_vs_lumi_vs_evts_%s_%s" % (run, ops.hits, region, run))
+            x, y, error = profile_x(hist)
+            filled = (y != 0) & (x > 0.5) & (x < 5.4)
+            axes.errorbar(x[filled], y[filled]*scale, yerr=error[filled]*scale,
+                          fmt="o", markersize=2, color=color[run], label=str(int(run)))
+
+        axes.set_xlabel("inst. lumi. [e33 cm-2 s-1]")
+        axes.set_ylabel("%s hit rate [Hz / cm2]" % (region))
+        axes.legend(fontsize=5, ncol=2)
+        pngs.append(save(pyplot, figure, ops, "rate_%s_vs_lumi_%s" % (ops.hits, region)))
+
+    return [("rate vs. lumi", pngs)]
+
+def preview_vs_r(pyplot, input, area, runs, ops):
+
+    pngs     = []
+    color    = colors(pyplot, runs)
+    boundary = 2050 # mm
+
+    for layer in ["EI", "EM"]:
+        for sector in [layer+"L", layer+"S"]:
+
+            area_r = rebin(read(area, "area_vs_r_%s" % (sector)), 4)
+            radius = centers(area_r["xedges"])
+            livetime, efficiency = livetime_efficiency((radius < boundary) & (layer=="EI"), ops.hits)
+
+            figure, axes = pyplot.subplots(figsize=(4, 4))
+            for run in runs:
+                hits  = rebin(read(input, "%s/hits_%s_vs_r_%s_%s" % (run, ops.hits, sector, run)), 4)
+                denom = entries(input, run) * area_r["contents"] * livetime * efficiency
+                rate  = numpy.where(denom > 0, hits["contents"] / numpy.where(denom > 0, denom, 1.0), 0.0)
+                axes.step(radius[1:-1], rate[1:-1], where="mid", color=color[run], linewidth=0.8, label=str(int(run)))
+
+            axes.set_xlabel("r [mm]")
+            axes.set_ylabel("%s hit rate [Hz / cm2]" % (sector))
+            axes.set_ylim(0, 950 if layer=="EI" else 45)
+            axes.legend(fontsize=5, ncol=2)
+            pngs.append(save(pyplot, figure, ops, "rate_%s_vs_r_%s" % (ops.hits, sector)))
+
+    return [("rate vs. r", pngs)]
+
+def preview_vs_region(pyplot, input, area, runs, ops):
+
+    from matplotlib.colors import LogNorm
+
+    pngs = []
+    for run in runs:
+        for sector in ["L", "S"]:
+
+            hits  = read(input, "%s/hits_%s_vs_region_%s_%s" % (run, ops.hits, sector, run))
+            biny  = numpy.arange(hits["contents"].shape[0])
+            livetime = numpy.where(biny == biny_csc, livetime_csc, livetime_mdt)[:, numpy.newaxis]
+            denom = entries(input, run) * livetime * area_map(area, sector)
+            rate  = numpy.where(denom > 0, hits["contents"] / numpy.where(denom > 0, denom, 1.0), 0.0)
+
+            # turn off BOL7 like plots.py
+            if sector == "L":
+                eta7 = numpy.abs(centers(hits["xedges"])) == 7
+                rate[3, eta7] = 0.0
+
+            figure, axes = pyplot.subplots(figsize=(4, 4))
+            inner = numpy.ma.masked_less_equal(rate[1:-1, 1:-1], 0)
+            mesh  = axes.pcolormesh(hits["xedges"], hits["yedges"], inner, norm=LogNorm(vmin=0.9, vmax=409))
+            figure.colorbar(mesh, ax=axes)
+            axes.set_xlabel("eta station")
+            axes.set_title("run %i, %s" % (int(run), sector), fontsize=8)
+            pngs.append(save(pyplot, figure, ops, "rate_%s_vs_region_%s_%s" % (ops.hits, sector, run)))
+
+    return [("rate vs. region", pngs)]
+
+def save(pyplot, figure, ops, name):
+    figure.tight_layout()
+    figure.savefig(os.path.join(ops.output, name+".png"), dpi=ops.dpi)
+    pyplot.close(figure)
+    return name+".png"
+
+def write_index(output, families):
+    with open(os.path.join(output, "index.html"), "w") as html:
+        html.write("<html><head><title>previews</title></head><body>\n")
+        for family, pngs in families:
+            html.write("<h2>%s</h2>\n" % (family))
+            for png in pngs:
+                html.write('<a href="%s"><img src="%s" width="320" title="%s"></a>\n' % (png, png, png))
+        html.write("</body></html>\n")
+
+def fatal(message):
+    sys.exit("Error in %s: %s" % (__file__, message))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,126 @@
+"""
+run_metadata.py: index of the runs in histograms.root.
+
+MuonRawHistograms writes one entry per job into the tree "metadata":
+colliding bunches, lumiblock range, event counts, pileup and lumi ranges,
+and the average lumi of every lumiblock seen. hadd chains the entries,
+and this merges them into one record per run. The integrated lumi is only
+approximate: the lumiblocks are taken to last lb_seconds each.
+
+Run outside athena.
+
+> python run_metadata.py --input=histograms.root
+"""
+
+import argparse
+import os
+import sys
+
+import ROOT
+ROOT.gROOT.SetBatch(True)
+
+# the ntuples do not carry the lumiblock duration: the integrated lumi is approximate
+lb_seconds = 60.0
+
+# path: (mtime, index)
+indices = {}
+
+def options():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--input", help="Input histograms.root", default="histograms.root")
+    return parser.parse_args()
+
+def main():
+
+    ops = options()
+    runs = index(ops.input)
+    if not runs:
+        fatal("No metadata in %s" % (ops.input))
+
+    print
+    print " %10s %8s %11s %10s %12s %13s %11s %10s" % ("run", "bunches", "lumiblocks", "events", "weighted",
+                                                       "lumi [e33]", "mu", "~int. pb-1")
+    for run in sorted(runs):
+        meta = runs[run]
+        print " %10s %8i %5i-%5i %10i %12.1f %6.2f-%6.2f %5.1f-%5.1f %10.2f" % (run, meta["bunches"],
+                                                                             meta["lbn_min"],  meta["lbn_max"],
+                                                                             meta["events"],   meta["events_weighted"],
+                                                                             meta["lumi_min"], meta["lumi_max"],
+                                                                             meta["mu_min"],   meta["mu_max"],
+                                                                             integrated_lumi(meta),
+                                                                             )
+    print
+    print " ~int. pb-1: approximate, for %i s per lumiblock, as the ntuples do not carry their durations" % (lb_seconds)
+    print
+
+def lookup(run, path="histograms.root"):
+    """ Metadata of one run, or None if the run or the metadata is missing. """
+    return index(path).get(run)
+
+def index(path="histograms.root"):
+    """ Metadata of every run in path, keyed by run, e.g. 00278880.
+        The file is read again only if it changed. """
+    mtime = os.path.getmtime(path) if os.path.isfile(path) else None
+    if path not in indices or indices[path][0] != mtime:
+        indices[path] = (mtime, read(path))
+    return indices[path][1]
+
+def read(path):
+
+    runs  = {}
+    input = ROOT.TFile.Open(path)
+    if not input:
+        return runs
+    tree = input.Get("metadata")
+    if not tree:
+        input.Close()
+        return runs
+
+    for entry in tree:
+
+        # jobs without events, from before they were skipped when writing
+        if entry.events == 0:
+            continue
+
+        run = "00%i" % (entry.RunNumber)
+        if run not in runs:
+            runs[run] = {"run":             run,
+                         "bunches":         entry.bunches,
+                         "lbn_min":         entry.lbn_min,
+                         "lbn_max":         entry.lbn_max,
+                         "events":          0,
+                         "events_weighted": 0.0,
+                         "mu_min":          entry.mu_min,
+                         "mu_max":          entry.mu_max,
+                         "lumi_min":        entry.lumi_min,
+                         "lumi_max":        entry.lumi_max,
+                         "lumiblocks":      {},
+                         }
+        meta = runs[run]
+
+        if entry.bunches != meta["bunches"]:
+            print " WARNING: %s has %i and %i colliding bunches" % (run, meta["bunches"], entry.bunches)
+
+        meta["lbn_min"]          = min(meta["lbn_min"],  entry.lbn_min)
+        meta["lbn_max"]          = max(meta["lbn_max"],  entry.lbn_max)
+        meta["mu_min"]           = min(meta["mu_min"],   entry.mu_min)
+        meta["mu_max"]           = max(meta["mu_max"],   entry.mu_max)
+        meta["lumi_min"]         = min(meta["lumi_min"], entry.lumi_min)
+        meta["lumi_max"]         = max(meta["lumi_max"], entry.lumi_max)
+        meta["events"]          += entry.events
+        meta["events_weighted"] += entry.events_weighted
+        meta["lumiblocks"].update(zip(list(entry.lbs), list(entry.lbs_lumi)))
+
+    input.Close()
+    return runs
+
+def integrated_lumi(meta):
+    """ Approximate integrated lumi in pb-1 of the lumiblocks seen, assuming lb_seconds per lumiblock.
+        The average lumi per lumiblock is in units of e30 cm-2 s-1. """
+    return sum(meta["lumiblocks"].values()) * lb_seconds * 1e30 / 1e36
+
+def fatal(message):
+    sys.exit("Error in %s: %s" % (__file__, message))
+
+if __name__ == "__main__":
+    main()
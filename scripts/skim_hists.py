@@ -0,0 +1,117 @@
+"""
+skim_hists.py: rebuild the histograms vs. lumi, pileup and bcid
+from skim.root, without rereading the ntuples.
+
+The histograms have the names, binning and run directories of
+MuonRawHistograms, and are filled with TTree::Draw. The axes are those
+stored in histograms.root by hists.py, or the defaults if it has none,
+so the rebuilt histograms match the ones of the same hists.py job.
+
+Run outside athena.
+
+> python hists.py --input=input_*.root --cpu=2 --skim
+> python skim_hists.py --input=skim.root --output=histograms_skim.root
+"""
+
+import argparse
+import sys
+import time
+
+import numpy
+import ROOT
+ROOT.gROOT.SetBatch(True)
+
+import binning
+
+# regions of the hits per event, like MuonRawHistograms::initialize_histograms
+regions = ["mdt_full"] + [name for name, hi in binning.regions if name.startswith("mdt")] + \
+          ["csc_full"] + [name for name, hi in binning.regions if name.startswith("csc")]
+
+def options():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--input",  help="Input skim.root", default="skim.root")
+    parser.add_argument("--output", help="Output root file", default="histograms_skim.root")
+    parser.add_argument("--binning", help="json or root file with the axes, e.g. binning.json. default: those of histograms.root, if any")
+    return parser.parse_args()
+
+def main():
+
+    ops = options()
+    axes = binning.load(ops.binning) if ops.binning else binning.stored("histograms.root")
+
+    input = ROOT.TFile.Open(ops.input)
+    if not input:
+        fatal("Cannot open %s" % (ops.input))
+    tree = input.Get("skim")
+    if not tree:
+        fatal("Cannot retrieve skim tree from %s" % (ops.input))
+
+    start  = time.time()
+    output = ROOT.TFile.Open(ops.output, "recreate")
+
+    for run in runs(tree):
+
+        outdir = output.mkdir(run)
+        outdir.cd()
+
+        hists = []
+        for name, expression, weight, bins in histograms(axes):
+            hist = book(name+"_"+run, bins)
+            tree.Draw("%s>>%s" % (expression, hist.GetName()), "(RunNumber==%i)*%s" % (int(run), weight), "goff")
+            hists.append(hist)
+
+        for hist in hists:
+            hist.Write()
+
+    output.Close()
+    print " wrote %s in %.1f s" % (ops.output, time.time() - start)
+
+def runs(tree):
+    tree.SetEstimate(tree.GetEntries()+1)
+    rows = tree.Draw("RunNumber", "", "goff")
+    if rows <= 0:
+        return []
+    numbers = numpy.frombuffer(tree.GetV1(), dtype=numpy.float64, count=rows)
+    return ["00%i" % (number) for number in numpy.unique(numbers)]
+
+def histograms(axes):
+    """ (name, expression, weight, binning) of every histogram to rebuild, on the axes of binning.py. """
+
+    lumi = binning.axis(axes, "lumi")
+    bcid = (3600, 0, 3600)
+
+    hists = []
+    hists.append(("evts_vs_lumi", "lumi",          "prescale_HLT", lumi))
+    hists.append(("evts_vs_acmu", "actIntPerXing", "prescale_HLT", binning.axis(axes, "acmu")))
+    hists.append(("evts_vs_avmu", "avgIntPerXing", "prescale_HLT", binning.axis(axes, "avmu")))
+
+    for hits in ["raw", "adc"]:
+        for region in regions:
+            hists.append(("hits_%s_vs_lumi_vs_evts_%s" % (hits, region),
+                          "hits_%s_%s:lumi" % (hits, region),
+                          "prescale_HLT",
+                          lumi + binning.axis(axes, region)))
+
+    hists.append(("evts_vs_bcid",          "bcid", "prescale_HLT",                       bcid))
+    hists.append(("lumi_vs_bcid",          "bcid", "prescale_HLT*lbLuminosityPerBCID",   bcid))
+    hists.append(("hits_vs_bcid_mdt_full", "bcid", "prescale_HLT*hits_raw_mdt_full",     bcid))
+    hists.append(("hits_vs_bcid_csc_full", "bcid", "prescale_HLT*hits_raw_csc_full",     bcid))
+    return hists
+
+def book(name, bins):
+    if len(bins) == 3:
+        hist = ROOT.TH1F(name, "", *bins)
+        hist.SetMarkerStyle(20)
+        hist.SetMarkerSize(1)
+    else:
+        hist = ROOT.TH2F(name, "", *bins)
+    # owned by the output directory, which TTree::Draw fills it in
+    ROOT.SetOwnership(hist, False)
+    hist.Sumw2()
+    return hist
+
+def fatal(message):
+    sys.exit("Error in %s: %s" % (__file__, message))
+
+if __name__ == "__main__":
+    main()
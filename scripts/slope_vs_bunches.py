@@ -5,6 +5,8 @@ import sys
 import ROOT
 ROOT.gROOT.SetBatch(True)
 
+import fit_store
+
 ROOT.gStyle.SetPadTickX(1)
 ROOT.gStyle.SetPadTickY(1)
 
@@ -16,6 +18,7 @@ ROOT.gStyle.SetPadRightMargin(0.06)
 def options():
     parser = argparse.ArgumentParser()
     parser.add_argument("--hits", help="Type of hits to use: raw or adc", default=None)
+    parser.add_argument("--db",   help="Database of fit results from linear_fits.py", default=fit_store.default_db)
     return parser.parse_args()
 ops = options()
 
@@ -44,21 +47,16 @@ for region in regions:
     bunches[region] = []
     slope[  region] = []
 
-for line in open("slope_vs_bunches_%s.txt" % ops.hits).readlines():
-
-    line = line.strip()
-    if not line:             continue
-    if line.startswith("#"): continue
-    
-    _name, _run, _bunches, _slope, _offset = line.split()
-
+for row in fit_store.fits(hits=ops.hits, db=ops.db):
     for region in slope:
-        if region in _name:
-            slope[  region].append(float(_slope))
-            bunches[region].append(float(_bunches))
+        if row["region"].endswith("_"+region):
+            slope[  region].append(float(row["slope"]))
+            bunches[region].append(float(row["bunches"]))
             break
-    else:
-        sys.exit("Cant find relevant region for line:\n %s" % line)
+
+for region in regions:
+    if not slope[region]:
+        sys.exit("Error: no %s fits for %s in %s. Please run linear_fits.py first" % (ops.hits, region, ops.db))
 
 expression = "[0] + [1]/x"
 for region in regions:
@@ -117,6 +115,7 @@ print " %7s %7s +/- %7s | %10s +/- %10s | %10s %10s | %10s %10s" % ("region", "[
                                                                        "Hz@2808",    "Hz@3564",
                                                                     )
 
+projections = []
 for region in sorted(regions):
     fit[region].SetLineColor(color(region))
     fit[region].SetLineWidth(2)
@@ -139,8 +138,14 @@ for region in sorted(regions):
                                                                                         lumi_run3  * slope_run3, #  / 1000,
                                                                                         lumi_hllhc * slope_hllhc, # / 1000,
                                                                                         )
+    projections.append({"region": region, "hits": ops.hits, "bunches": bunches_run3,
+                        "slope": slope_run3,  "slope_err": slope_run3_up  - slope_run3,  "offset": 0})
+    projections.append({"region": region, "hits": ops.hits, "bunches": bunches_hllhc,
+                        "slope": slope_hllhc, "slope_err": slope_hllhc_up - slope_hllhc, "offset": 0})
 print
 
+fit_store.write_projections(projections, ops.db)
+
 xcoord, ycoord = 0.77, 0.81 if not logy else 0.85
 atlas = ROOT.TLatex(xcoord, ycoord,      "ATLAS Internal")
 data  = ROOT.TLatex(xcoord, ycoord-0.06, "Data, 13 TeV")
@@ -0,0 +1,162 @@
+"""
+throughput.py: live throughput and ETA over the workers of a multiprocessing pool.
+
+Every few seconds, each worker puts its counters so far, e.g. events, bytes
+and hits, on a queue. A thread in the parent adds them up into one status
+line, with the total rate, the ETA, and the workers much slower than the
+median or silent for long. At the end the totals can be written as json,
+to follow the throughput from batch to batch.
+
+> queue   = multiprocessing.Queue()
+> pool    = multiprocessing.Pool(n, initializer=throughput.attach, initargs=(queue,))
+> monitor = throughput.Monitor(queue, events=total).start()
+> ...     # in the workers: throughput.send(busy=True, events=..., bytes=..., hits=...)
+> monitor.stop()
+> monitor.write("throughput.json")
+"""
+
+import json
+import os
+import Queue
+import sys
+import threading
+import time
+
+# seconds between the updates of a worker, and between status lines
+interval = 5.0
+
+# the queue of this worker, from attach()
+queue = None
+
+def attach(worker_queue):
+    """ Pool initializer: the queue to send the counters on. """
+    global queue
+    queue = worker_queue
+
+def send(**counters):
+    """ The counters of this worker process so far: events, bytes, hits,
+        files_opened and their entries, and busy, False once it waits for work. """
+    if queue is not None:
+        queue.put((os.getpid(), time.time(), counters))
+
+class Monitor(object):
+    """ The sum of the latest counters of every worker. The expected events are given,
+        or estimated from the entries of the files opened so far and the number of files. """
+
+    def __init__(self, queue, events=None, files=None, interval=interval, stream=sys.stdout):
+        self.queue      = queue
+        self.events     = events
+        self.files      = files
+        self.interval   = interval
+        self.stream     = stream
+        self.workers    = {}
+        self.start_time = time.time()
+        self.stop_time  = None
+        self.stopped    = threading.Event()
+        self.thread     = threading.Thread(target=self.run)
+        self.thread.daemon = True
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.stopped.set()
+        self.thread.join()
+        self.drain()
+        self.stop_time = time.time()
+        self.show()
+        self.stream.write("\n")
+        self.stream.flush()
+
+    def run(self):
+        shown = time.time()
+        while not self.stopped.is_set():
+            self.drain(timeout=1.0)
+            if time.time() - shown >= self.interval:
+                self.show()
+                shown = time.time()
+
+    def drain(self, timeout=0):
+        """ Take every update on the queue, waiting up to timeout for the first. """
+        while True:
+            try:
+                pid, when, counters = self.queue.get(timeout=timeout) if timeout else self.queue.get_nowait()
+            except Queue.Empty:
+                return
+            timeout = 0
+            self.update(pid, when, counters)
+
+    def update(self, pid, when, counters):
+        worker = self.workers.setdefault(pid, {"first": when, "last": when, "rate": 0.0, "counters": {}})
+        if when > worker["last"]:
+            worker["rate"] = (counters.get("events", 0) - worker["counters"].get("events", 0)) / (when - worker["last"])
+        worker["last"]     = when
+        worker["counters"] = counters
+
+    def total(self, name):
+        return sum(worker["counters"].get(name, 0) for worker in self.workers.values())
+
+    def expected(self):
+        if self.events:
+            return self.events
+        opened = self.total("files_opened")
+        if self.files and opened:
+            return self.total("entries") / float(opened) * self.files
+        return None
+
+    def rate(self):
+        """ Events per second of the busy workers, from their latest updates. """
+        return sum(worker["rate"] for worker in self.workers.values() if worker["counters"].get("busy"))
+
+    def stragglers(self, now=None):
+        """ Busy workers below half the median rate, or without an update for three intervals. """
+        now    = now or time.time()
+        busy   = dict((pid, worker) for pid, worker in self.workers.items() if worker["counters"].get("busy"))
+        rates  = sorted(worker["rate"] for worker in busy.values())
+        median = rates[len(rates)/2] if rates else 0
+        return sorted(pid for pid, worker in busy.items()
+                      if worker["rate"] < 0.5 * median or now - worker["last"] > 3 * self.interval)
+
+    def show(self):
+
+        now      = self.stop_time or time.time()
+        events   = self.total("events")
+        expected = self.expected()
+        rate     = self.rate()
+
+        line = " %3i workers | %10i events" % (len(self.workers), events)
+        if expected:
+            line += " / %10i | %3i%%" % (expected, 100.0 * min(events / expected, 1.0))
+        line += " | %8.1f Hz | %6.1f MB/s | %5.1fm elapsed" % (rate, self.total("bytes") / 1e6 / max(now - self.start_time, 1e-9), (now - self.start_time) / 60)
+        if expected and rate > 0 and not self.stop_time:
+            line += " | %5.1fm remaining" % (max(expected - events, 0) / rate / 60)
+        slow = self.stragglers(now)
+        if slow and not self.stop_time:
+            line += " | slow: %s" % (", ".join("%i (%.0f Hz)" % (pid, self.workers[pid]["rate"]) for pid in slow))
+
+        self.stream.write("\r" + line)
+        self.stream.flush()
+
+    def summary(self):
+        """ Totals and rates of the whole pool and of every worker. """
+        end     = self.stop_time or time.time()
+        seconds = end - self.start_time
+        totals  = dict((name, self.total(name)) for name in ["events", "bytes", "hits", "files_opened", "entries"])
+        return {"start":   self.start_time,
+                "end":     end,
+                "seconds": seconds,
+                "totals":  totals,
+                "hz":      totals["events"] / seconds if seconds > 0 else 0,
+                "mb_per_s": totals["bytes"] / 1e6 / seconds if seconds > 0 else 0,
+                "workers": dict((str(pid), dict(worker["counters"], seconds=worker["last"] - worker["first"]))
+                                for pid, worker in self.workers.items()),
+                }
+
+    def write(self, path, **extra):
+        """ The summary, and any extra entries, as json. """
+        summary = self.summary()
+        summary.update(extra)
+        with open(path, "w") as output:
+            json.dump(summary, output, indent=1, sort_keys=True)
+        print " wrote %s" % (path)
@@ -0,0 +1,45 @@
+"""
+tree_arrays.py: read TTree branches or formulas into numpy arrays.
+
+Columns are read with TTree::Draw, up to four at a time, over chunks of
+entries, so vector branches give one row per element, like when drawn.
+All columns of one call must have the same number of rows per entry.
+
+> cols = columns(tree, ["csc_segment_r", "csc_segment_phi"])
+> cols["csc_segment_r"]
+"""
+
+import numpy
+
+def columns(tree, expressions, first=0, entries=None, chunk=20000, callback=None):
+    """ Dict of expression: array of its values over the entries [first, first+entries).
+        callback(done, total) is called after every chunk. """
+
+    total = tree.GetEntries() - first
+    if entries is not None and entries >= 0:
+        total = min(total, entries)
+
+    parts = dict((expression, []) for expression in expressions)
+    groups = [expressions[igroup:igroup+4] for igroup in xrange(0, len(expressions), 4)]
+    estimate = chunk * 10
+
+    for start in xrange(first, first+total, chunk):
+        nentries = min(chunk, first+total-start)
+        for group in groups:
+            tree.SetEstimate(estimate)
+            rows = tree.Draw(":".join(group), "", "goff", nentries, start)
+            if rows > estimate:
+                # more rows than expected: read this chunk again with room for all of them
+                estimate = rows + 1
+                tree.SetEstimate(estimate)
+                rows = tree.Draw(":".join(group), "", "goff", nentries, start)
+            for index, expression in enumerate(group):
+                if rows <= 0:
+                    parts[expression].append(numpy.zeros(0))
+                else:
+                    parts[expression].append(numpy.frombuffer(tree.GetVal(index), dtype=numpy.float64, count=rows).copy())
+        if callback:
+            callback(start - first + nentries, total)
+
+    return dict((expression, numpy.concatenate(parts[expression]) if parts[expression] else numpy.zeros(0))
+                for expression in expressions)